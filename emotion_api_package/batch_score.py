@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线批量打分 - 对录制的面试视频批量做情感识别
+
+- 输入为视频目录（递归查找）或清单文件（每行一个路径，或带 path 列的 CSV）
+- 视频解码在进程池中并行进行，主进程同时对已解码的片段分批推理
+- 结果逐批追加写入 CSV，中断后重新运行会跳过已成功的视频，失败的视频重新处理；
+  输出为 .parquet 时先写入 <输出>.part.csv，全部完成后再转换
+
+用法:
+    python batch_score.py recordings/ --output scores.csv --workers 8
+    python batch_score.py manifest.txt --output scores.parquet --backend onnx
+"""
+
+import argparse
+import csv
+import functools
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from video_decoder import decode_clip, find_videos
+
+EMOTIONS = ['Boredom', 'Engagement', 'Confusion', 'Frustration']
+COLUMNS = (
+    ['path', 'status', 'error', 'final_score', 'dominant_emotion', 'confidence']
+    + [f'raw_{emotion}' for emotion in EMOTIONS]
+    + [f'prob_{emotion}' for emotion in EMOTIONS]
+    + ['model_version', 'backend']
+)
+
+
+def list_inputs(source):
+    """列出待处理的视频路径"""
+    if os.path.isdir(source):
+        return find_videos(source)
+
+    # 清单中的相对路径相对于清单所在目录
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, 'r', encoding='utf-8') as f:
+        if source.lower().endswith('.csv'):
+            paths = [row['path'] for row in csv.DictReader(f) if row.get('path')]
+        else:
+            paths = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    return [path if os.path.isabs(path) else os.path.join(base, path) for path in paths]
+
+
+def _init_worker():
+    # 每个子进程单线程解码，由进程数决定并行度
+    import cv2
+    cv2.setNumThreads(1)
+
+
+def _decode(path, budget=None, frame_size=128):
+    # 与在线服务使用同一份输入预算，超长或超大的视频直接记为失败
+    try:
+        return path, decode_clip(path, frame_size=frame_size, budget=budget), None
+    except Exception as e:
+        return path, None, str(e)
+
+
+def load_done(journal_path):
+    """读取已成功打分的视频路径，失败的视频在重新运行时会再次处理"""
+    if not os.path.exists(journal_path):
+        return set()
+    with open(journal_path, 'r', encoding='utf-8', newline='') as f:
+        return {row['path'] for row in csv.DictReader(f) if row.get('status') == 'ok'}
+
+
+def drop_failed_rows(journal_path):
+    """从结果文件中删除失败的行，避免重试成功后同一视频出现两行结果；返回删除的行数"""
+    if not os.path.exists(journal_path):
+        return 0
+    with open(journal_path, 'r', encoding='utf-8', newline='') as f:
+        rows = list(csv.DictReader(f))
+    kept = [row for row in rows if row.get('status') == 'ok']
+    if len(kept) == len(rows):
+        return 0
+    temp_path = journal_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(kept)
+    os.replace(temp_path, journal_path)
+    return len(rows) - len(kept)
+
+
+def result_row(path, result, api):
+    row = {
+        'path': path,
+        'status': 'ok',
+        'error': '',
+        'final_score': round(result['final_score'], 4),
+        'dominant_emotion': result['dominant_emotion'],
+        'confidence': round(result['confidence'], 6),
+        'model_version': api.model_version,
+        'backend': api.backend.name
+    }
+    for emotion in EMOTIONS:
+        row[f'raw_{emotion}'] = result['emotions']['raw_scores'][emotion]
+        row[f'prob_{emotion}'] = result['emotions']['probabilities'][emotion]
+    return row
+
+
+def error_row(path, error, api):
+    return {'path': path, 'status': 'error', 'error': error,
+            'model_version': api.model_version, 'backend': api.backend.name}
+
+
+def run(args):
+    # 延迟导入：进程池子进程只需要解码，不必加载 torch 和模型
+    from emotion_recognition_api import EmotionRecognitionAPI
+
+    calibration_clips = None
+    if args.backend == 'int8':
+        from quantization import calibration_clips_from_dir
+        calibration_clips = calibration_clips_from_dir(args.calibration_dir)
+
+    api = EmotionRecognitionAPI(args.model_path, batching=False, backend=args.backend,
+                                max_batch_size=args.batch_size, cache_size=0,
+                                calibration_clips=calibration_clips)
+
+    parquet = args.output.lower().endswith('.parquet')
+    journal_path = args.output + '.part.csv' if parquet else args.output
+    if parquet and not os.path.exists(journal_path) and os.path.exists(args.output):
+        # 上次已转换为 parquet：还原为 CSV 以便继续追加
+        import pandas as pd
+        pd.read_parquet(args.output).to_csv(journal_path, index=False)
+
+    inputs = list_inputs(args.input)
+    done = set()
+    if not args.no_resume:
+        retried = drop_failed_rows(journal_path)
+        if retried:
+            print(f"🔁 上次失败的 {retried} 个视频将重新处理")
+        done = load_done(journal_path)
+    todo = [path for path in inputs if path not in done]
+    print(f"📂 共 {len(inputs)} 个视频，已完成 {len(inputs) - len(todo)} 个，待处理 {len(todo)} 个")
+
+    mode = 'a' if done else 'w'
+    processed = 0
+    failed = 0
+    started = time.monotonic()
+
+    with open(journal_path, mode, encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        if mode == 'w':
+            writer.writeheader()
+
+        def flush(batch):
+            nonlocal failed
+            try:
+                results = api.predict_buffers([buffer for _, buffer in batch])
+                rows = [result_row(path, result, api) for (path, _), result in zip(batch, results)]
+            except Exception as e:
+                rows = [error_row(path, f"情感预测失败: {e}", api) for path, _ in batch]
+                failed += len(rows)
+            writer.writerows(rows)
+            f.flush()
+            batch.clear()
+
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(args.workers, mp_context=context, initializer=_init_worker) as pool:
+            # 最多预取 workers * prefetch 个视频，推理期间子进程继续解码
+            pending = iter(todo)
+            in_flight = deque()
+            decode = functools.partial(_decode, budget=api.input_budget, frame_size=api.frame_size)
+
+            def refill():
+                while len(in_flight) < args.workers * args.prefetch:
+                    path = next(pending, None)
+                    if path is None:
+                        return
+                    in_flight.append(pool.submit(decode, path))
+
+            refill()
+            batch = []
+            while in_flight:
+                path, buffer, error = in_flight.popleft().result()
+                refill()
+                processed += 1
+                if error is not None:
+                    failed += 1
+                    writer.writerow(error_row(path, f"视频预处理失败: {error}", api))
+                else:
+                    batch.append((path, buffer))
+                if len(batch) >= args.batch_size:
+                    flush(batch)
+                if processed % args.log_every == 0:
+                    elapsed = time.monotonic() - started
+                    print(f"⏳ {processed}/{len(todo)}，{processed / elapsed:.1f} 个/秒，失败 {failed}")
+            if batch:
+                flush(batch)
+
+    elapsed = time.monotonic() - started
+    print(f"✅ 完成 {processed} 个视频，失败 {failed} 个，耗时 {elapsed:.1f}s"
+          f"（{processed / elapsed if elapsed else 0:.1f} 个/秒）")
+
+    if parquet:
+        try:
+            import pandas as pd
+            frame = pd.read_csv(journal_path)
+            frame.to_parquet(args.output, index=False)
+        except ImportError as e:
+            print(f"⚠️ 无法写入 parquet（{e}），结果保留在 {journal_path}")
+            return
+        os.unlink(journal_path)
+    print(f"💾 结果已保存到 {args.output}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="录制面试视频的离线批量情感打分")
+    parser.add_argument('input', help="视频目录或清单文件（.txt 每行一个路径，.csv 需有 path 列）")
+    parser.add_argument('--output', default='emotion_scores.csv', help="结果文件（.csv 或 .parquet）")
+    parser.add_argument('--model-path', default='best_fast_daisee_model.pth', help="模型权重文件")
+    parser.add_argument('--backend', default='eager', choices=['eager', 'torchscript', 'onnx', 'int8'], help="推理后端")
+    parser.add_argument('--calibration-dir', default=None, help="int8 量化的校准视频目录（--backend int8 时必填）")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="解码进程数")
+    parser.add_argument('--batch-size', type=int, default=32, help="每批推理的视频数")
+    parser.add_argument('--prefetch', type=int, default=4, help="每个解码进程预取的视频数")
+    parser.add_argument('--log-every', type=int, default=100, help="每处理多少个视频输出一次进度")
+    parser.add_argument('--no-resume', action='store_true', help="忽略已有结果，从头开始")
+    return parser
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.backend == 'int8' and not args.calibration_dir:
+        parser.error("--backend int8 需要通过 --calibration-dir 指定校准视频目录")
+    print("🎯 DAiSEE情感识别 - 批量打分")
+    print("=" * 50)
+    run(args)
+
+
+if __name__ == '__main__':
+    main()
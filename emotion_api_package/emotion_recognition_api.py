@@ -10,16 +10,37 @@ import torch
 import torch.nn as nn
 import numpy as np
 import cv2
-from torchvision import transforms
-from flask import Flask, request, jsonify
+from flask import Flask, g, request, jsonify
+from werkzeug.exceptions import RequestEntityTooLarge
 import base64
-import tempfile
 import json
+import functools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from inference_batcher import MicroBatcher
+from video_decoder import (InputBudgetError, VideoBudget, decode_clip, decoder_stats, iter_frames_at_interval,
+                           open_video, probe, to_model_rgb)
+from model_checkpoint import file_digest, load_checkpoint, read_sidecar, sidecar_path, verify_with_sidecar, write_sidecar
+from inference_backends import EagerBackend, create_backend, example_inputs, max_difference, measure_latency
+from quantization import model_size_bytes, output_mae_delta, quantize_model
+from session_state import SessionStateStore
+from result_cache import ResultCache, content_key
+from frame_payload import is_frame_payload, parse_frames
+import stage_timing
+from stage_timing import LatencyHistograms, ProfileCapture, stage
+
 # 设置设备
 device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 
+# 流式预测单个片段的采样帧数上限
+MAX_STREAM_FRAMES = 64
+
+# 时间线：每个窗口的采样帧数上限、单个视频的窗口数上限
+MAX_TIMELINE_FRAMES_PER_WINDOW = 64
+MAX_TIMELINE_WINDOWS = 2000
+
 class FastEmotionModel(nn.Module):
     """快速轻量化情感识别模型 - 正确架构"""
     
@@ -81,12 +102,20 @@ class FastEmotionModel(nn.Module):
         
         # CNN特征提取
         x = x.view(batch_size * seq_len, c, h, w)
-        features = self.conv_layers(x)  # (batch*seq, 128, 4, 4)
-        features = features.view(features.size(0), -1)  # (batch*seq, 2048)
+        features = self.frame_features(x)  # (batch*seq, 2048)
         
         # 重塑为序列
         features = features.view(batch_size, seq_len, -1)  # (batch, seq, 2048)
         
+        return self.classify_sequence(features)
+    
+    def frame_features(self, frames):
+        """逐帧CNN特征 (n, c, h, w) -> (n, 2048)，与所在序列无关，可在重叠窗口间复用"""
+        features = self.conv_layers(frames)  # (n, 128, 4, 4)
+        return features.view(features.size(0), -1)
+    
+    def classify_sequence(self, features):
+        """帧特征序列 (batch, seq, 2048) -> 情感分数 (batch, num_classes)"""
         # LSTM - 只取最后一个输出
         lstm_out, (hidden, _) = self.lstm(features)
         last_output = hidden[-1]  # 取最后一层的隐藏状态 (batch, 64)
@@ -95,12 +124,58 @@ class FastEmotionModel(nn.Module):
         output = self.classifier(last_output)
         
         return output
+    
+    def forward_step(self, x, state=None):
+        """流式推理：只对新帧提取CNN特征，从上一次的LSTM状态继续
+        
+        Args:
+            x: 新帧 (batch, new_frames, c, h, w)
+            state: 上一次返回的 (h, c)，为 None 时从零状态开始
+        
+        Returns:
+            (output, (h, c))；state 为 None 时 output 与 forward(x) 相同
+        """
+        batch_size, seq_len, c, h, w = x.size()
+        features = self.frame_features(x.view(batch_size * seq_len, c, h, w))
+        features = features.view(batch_size, seq_len, -1)
+        _, (hidden, cell) = self.lstm(features, state)
+        return self.classifier(hidden[-1]), (hidden, cell)
 
 class EmotionRecognitionAPI:
     """情感识别API类"""
     
-    def __init__(self, model_path='best_fast_daisee_model.pth'):
+    def __init__(self, model_path='best_fast_daisee_model.pth', batching=True,
+                 max_batch_size=16, max_wait_ms=5.0, verify_weights='auto',
+                 backend='eager', parity_atol=1e-4, calibration_clips=None,
+                 max_mae_delta=0.02, max_stream_sessions=1024, stream_idle_timeout=600.0,
+                 cache_size=1024, cache_dir=None, cache_disk_entries=None, input_budget=None,
+                 timeline_budget=None):
+        """
+        Args:
+            model_path: 模型权重文件路径
+            batching: 是否启用动态微批推理（并发请求合并为一次前向计算）
+            max_batch_size: 单批最多合并的视频片段数
+            max_wait_ms: 凑批的最长等待时间（毫秒）
+            verify_weights: 权重校验方式
+                'auto' - 有校验文件时核对文件摘要，没有时完整校验并生成校验文件
+                'strict' - 同 'auto'，并且核对每个参数的统计量
+                'full' - 每次都与随机初始化的模型逐个比较参数
+                'off'  - 不校验
+            backend: 推理后端 'eager' / 'torchscript' / 'onnx' / 'int8'，校验不通过时退回 eager
+            parity_atol: 后端与 eager 输出允许的最大绝对误差（int8 除外）
+            calibration_clips: int8 量化的校准视频（文件路径或视频字节列表）
+            max_mae_delta: int8 量化允许的最大 MAE 变化量，超过时不启用量化
+            max_stream_sessions: 流式推理最多保存的会话状态数
+            stream_idle_timeout: 流式会话空闲多少秒后清除状态
+            cache_size: 预测结果缓存的条目数（按视频内容寻址），0 表示不缓存
+            cache_dir: 预测结果缓存的落盘目录，为空时只缓存在内存
+            cache_disk_entries: 落盘缓存的最大文件数，超出时删除最久未访问的文件；为空时取 cache_size 的 8 倍
+            input_budget: 输入预算 VideoBudget（体积、分辨率、时长、解码耗时），为空时使用默认预算；
+                超出时在解码任何帧之前拒绝，长视频改为 seek 采样
+            timeline_budget: 时间线接口的输入预算；时间线需要读完整段视频，默认解码耗时上限为 120 秒
+        """
         self.device = device
+        self.verify_weights = verify_weights
         self.emotion_names = ['Boredom', 'Engagement', 'Confusion', 'Frustration']
         self.emotion_weights = {
             'Boredom': -1.0,      # 无聊是负面情绪
@@ -109,25 +184,84 @@ class EmotionRecognitionAPI:
             'Frustration': -1.5   # 挫折是强烈负面
         }
         
+        # 数据预处理：ImageNet 均值和标准差，形状 [1, C, 1, 1] 便于整批广播
+        self.frame_size = 128
+        self.norm_mean = torch.tensor([0.485, 0.456, 0.406], device=self.device).view(1, 3, 1, 1)
+        self.norm_std = torch.tensor([0.229, 0.224, 0.225], device=self.device).view(1, 3, 1, 1)
+        
+        # 输入预算：只读取容器头信息即可判断，超出时不解码
+        self.input_budget = input_budget if input_budget is not None else VideoBudget()
+        self.timeline_budget = timeline_budget if timeline_budget is not None else VideoBudget(max_decode_seconds=120.0)
+        
         # 加载模型
         self.model = self._load_model(model_path)
+        if backend == 'int8':
+            self.backend, self.backend_info = self._create_int8_backend(calibration_clips, max_mae_delta)
+        else:
+            self.backend, self.backend_info = self._create_backend(backend, model_path, parity_atol)
         
-        # 数据预处理
-        self.transforms = transforms.Compose([
-            transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
-        ])
+        # 预测结果缓存：键包含模型版本、推理后端和预处理配置，任一变化都不会命中旧结果
+        self.cache_config = {
+            'model': self.model_version,
+            'backend': self.backend.name,
+            'frame_size': self.frame_size,
+            'num_frames': 8,
+            'mean': self.norm_mean.flatten().tolist(),
+            'std': self.norm_std.flatten().tolist(),
+            'budget': self.input_budget.to_dict()
+        }
+        self.result_cache = ResultCache(cache_size, cache_dir, cache_disk_entries) if cache_size > 0 else None
+        
+        # 批量预测的解码线程池（OpenCV 解码时释放 GIL）。在这里创建，并发请求不会各自创建线程池；
+        # 线程在首次提交任务时才启动，prefork 主进程 fork 之前不会启动解码线程
+        self.max_batch_size = max(1, int(max_batch_size))
+        self._decode_pool = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1),
+                                               thread_name_prefix='emotion-decode')
+        
+        # 流式推理：按会话保存LSTM状态；TorchScript/ONNX 后端没有单步接口，流式推理使用 eager 模型
+        backend_model = getattr(self.backend, 'model', None)
+        self.stream_model = backend_model if isinstance(backend_model, FastEmotionModel) else self.model
+        self.stream_states = SessionStateStore(max_stream_sessions, stream_idle_timeout)
+        
+        # 动态微批推理引擎
+        self.batcher = None
+        if batching:
+            self.enable_batching(max_wait_ms)
+        
+        # 多进程服务模式下由 prefork_server 填写工作进程信息
+        self.worker_info = None
         
         print(f"🎯 情感识别API初始化完成")
         print(f"   设备: {self.device}")
         print(f"   模型路径: {model_path}")
+        print(f"   推理后端: {self.backend.name}")
+        print(f"   微批推理: {'开启 (最大批次 %d, 等待 %.1fms)' % (max_batch_size, max_wait_ms) if batching else '关闭'}")
+    
+    def enable_batching(self, max_wait_ms=5.0, max_queue=256):
+        """启用动态微批推理
+        
+        后台线程不会随 fork 复制，多进程服务模式下由每个工作进程在 fork 之后各自启用
+        """
+        if self.batcher is not None:
+            self.batcher.close()
+        self.batcher = MicroBatcher(
+            self.backend, self.device,
+            max_batch_size=self.max_batch_size,
+            max_wait_ms=max_wait_ms,
+            max_queue=max_queue
+        )
     
     def _load_model(self, model_path):
         """加载训练好的模型"""
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"模型文件不存在: {model_path}")
         
-        # 加载检查点
-        checkpoint = torch.load(model_path, map_location=self.device)
+        # 加载检查点（尽量使用内存映射）
+        checkpoint = load_checkpoint(model_path, self.device)
+        self.val_mae = checkpoint.get('val_mae')
+        # 文件摘要只计算一次，同时用于模型版本号和 sidecar 校验
+        digest = file_digest(model_path)
+        self.model_version = digest[:16]
         
         # 验证模型是否已训练
         if 'val_mae' not in checkpoint:
@@ -150,10 +284,110 @@ class EmotionRecognitionAPI:
         model.eval()
         
         # 验证模型权重非随机
-        self._verify_model_weights(model, checkpoint)
+        self._verify_checkpoint(model_path, model, checkpoint, digest)
         
         return model
     
+    def _create_backend(self, name, model_path, parity_atol):
+        """创建推理后端，与 eager 输出做一致性校验并测量延迟"""
+        eager = EagerBackend(self.model, self.device)
+        inputs = example_inputs(self.device)
+        info = {'requested': name, 'eager_ms': round(measure_latency(eager, inputs[0]), 2)}
+        if name == 'eager':
+            info.update(name='eager', latency_ms=info['eager_ms'], max_diff=0.0)
+            print(f"⚡ 推理后端: eager，单片段 {info['eager_ms']:.1f}ms")
+            return eager, info
+        
+        try:
+            # 导出结果按检查点摘要缓存，换模型后自动重新导出
+            cache_path = f"{model_path}.{self.model_version[:12]}.onnx" if name == 'onnx' else None
+            backend = create_backend(name, self.model, self.device, cache_path=cache_path)
+            diff = max_difference(backend, eager, inputs)
+        except Exception as e:
+            print(f"⚠️ 推理后端 {name} 初始化失败，使用 eager: {e}")
+            info.update(name='eager', latency_ms=info['eager_ms'], max_diff=0.0, error=str(e))
+            return eager, info
+        
+        if diff > parity_atol:
+            print(f"⚠️ 推理后端 {name} 与 eager 输出不一致 (最大误差 {diff:.2e})，使用 eager")
+            info.update(name='eager', latency_ms=info['eager_ms'], max_diff=0.0, rejected_diff=diff)
+            return eager, info
+        
+        info.update(name=name, latency_ms=round(measure_latency(backend, inputs[0]), 2), max_diff=diff)
+        print(f"⚡ 推理后端: {name}，单片段 {info['latency_ms']:.1f}ms "
+              f"(eager {info['eager_ms']:.1f}ms)，与 eager 最大误差 {diff:.2e}")
+        return backend, info
+    
+    def _create_int8_backend(self, calibration_clips, max_mae_delta):
+        """int8 量化后端：用校准视频确定激活范围，MAE 变化量超过阈值时退回 eager"""
+        eager = EagerBackend(self.model, self.device)
+        inputs = example_inputs(self.device)
+        info = {'requested': 'int8', 'eager_ms': round(measure_latency(eager, inputs[0]), 2)}
+        
+        def fallback(reason, **extra):
+            print(f"⚠️ 未启用 int8 量化，使用 eager: {reason}")
+            info.update(name='eager', latency_ms=info['eager_ms'], max_diff=0.0, error=reason, **extra)
+            return eager, info
+        
+        if self.device.type != 'cpu':
+            return fallback("int8 量化只支持 CPU 推理")
+        if not calibration_clips:
+            return fallback("缺少校准视频 calibration_clips")
+        
+        try:
+            clips = [self.preprocess_video(clip, is_base64=False) for clip in calibration_clips]
+            batches = [torch.cat(clips[i:i + 8]) for i in range(0, len(clips), 8)]
+            quantized = quantize_model(self.model, batches)
+            delta = output_mae_delta(self.model, quantized, batches)
+        except Exception as e:
+            return fallback(f"量化失败: {e}")
+        
+        # 量化前后输出的平均绝对差是 MAE 变化量的上界
+        info.update(
+            val_mae=self.val_mae,
+            mae_delta=round(delta, 6),
+            estimated_mae=round(self.val_mae + delta, 4) if self.val_mae is not None else None,
+            calibration_clips=len(clips),
+            float_size_kb=round(model_size_bytes(self.model) / 1024, 1),
+            int8_size_kb=round(model_size_bytes(quantized) / 1024, 1)
+        )
+        if delta > max_mae_delta:
+            return fallback(f"MAE 变化量 {delta:.4f} 超过阈值 {max_mae_delta}", rejected_delta=delta)
+        
+        backend = EagerBackend(quantized, self.device)
+        backend.name = 'int8'
+        info.update(name='int8', latency_ms=round(measure_latency(backend, inputs[0]), 2),
+                    max_diff=max_difference(backend, eager, inputs))
+        print(f"⚡ 推理后端: int8，单片段 {info['latency_ms']:.1f}ms (eager {info['eager_ms']:.1f}ms)，"
+              f"MAE 变化量 {delta:.4f}（验证MAE {self.val_mae} -> 至多 {info['estimated_mae']}），"
+              f"权重 {info['float_size_kb']}KB -> {info['int8_size_kb']}KB")
+        return backend, info
+    
+    def _verify_checkpoint(self, model_path, model, checkpoint, digest):
+        """按 verify_weights 校验检查点，优先使用 sidecar 校验文件"""
+        if self.verify_weights == 'off':
+            print(f"⚠️ 已跳过权重校验")
+            return
+        
+        state_dict = checkpoint['model_state_dict']
+        use_sidecar = self.verify_weights in ('auto', 'strict')
+        if use_sidecar:
+            sidecar = read_sidecar(model_path)
+            if sidecar is not None:
+                ok, detail = verify_with_sidecar(model_path, state_dict, sidecar, digest=digest,
+                                                 check_parameters=self.verify_weights == 'strict')
+                if ok:
+                    print(f"✅ 权重校验通过 ({detail})")
+                    return
+                print(f"⚠️ {detail}，改为完整校验")
+        
+        self._verify_model_weights(model, checkpoint)
+        
+        if use_sidecar:
+            extra = {'epoch': checkpoint.get('epoch'), 'val_mae': checkpoint.get('val_mae')}
+            if write_sidecar(model_path, state_dict, digest=digest, extra=extra):
+                print(f"💾 已生成校验文件: {sidecar_path(model_path)}")
+    
     def _verify_model_weights(self, model, checkpoint):
         """验证模型权重是否已训练（非随机）"""
         # 创建随机模型对比
@@ -178,138 +412,426 @@ class EmotionRecognitionAPI:
         else:
             raise ValueError(f"⚠️ 模型权重可能未充分训练 (差异: {weight_diff:.6f})")
     
-    def preprocess_video(self, video_data, is_base64=True):
-        """预处理视频数据"""
+    def preprocess_video(self, video_data, is_base64=True, num_frames=8):
+        """预处理视频数据
+        
+        Args:
+            video_data: base64字符串（is_base64=True），或视频文件路径 / 视频字节
+            is_base64: video_data 是否为base64编码
+            num_frames: 均匀采样的帧数
+        """
         try:
-            # 处理base64编码的视频
+            # 处理base64编码的视频，解码后直接在内存中读取，不落盘
             if is_base64:
-                video_bytes = base64.b64decode(video_data)
-                
-                # 保存到临时文件
-                with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as temp_file:
-                    temp_file.write(video_bytes)
-                    temp_path = temp_file.name
-            else:
-                temp_path = video_data
+                with stage('base64'):
+                    video_data = base64.b64decode(video_data)
             
             # 提取视频帧
-            frames = self._extract_frames(temp_path)
-            
-            # 清理临时文件
-            if is_base64 and os.path.exists(temp_path):
-                os.unlink(temp_path)
-            
-            return frames
+            return self._extract_frames(video_data, num_frames)
             
+        except InputBudgetError:
+            raise
         except Exception as e:
             raise ValueError(f"视频预处理失败: {e}")
     
-    def _extract_frames(self, video_path, num_frames=8):
-        """从视频中提取帧"""
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            raise ValueError("无法打开视频文件")
-        
-        frames = []
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    def _extract_frames(self, video, num_frames=8):
+        """从视频中提取帧，video 为文件路径或视频字节"""
+        return self._normalize(decode_clip(video, num_frames, self.frame_size, self.input_budget))
+    
+    def _normalize(self, buffer):
+        """uint8 [T, H, W, C] -> 归一化后的 float32 [1, T, C, H, W]
         
-        if total_frames > 0:
-            # 均匀采样帧
-            frame_indices = np.linspace(0, total_frames-1, num_frames, dtype=int)
-            
-            for frame_idx in frame_indices:
-                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-                ret, frame = cap.read()
-                if ret:
-                    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    frame = cv2.resize(frame, (128, 128))
-                    frames.append(frame)
-                else:
-                    if frames:
-                        frames.append(frames[-1])
-                    else:
-                        frames.append(np.zeros((128, 128, 3), dtype=np.uint8))
-        
-        cap.release()
-        
-        # 确保帧数
-        while len(frames) < num_frames:
-            if frames:
-                frames.append(frames[-1])
-            else:
-                frames.append(np.zeros((128, 128, 3), dtype=np.uint8))
-        
-        # 转换为tensor
-        frames = np.array(frames[:num_frames])
-        frames = torch.from_numpy(frames).float() / 255.0
-        frames = frames.permute(0, 3, 1, 2)  # [T, C, H, W]
-        
-        # 应用变换
-        frames_list = []
-        for i in range(frames.shape[0]):
-            frame = self.transforms(frames[i])
-            frames_list.append(frame)
-        frames = torch.stack(frames_list).unsqueeze(0)  # [1, T, C, H, W]
-        
-        return frames.to(self.device)
+        整批一次完成类型转换和 /255、减均值、除标准差，只分配一块 float 缓冲区；
+        运算顺序与 transforms.Normalize 相同，结果逐位一致。
+        """
+        with stage('preprocess'):
+            frames = torch.from_numpy(buffer).to(self.device).permute(0, 3, 1, 2)  # [T, C, H, W]
+            output = torch.empty(frames.shape, dtype=torch.float32, device=self.device)
+            output.copy_(frames)
+            output.div_(255.0).sub_(self.norm_mean).div_(self.norm_std)
+            return output.unsqueeze(0)  # [1, T, C, H, W]
+    
+    def _infer(self, frames):
+        """模型推理，返回单个片段的原始输出；启用微批时与并发请求合并计算（耗时含排队）"""
+        with stage('inference'):
+            if self.batcher is not None and not stage_timing.torch_profiling():
+                return self.batcher.infer(frames)
+            return self.backend(frames)[0]
     
     def predict_emotions(self, video_data, is_base64=True):
         """预测情感"""
         try:
+            if is_base64:
+                try:
+                    with stage('base64'):
+                        video_data = base64.b64decode(video_data)
+                except Exception as e:
+                    raise ValueError(f"视频预处理失败: {e}")
+            
+            # 相同视频内容直接返回缓存的模型输出，跳过解码和推理（文件路径内容可能变化，不缓存）
+            cache_key = None
+            if self.result_cache is not None and isinstance(video_data, (bytes, bytearray, memoryview)):
+                with stage('cache'):
+                    cache_key = content_key(video_data, self.cache_config)
+                    cached = self.result_cache.get(cache_key)
+                if cached is not None:
+                    return self._build_result(np.asarray(cached, dtype=np.float32))
+            
             # 预处理视频
-            frames = self.preprocess_video(video_data, is_base64)
+            frames = self.preprocess_video(video_data, is_base64=False)
             
             # 模型预测
-            with torch.no_grad():
-                raw_output = self.model(frames).cpu().numpy()[0]
+            raw_output = self._infer(frames)
+            
+            if cache_key is not None:
+                self.result_cache.put(cache_key, raw_output.tolist())
+            
+            return self._build_result(raw_output)
+            
+        except InputBudgetError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"情感预测失败: {e}")
+    
+    def infer_batch(self, clips):
+        """对多个 [1, T, C, H, W] 片段按 max_batch_size 分批推理，返回原始输出列表"""
+        outputs = []
+        for start in range(0, len(clips), self.max_batch_size):
+            batch = torch.cat(clips[start:start + self.max_batch_size]).to(self.device)
+            outputs.extend(self.backend(batch))
+        return outputs
+    
+    def predict_buffers(self, buffers):
+        """对已解码的 uint8 [T, H, W, 3] 片段（decode_clip 的输出）分批推理，返回与输入顺序一致的结果列表
+        
+        供自行并行解码的调用方（如 batch_score）使用，不经过结果缓存
+        """
+        clips = [self._normalize(buffer) for buffer in buffers]
+        with stage('inference'):
+            outputs = self.infer_batch(clips)
+        return [self._build_result(raw_output) for raw_output in outputs]
+    
+    def predict_batch(self, videos, is_base64=False):
+        """批量预测：并行解码后分批推理
+        
+        Args:
+            videos: 视频列表（base64字符串、文件路径或视频字节）
+        
+        Returns:
+            与输入顺序一致的结果列表，失败项为 {'error': 原因}
+        """
+        results = [None] * len(videos)
+        pending = []  # (下标, 视频字节或路径, 缓存键)
+        for index, video in enumerate(videos):
+            try:
+                if is_base64:
+                    with stage('base64'):
+                        video = base64.b64decode(video)
+            except Exception as e:
+                results[index] = {'error': f"视频预处理失败: {e}"}
+                continue
+            cache_key = None
+            if self.result_cache is not None and isinstance(video, (bytes, bytearray, memoryview)):
+                with stage('cache'):
+                    cache_key = content_key(video, self.cache_config)
+                    cached = self.result_cache.get(cache_key)
+                if cached is not None:
+                    results[index] = self._build_result(np.asarray(cached, dtype=np.float32))
+                    continue
+            pending.append((index, video, cache_key))
+        
+        futures = [self._decode_pool.submit(decode_clip, video, 8, self.frame_size, self.input_budget) for _, video, _ in pending]
+        
+        decoded = []
+        for (index, _, cache_key), future in zip(pending, futures):
+            try:
+                # 解码在线程池中并行进行，这里记录的是等待解码完成的时间
+                with stage('decode'):
+                    buffer = future.result()
+                decoded.append((index, cache_key, self._normalize(buffer)))
+            except Exception as e:
+                results[index] = {'error': f"视频预处理失败: {e}"}
+        
+        try:
+            with stage('inference'):
+                outputs = self.infer_batch([frames for _, _, frames in decoded])
+        except Exception as e:
+            for index, _, _ in decoded:
+                results[index] = {'error': f"情感预测失败: {e}"}
+            return results
+        
+        for (index, cache_key, _), raw_output in zip(decoded, outputs):
+            if cache_key is not None:
+                self.result_cache.put(cache_key, raw_output.tolist())
+            results[index] = self._build_result(raw_output)
+        return results
+    
+    def predict_frames(self, frames):
+        """用预提取的帧预测情感，跳过视频解码
+        
+        Args:
+            frames: uint8 RGB 数组 [T, H, W, 3]；帧数不等于 8 时均匀采样，尺寸不符时缩放
+        """
+        try:
+            frames = np.ascontiguousarray(frames)
+            self.input_budget.check_frame_shape(frames.shape[2], frames.shape[1])
+            cache_key = None
+            if self.result_cache is not None:
+                config = dict(self.cache_config, input='frames', shape=list(frames.shape))
+                with stage('cache'):
+                    cache_key = content_key(memoryview(frames).cast('B'), config)
+                    cached = self.result_cache.get(cache_key)
+                if cached is not None:
+                    return self._build_result(np.asarray(cached, dtype=np.float32))
+            
+            num_frames = self.cache_config['num_frames']
+            indices = np.linspace(0, frames.shape[0] - 1, num_frames, dtype=int)
+            buffer = np.empty((num_frames, self.frame_size, self.frame_size, 3), dtype=np.uint8)
+            for i, index in enumerate(indices):
+                frame = frames[index]
+                if frame.shape[:2] != (self.frame_size, self.frame_size):
+                    frame = cv2.resize(frame, (self.frame_size, self.frame_size))
+                buffer[i] = frame
+            
+            raw_output = self._infer(self._normalize(buffer))
+            
+            if cache_key is not None:
+                self.result_cache.put(cache_key, raw_output.tolist())
+            
+            return self._build_result(raw_output)
+            
+        except InputBudgetError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"情感预测失败: {e}")
+    
+    def predict_stream(self, session_id, video_data, is_base64=True, num_frames=8, reset=False):
+        """流式预测：只处理本次上传的新片段，延续该会话的LSTM状态
+        
+        Args:
+            session_id: 会话ID（例如面试会话）
+            video_data: 新的视频片段，格式同 predict_emotions
+            num_frames: 从该片段中均匀采样的帧数（1 到 MAX_STREAM_FRAMES）
+            reset: 是否丢弃之前的状态，从头开始
+        
+        Returns:
+            与 predict_emotions 相同的结果，另含 stream 字段（已处理帧数、片段数）
+        """
+        if not 1 <= num_frames <= MAX_STREAM_FRAMES:
+            raise ValueError(f"num_frames 需在 1 到 {MAX_STREAM_FRAMES} 之间")
+        
+        try:
+            frames = self.preprocess_video(video_data, is_base64, num_frames=num_frames)
+            state = self.stream_states.get(session_id)
+            with state.lock:
+                if reset:
+                    state.reset()
+                with torch.no_grad(), stage('inference'):
+                    output, state.hidden = self.stream_model.forward_step(frames, state.hidden)
+                state.frames_seen += frames.size(1)
+                state.chunks += 1
+                stream_info = dict(state.to_dict(), session_id=session_id)
+            
+            result = self._build_result(output.cpu().numpy()[0])
+            result['stream'] = stream_info
+            return result
+            
+        except InputBudgetError:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"流式情感预测失败: {e}")
+    
+    def end_stream(self, session_id):
+        """结束流式会话，返回其统计信息（不存在时返回 None）"""
+        state = self.stream_states.pop(session_id)
+        return dict(state.to_dict(), session_id=session_id) if state is not None else None
+    
+    def predict_timeline(self, video_data, is_base64=True, window_seconds=10.0, stride_seconds=5.0,
+                         frames_per_window=8):
+        """长视频情感时间线：按滑动窗口给出逐段情感分数
+        
+        视频只顺序解码一遍，每个采样帧的CNN特征只计算一次，在重叠窗口间复用；
+        内存中只保留最近一个窗口的帧特征，与视频长度无关。
+        
+        Args:
+            video_data: 视频数据，格式同 predict_emotions
+            window_seconds: 窗口长度（秒）
+            stride_seconds: 相邻窗口起点的间隔（秒）
+            frames_per_window: 每个窗口均匀采样的帧数（1 到 MAX_TIMELINE_FRAMES_PER_WINDOW），
+                采样间隔 window_seconds / frames_per_window 不能小于视频的帧间隔
+        
+        Returns:
+            {'windows': [...], 'summary': {...}}，每个窗口含起止时间、分数和主要情感；
+            视频末尾不足一个步长的部分由一个与结尾对齐的窗口覆盖（tail 为 True）
+        
+        Raises:
+            ValueError: 参数超出范围，或窗口数超过 MAX_TIMELINE_WINDOWS
+            InputBudgetError: 超出 timeline_budget（体积、分辨率、时长、解码耗时）
+        """
+        if window_seconds <= 0 or stride_seconds <= 0:
+            raise ValueError("window_seconds、stride_seconds 需大于0")
+        if not 1 <= frames_per_window <= MAX_TIMELINE_FRAMES_PER_WINDOW:
+            raise ValueError(f"frames_per_window 需在 1 到 {MAX_TIMELINE_FRAMES_PER_WINDOW} 之间")
+        
+        try:
+            if is_base64:
+                try:
+                    with stage('base64'):
+                        video_data = base64.b64decode(video_data)
+                except Exception as e:
+                    raise ValueError(f"视频预处理失败: {e}")
             
-            # 将原始输出转换为0-3范围（如果需要）
-            emotions_raw = np.clip(raw_output, 0, 3)
+            interval = window_seconds / frames_per_window
+            stride = max(1, round(stride_seconds / interval))  # 窗口步长（采样帧数）
+            features = deque(maxlen=frames_per_window)
+            timestamps = deque(maxlen=frames_per_window)
+            pending = []
+            pending_times = []
+            windows = []
+            sampled = 0
             
-            # 计算情感占比（软max归一化）
-            emotions_exp = np.exp(emotions_raw - np.max(emotions_raw))  # 数值稳定
-            emotions_prob = emotions_exp / np.sum(emotions_exp)
+            def classify(window_features, window_times):
+                with stage('inference'):
+                    sequence = torch.stack(list(window_features)).unsqueeze(0)
+                    output = self.stream_model.classify_sequence(sequence).cpu().numpy()[0]
+                result = self._build_result(output)
+                return {
+                    'start': round(window_times[0], 3),
+                    'end': round(window_times[0] + window_seconds, 3),
+                    'final_score': result['final_score'],
+                    'dominant_emotion': result['dominant_emotion'],
+                    'confidence': result['confidence'],
+                    'percentages': result['emotions']['percentages']
+                }
             
-            # 计算加权情感分数
-            weighted_score = 0
-            for i, emotion in enumerate(self.emotion_names):
-                weighted_score += emotions_prob[i] * self.emotion_weights[emotion]
+            def add_window(window):
+                if len(windows) >= MAX_TIMELINE_WINDOWS:
+                    raise ValueError(f"窗口数超过上限 {MAX_TIMELINE_WINDOWS}，请增大 stride_seconds")
+                windows.append(window)
             
-            # 将分数映射到0-100范围，50为中性
-            final_score = 50 + weighted_score * 25  # [-2, 2] -> [0, 100]
-            final_score = np.clip(final_score, 0, 100)
+            def consume():
+                # 攒一批帧一次性提取CNN特征，再逐帧推进滑动窗口
+                nonlocal sampled
+                batch = self._normalize(np.stack(pending))[0]
+                with stage('features'):
+                    batch_features = self.stream_model.frame_features(batch)
+                for feature, timestamp in zip(batch_features, pending_times):
+                    features.append(feature)
+                    timestamps.append(timestamp)
+                    sampled += 1
+                    if sampled >= frames_per_window and (sampled - frames_per_window) % stride == 0:
+                        add_window(classify(features, timestamps))
+                pending.clear()
+                pending_times.clear()
             
-            # 构建结果
-            result = {
+            transform = functools.partial(to_model_rgb, frame_size=self.frame_size)
+            with torch.no_grad():
+                # 时间线需要读完整段视频，使用单独的 timeline_budget：解码耗时上限更宽，但同样有上限
+                with open_video(video_data, budget=self.timeline_budget) as cap:
+                    self._check_timeline_shape(probe(cap), interval, stride, window_seconds, frames_per_window)
+                    deadline = self.timeline_budget.deadline()
+                    for timestamp, frame in iter_frames_at_interval(cap, interval, transform, deadline):
+                        pending.append(frame)
+                        pending_times.append(timestamp)
+                        if len(pending) >= self.max_batch_size:
+                            consume()
+                    if pending:
+                        consume()
+                
+                if sampled == 0:
+                    raise ValueError("无法从视频中读取帧")
+                tail = False
+                if sampled < frames_per_window:
+                    # 视频短于一个窗口：沿用最后一帧的特征补齐，与 decode_clip 处理缺帧的方式一致
+                    window_features = list(features) + [features[-1]] * (frames_per_window - sampled)
+                    add_window(classify(window_features, list(timestamps)))
+                elif (sampled - frames_per_window) % stride != 0:
+                    # 最后一个窗口之后还有不足一个步长的帧：补一个与结尾对齐的窗口，不丢弃视频末尾
+                    add_window(dict(classify(features, timestamps), tail=True))
+                    tail = True
+            
+            scores = [window['final_score'] for window in windows]
+            return {
                 'timestamp': datetime.now().isoformat(),
-                'emotions': {
-                    'raw_scores': {
-                        emotion: float(emotions_raw[i]) 
-                        for i, emotion in enumerate(self.emotion_names)
-                    },
-                    'probabilities': {
-                        emotion: float(emotions_prob[i]) 
-                        for i, emotion in enumerate(self.emotion_names)
-                    },
-                    'percentages': {
-                        emotion: float(emotions_prob[i] * 100) 
-                        for i, emotion in enumerate(self.emotion_names)
-                    }
-                },
-                'final_score': float(final_score),
-                'dominant_emotion': self.emotion_names[np.argmax(emotions_prob)],
-                'confidence': float(np.max(emotions_prob)),
-                'interpretation': self._interpret_score(final_score),
-                'model_info': {
-                    'mae': 0.6295,  # 当前最佳性能
-                    'accuracy_improvement': '+10.19%'
+                'windows': windows,
+                'summary': {
+                    'windows': len(windows),
+                    'frames_sampled': sampled,
+                    'window_seconds': window_seconds,
+                    'stride_seconds': stride * interval,
+                    'tail_window': tail,
+                    'mean_score': float(np.mean(scores)),
+                    'min_score': float(np.min(scores)),
+                    'max_score': float(np.max(scores))
                 }
             }
             
-            return result
-            
+        except ValueError:
+            # 包括 InputBudgetError：参数或输入的问题，由接口返回 400 / 413
+            raise
         except Exception as e:
-            raise RuntimeError(f"情感预测失败: {e}")
+            raise RuntimeError(f"情感时间线预测失败: {e}")
+    
+    @staticmethod
+    def _check_timeline_shape(info, interval, stride, window_seconds, frames_per_window):
+        """按容器头信息在解码前检查采样间隔和窗口数"""
+        fps = info['fps']
+        if fps and interval * fps < 1 - 1e-6:
+            raise ValueError(f"采样间隔 {interval:.3f} 秒小于帧间隔 {1 / fps:.3f} 秒，"
+                             f"请增大 window_seconds 或减小 frames_per_window")
+        duration = info['duration']
+        if duration:
+            samples = int(duration / interval) + 1
+            expected = max(0, samples - frames_per_window) // stride + 2
+            if expected > MAX_TIMELINE_WINDOWS:
+                raise ValueError(f"预计窗口数 {expected} 超过上限 {MAX_TIMELINE_WINDOWS}，请增大 stride_seconds")
+    
+    def _build_result(self, raw_output):
+        """把模型原始输出转换为接口结果"""
+        # 将原始输出转换为0-3范围（如果需要）
+        emotions_raw = np.clip(raw_output, 0, 3)
+        
+        # 计算情感占比（软max归一化）
+        emotions_exp = np.exp(emotions_raw - np.max(emotions_raw))  # 数值稳定
+        emotions_prob = emotions_exp / np.sum(emotions_exp)
+        
+        # 计算加权情感分数
+        weighted_score = 0
+        for i, emotion in enumerate(self.emotion_names):
+            weighted_score += emotions_prob[i] * self.emotion_weights[emotion]
+        
+        # 将分数映射到0-100范围，50为中性
+        final_score = 50 + weighted_score * 25  # [-2, 2] -> [0, 100]
+        final_score = np.clip(final_score, 0, 100)
+        
+        # 构建结果
+        result = {
+            'timestamp': datetime.now().isoformat(),
+            'emotions': {
+                'raw_scores': {
+                    emotion: float(emotions_raw[i]) 
+                    for i, emotion in enumerate(self.emotion_names)
+                },
+                'probabilities': {
+                    emotion: float(emotions_prob[i]) 
+                    for i, emotion in enumerate(self.emotion_names)
+                },
+                'percentages': {
+                    emotion: float(emotions_prob[i] * 100) 
+                    for i, emotion in enumerate(self.emotion_names)
+                }
+            },
+            'final_score': float(final_score),
+            'dominant_emotion': self.emotion_names[np.argmax(emotions_prob)],
+            'confidence': float(np.max(emotions_prob)),
+            'interpretation': self._interpret_score(final_score),
+            'model_info': {
+                'mae': 0.6295,  # 当前最佳性能
+                'accuracy_improvement': '+10.19%'
+            }
+        }
+        
+        return result
     
     def _interpret_score(self, score):
         """解释情感分数"""
@@ -327,9 +849,115 @@ class EmotionRecognitionAPI:
 # Flask API
 app = Flask(__name__)
 
+# 请求体上限：base64 编码的视频按 4/3 膨胀，另留 1MB 给 JSON 字段和表单边界。
+# 超过上限的上传在读取请求体之前即被拒绝（按 Content-Length 判断；分块上传读到上限时中止）
+REQUEST_OVERHEAD_BYTES = 1024 * 1024
+
+def request_body_limit(budget):
+    """按输入预算计算请求体的字节数上限，预算不限制体积时返回 None"""
+    if budget.max_bytes is None:
+        return None
+    return budget.max_bytes * 4 // 3 + REQUEST_OVERHEAD_BYTES
+
+app.config['MAX_CONTENT_LENGTH'] = request_body_limit(VideoBudget())
+
 # 全局API实例
 api_instance = None
 
+# 分阶段耗时统计和按需性能剖析
+latency_histograms = LatencyHistograms()
+profile_capture = ProfileCapture()
+
+# 不计时、不剖析的接口
+UNTIMED_ENDPOINTS = ('health_check', 'admin_latency', 'admin_profile')
+
+@app.before_request
+def _start_timing():
+    if request.endpoint in UNTIMED_ENDPOINTS:
+        return
+    g.timings, g.timing_token = stage_timing.start_request()
+    g.profile = profile_capture.maybe_profile(request.path)
+    g.profile.__enter__()
+
+@app.after_request
+def _report_timing(response):
+    """Server-Timing 响应头、响应中的 timings 字段和滚动直方图"""
+    timings = g.get('timings')
+    if timings is None:
+        return response
+    response.headers['Server-Timing'] = timings.server_timing()
+    latency_histograms.record(timings, request.endpoint or 'unknown')
+    if response.is_json:
+        body = response.get_json(silent=True)
+        if isinstance(body, dict):
+            body['timings'] = timings.to_dict()
+            response.set_data(app.json.dumps(body))
+    return response
+
+@app.teardown_request
+def _finish_timing(error=None):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile.__exit__(None, None, None)
+    token = g.pop('timing_token', None)
+    if token is not None:
+        stage_timing.finish_request(token)
+
+def _is_raw_video(mimetype):
+    return mimetype == 'application/octet-stream' or mimetype.startswith('video/')
+
+# 上传视频的接口及其输入预算（属性名）
+UPLOAD_BUDGETS = {'predict': 'input_budget', 'predict_file': 'input_budget', 'predict_timeline': 'timeline_budget'}
+
+@app.before_request
+def _check_upload_size():
+    """按 Content-Length 检查上传视频的体积，超出输入预算时在读取请求体之前返回 413"""
+    length = request.content_length
+    budget_name = UPLOAD_BUDGETS.get(request.endpoint)
+    if length is None or budget_name is None or api_instance is None:
+        return None
+    if request.endpoint == 'predict_file':
+        # 表单边界和字段名留出余量，文件本身读取后仍按 max_bytes 检查
+        size = length - REQUEST_OVERHEAD_BYTES
+    elif _is_raw_video(request.mimetype):
+        size = length
+    else:
+        return None
+    try:
+        getattr(api_instance, budget_name).check_size(size)
+    except InputBudgetError as e:
+        return jsonify({'error': str(e)}), 413
+    return None
+
+@app.errorhandler(RequestEntityTooLarge)
+def _request_too_large(error):
+    limit = request.max_content_length
+    return jsonify({'error': f'请求体过大（上限 {limit / 1024 ** 2:.0f}MB）'}), 413
+
+def _admin_allowed():
+    # 管理接口只接受本机请求
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+@app.route('/admin/latency', methods=['GET'])
+def admin_latency():
+    """各接口分阶段延迟的滚动统计"""
+    if not _admin_allowed():
+        return jsonify({'error': '仅允许本机访问'}), 403
+    return jsonify(latency_histograms.snapshot())
+
+@app.route('/admin/profile', methods=['GET', 'POST'])
+def admin_profile():
+    """性能剖析：POST {"requests": N, "mode": "cprofile" | "torch"} 剖析接下来的 N 个请求，GET 查看状态"""
+    if not _admin_allowed():
+        return jsonify({'error': '仅允许本机访问'}), 403
+    if request.method == 'GET':
+        return jsonify(profile_capture.status())
+    data = request.get_json(silent=True) or {}
+    try:
+        return jsonify(profile_capture.arm(data.get('requests', 1), data.get('mode', 'cprofile')))
+    except (TypeError, ValueError, ImportError) as e:
+        return jsonify({'error': str(e)}), 400
+
 def initialize_api():
     """初始化API"""
     global api_instance
@@ -350,17 +978,53 @@ def health_check():
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
         'model_loaded': api_instance is not None,
-        'device': str(device)
+        'device': str(device),
+        'backend': api_instance.backend_info,
+        'batching': api_instance.batcher.stats() if api_instance.batcher is not None else None,
+        'decoding': decoder_stats(),
+        'streaming': api_instance.stream_states.stats(),
+        'result_cache': api_instance.result_cache.stats() if api_instance.result_cache is not None else None,
+        'worker': api_instance.worker_info
     })
 
 @app.route('/predict', methods=['POST'])
 def predict():
-    """情感预测接口"""
+    """情感预测接口
+    
+    按 Content-Type 区分请求体:
+    - application/json: {"video": base64字符串, "is_base64": true}
+    - application/octet-stream 或 video/*: 视频原始字节
+    - application/x-npy 或 application/msgpack: 预提取的 uint8 RGB 帧 [T, H, W, 3]
+    """
     if api_instance is None:
         initialize_api()
     if api_instance is None:
         return jsonify({'error': 'API未初始化'}), 500
     
+    content_type = request.mimetype
+    if _is_raw_video(content_type):
+        body = request.get_data(cache=False)
+        if not body:
+            return jsonify({'error': '请求体为空'}), 400
+        try:
+            return jsonify(api_instance.predict_emotions(body, is_base64=False))
+        except InputBudgetError as e:
+            return jsonify({'error': str(e)}), 413
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    if is_frame_payload(content_type):
+        try:
+            frames = parse_frames(request.get_data(cache=False), content_type)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        try:
+            return jsonify(api_instance.predict_frames(frames))
+        except InputBudgetError as e:
+            return jsonify({'error': str(e)}), 413
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
     try:
         data = request.get_json()
         
@@ -375,8 +1039,53 @@ def predict():
         
         return jsonify(result)
         
+    except RequestEntityTooLarge:
+        raise
+    except InputBudgetError as e:
+        return jsonify({'error': str(e)}), 413
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# /predict_batch 单次请求最多包含的视频数
+MAX_BATCH_VIDEOS = 64
+
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    """批量情感预测接口
+    
+    - multipart/form-data: 多个 videos 文件
+    - application/json: {"videos": [base64字符串, ...]}
+    """
+    if api_instance is None:
+        initialize_api()
+    if api_instance is None:
+        return jsonify({'error': 'API未初始化'}), 500
+    
+    if request.files:
+        videos = [file.read() for file in request.files.getlist('videos')]
+        is_base64 = False
+    else:
+        data = request.get_json(silent=True) or {}
+        videos = data.get('videos')
+        is_base64 = True
+        if not isinstance(videos, list):
+            return jsonify({'error': '缺少videos字段'}), 400
+    
+    if not videos:
+        return jsonify({'error': '缺少videos'}), 400
+    if len(videos) > MAX_BATCH_VIDEOS:
+        return jsonify({'error': f'单次最多 {MAX_BATCH_VIDEOS} 个视频'}), 413
+    
+    try:
+        results = api_instance.predict_batch(videos, is_base64=is_base64)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    
+    return jsonify({
+        'results': results,
+        'succeeded': sum(1 for result in results if 'error' not in result),
+        'failed': sum(1 for result in results if 'error' in result)
+    })
 
 @app.route('/predict_file', methods=['POST'])
 def predict_file():
@@ -394,19 +1103,105 @@ def predict_file():
         if file.filename == '':
             return jsonify({'error': '未选择文件'}), 400
         
-        # 保存到临时文件
-        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as temp_file:
-            file.save(temp_file.name)
-            temp_path = temp_file.name
+        # 直接读取上传内容，在内存中解码
+        result = api_instance.predict_emotions(file.read(), is_base64=False)
         
-        # 预测情感
-        result = api_instance.predict_emotions(temp_path, is_base64=False)
+        return jsonify(result)
+        
+    except RequestEntityTooLarge:
+        raise
+    except InputBudgetError as e:
+        return jsonify({'error': str(e)}), 413
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/stream/<session_id>', methods=['POST', 'DELETE'])
+def predict_stream(session_id):
+    """流式情感预测接口：POST 提交新片段，DELETE 结束会话"""
+    if api_instance is None:
+        initialize_api()
+    if api_instance is None:
+        return jsonify({'error': 'API未初始化'}), 500
+    
+    if request.method == 'DELETE':
+        info = api_instance.end_stream(session_id)
+        if info is None:
+            return jsonify({'error': '会话不存在或已过期'}), 404
+        return jsonify(info)
+    
+    try:
+        data = request.get_json()
         
-        # 清理临时文件
-        os.unlink(temp_path)
+        if 'video' not in data:
+            return jsonify({'error': '缺少video字段'}), 400
+        
+        try:
+            num_frames = int(data.get('num_frames', 8))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'num_frames 格式错误'}), 400
+        
+        result = api_instance.predict_stream(
+            session_id,
+            data['video'],
+            is_base64=data.get('is_base64', True),
+            num_frames=num_frames,
+            reset=bool(data.get('reset', False))
+        )
         
         return jsonify(result)
         
+    except RequestEntityTooLarge:
+        raise
+    except InputBudgetError as e:
+        return jsonify({'error': str(e)}), 413
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/predict_timeline', methods=['POST'])
+def predict_timeline():
+    """长视频情感时间线接口
+    
+    - application/json: {"video": base64字符串, "window_seconds": 10, "stride_seconds": 5}
+    - application/octet-stream 或 video/*: 视频原始字节，窗口参数通过查询参数传入
+    """
+    if api_instance is None:
+        initialize_api()
+    if api_instance is None:
+        return jsonify({'error': 'API未初始化'}), 500
+    
+    content_type = request.mimetype
+    if _is_raw_video(content_type):
+        video = request.get_data(cache=False)
+        is_base64 = False
+        options = request.args
+    else:
+        options = request.get_json(silent=True) or {}
+        video = options.get('video')
+        is_base64 = options.get('is_base64', True)
+    if not video:
+        return jsonify({'error': '缺少视频数据'}), 400
+    
+    try:
+        window_seconds = float(options.get('window_seconds', 10.0))
+        stride_seconds = float(options.get('stride_seconds', window_seconds / 2))
+        frames_per_window = int(options.get('frames_per_window', 8))
+    except (TypeError, ValueError):
+        return jsonify({'error': '窗口参数格式错误'}), 400
+    
+    try:
+        result = api_instance.predict_timeline(
+            video, is_base64=is_base64,
+            window_seconds=window_seconds,
+            stride_seconds=stride_seconds,
+            frames_per_window=frames_per_window
+        )
+        return jsonify(result)
+    except InputBudgetError as e:
+        return jsonify({'error': str(e)}), 413
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
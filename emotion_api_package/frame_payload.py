@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预提取帧的上传格式解析
+
+客户端已经持有视频帧时，可以直接上传 uint8 的 [T, H, W, 3]（RGB）数组，跳过视频编解码:
+- application/x-npy: numpy 的 .npy 格式（np.save 的输出）
+- application/msgpack: {"shape": [T, H, W, 3], "dtype": "uint8", "data": <原始字节>}，需要安装 msgpack
+"""
+
+import io
+
+import numpy as np
+
+NPY_TYPES = ('application/x-npy', 'application/npy')
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack')
+
+# 单次上传的帧数上限，防止超大数组占满内存
+MAX_FRAMES = 1024
+
+
+def is_frame_payload(content_type):
+    return content_type in NPY_TYPES or content_type in MSGPACK_TYPES
+
+
+def _validate(frames):
+    if frames.dtype != np.uint8:
+        raise ValueError(f"帧数据类型应为 uint8，实际为 {frames.dtype}")
+    if frames.ndim != 4 or frames.shape[-1] != 3:
+        raise ValueError(f"帧数组形状应为 [T, H, W, 3]，实际为 {list(frames.shape)}")
+    if not 0 < frames.shape[0] <= MAX_FRAMES:
+        raise ValueError(f"帧数应在 1 到 {MAX_FRAMES} 之间，实际为 {frames.shape[0]}")
+    return frames
+
+
+def parse_frames(body, content_type):
+    """把请求体解析为 uint8 [T, H, W, 3] 数组"""
+    if content_type in NPY_TYPES:
+        try:
+            frames = np.load(io.BytesIO(body), allow_pickle=False)
+        except (ValueError, EOFError) as e:
+            # 空请求体时 np.load 抛出 EOFError
+            raise ValueError(f"无法解析 npy 数据: {e}")
+        return _validate(frames)
+
+    if content_type in MSGPACK_TYPES:
+        try:
+            import msgpack
+        except ImportError:
+            raise ValueError("服务端未安装 msgpack，请改用 application/x-npy 上传")
+        try:
+            payload = msgpack.unpackb(body, raw=False)
+            shape = tuple(int(n) for n in payload['shape'])
+            dtype = np.dtype(payload.get('dtype', 'uint8'))
+            frames = np.frombuffer(payload['data'], dtype=dtype).reshape(shape)
+        except (ValueError, KeyError, TypeError, msgpack.UnpackException) as e:
+            raise ValueError(f"无法解析 msgpack 数据: {e}")
+        return _validate(frames)
+
+    raise ValueError(f"不支持的帧数据格式: {content_type}")
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+推理后端 - 同一个 FastEmotionModel 的不同执行方式
+
+- eager: 直接执行 PyTorch 模型
+- torchscript: trace 后冻结并做推理优化（Conv+BN 融合、常量折叠）
+- onnx: 导出为 ONNX，由 ONNX Runtime 执行（需要 onnxruntime 和 onnxscript）
+
+所有后端都接受 [B, T, C, H, W] 的 float32 tensor，返回 numpy 数组 [B, num_classes]。
+启动时用固定的输入与 eager 输出做一致性校验，并测量单片段延迟。
+"""
+
+import os
+import statistics
+import time
+import warnings
+
+import torch
+
+
+class EagerBackend:
+    """直接执行 PyTorch 模型"""
+
+    name = 'eager'
+
+    def __init__(self, model, device):
+        self.model = model
+        self.device = device
+
+    def __call__(self, inputs):
+        with torch.no_grad():
+            return self.model(inputs).cpu().numpy()
+
+
+class TorchScriptBackend(EagerBackend):
+    """TorchScript 冻结图：BatchNorm 折叠进卷积，常量折叠"""
+
+    name = 'torchscript'
+
+    def __init__(self, model, device, example):
+        with torch.no_grad(), warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            traced = torch.jit.trace(model, example)
+            # optimize_for_inference 内部先 freeze，再做 Conv+BN 融合等推理优化
+            scripted = torch.jit.optimize_for_inference(traced)
+        super().__init__(scripted, device)
+
+
+class OnnxRuntimeBackend:
+    """导出为 ONNX 后由 ONNX Runtime 执行，批次维度可变"""
+
+    name = 'onnx'
+
+    def __init__(self, model, device, example, cache_path=None, num_threads=0):
+        """
+        Args:
+            model: eval 模式的 FastEmotionModel
+            device: 模型所在设备，CUDA 可用且 onnxruntime 支持时使用 CUDA
+            example: 导出用的示例输入，批次维度需大于 1（批次为 1 时会被固定为常量）
+            cache_path: 导出结果的缓存文件，存在时直接加载
+            num_threads: ONNX Runtime 算子内线程数，0 表示由 onnxruntime 决定
+        """
+        try:
+            import onnxruntime  # noqa: F401
+        except ImportError:
+            raise RuntimeError("ONNX 后端需要安装 onnxruntime: pip install onnxruntime onnx onnxscript")
+
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, 'rb') as f:
+                model_bytes = f.read()
+        else:
+            model_bytes = self._export(model, example)
+            if cache_path:
+                try:
+                    with open(cache_path + '.tmp', 'wb') as f:
+                        f.write(model_bytes)
+                    os.replace(cache_path + '.tmp', cache_path)
+                except OSError:
+                    pass
+
+        self.model_bytes = model_bytes
+        self.device = device
+        self.set_num_threads(num_threads)
+
+    def set_num_threads(self, num_threads):
+        """按新的线程数重建会话
+
+        ONNX Runtime 的线程池不能跨 fork 使用，多进程服务模式下每个工作进程 fork 之后调用一次
+        """
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = max(0, int(num_threads))
+        providers = ['CPUExecutionProvider']
+        if self.device.type == 'cuda' and 'CUDAExecutionProvider' in ort.get_available_providers():
+            providers.insert(0, 'CUDAExecutionProvider')
+        self.session = ort.InferenceSession(self.model_bytes, options, providers=providers)
+        self.input_name = self.session.get_inputs()[0].name
+
+    @staticmethod
+    def _export(model, example):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            program = torch.onnx.export(
+                model, (example,),
+                input_names=['frames'], output_names=['scores'],
+                dynamo=True, opset_version=18, verbose=False,
+                dynamic_shapes={'x': {0: torch.export.Dim('batch', min=1, max=1024)}}
+            )
+        return program.model_proto.SerializeToString()
+
+    def __call__(self, inputs):
+        return self.session.run(None, {self.input_name: inputs.detach().cpu().numpy()})[0]
+
+
+BACKENDS = ('eager', 'torchscript', 'onnx')
+
+
+def example_inputs(device, batch_sizes=(1, 3), seq_len=8, size=128, seed=0):
+    """固定随机种子生成的校验输入，覆盖单片段和多片段批次"""
+    generator = torch.Generator().manual_seed(seed)
+    return [
+        torch.randn(batch, seq_len, 3, size, size, generator=generator).to(device)
+        for batch in batch_sizes
+    ]
+
+
+def create_backend(name, model, device, cache_path=None, seq_len=8, size=128):
+    """按名称创建推理后端"""
+    if name == 'eager':
+        return EagerBackend(model, device)
+    example = torch.zeros(2, seq_len, 3, size, size, device=device)
+    if name == 'torchscript':
+        return TorchScriptBackend(model, device, example)
+    if name == 'onnx':
+        return OnnxRuntimeBackend(model, device, example, cache_path)
+    raise ValueError(f"不支持的推理后端: {name}（可选 {', '.join(BACKENDS)}）")
+
+
+def max_difference(backend, reference, inputs):
+    """后端输出与参考后端输出的最大绝对误差"""
+    return max(float(abs(backend(x) - reference(x)).max()) for x in inputs)
+
+
+def measure_latency(backend, inputs, runs=10, warmup=2):
+    """单次推理延迟的中位数（毫秒）"""
+    for _ in range(warmup):
+        backend(inputs)
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        backend(inputs)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+动态微批推理引擎
+把并发请求的视频片段合并成一个批次，只做一次前向计算，再把结果分发回各个请求
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import torch
+
+
+class MicroBatcher:
+    """动态微批推理：凑满 max_batch_size 或等待超过 max_wait_ms 即执行一批"""
+
+    def __init__(self, infer_fn, device, max_batch_size=16, max_wait_ms=5.0, max_queue=256):
+        """
+        Args:
+            infer_fn: 推理函数（见 inference_backends），输入 [B, T, C, H, W] tensor，返回 numpy [B, num_classes]
+            device: 推理设备
+            max_batch_size: 单批最多合并的片段数
+            max_wait_ms: 收到第一个片段后最多等待多少毫秒凑批
+            max_queue: 排队片段数上限，超出时 submit 抛出异常
+        """
+        self.infer_fn = infer_fn
+        self.device = device
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.max_seen_batch = 0
+        self.inference_seconds = 0.0
+
+        self._worker = threading.Thread(target=self._run, name="emotion-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, frames):
+        """提交一个 [1, T, C, H, W] 或 [T, C, H, W] 片段，返回 Future，结果为该片段的模型输出（numpy）"""
+        if self._closed:
+            raise RuntimeError("推理引擎已关闭")
+        if frames.dim() == 4:
+            frames = frames.unsqueeze(0)
+        future = Future()
+        try:
+            self._queue.put_nowait((frames, future))
+        except queue.Full:
+            raise RuntimeError("推理队列已满，请稍后再试")
+        return future
+
+    def infer(self, frames, timeout=None):
+        """同步推理单个片段"""
+        return self.submit(frames).result(timeout)
+
+    def _collect(self, first):
+        """以第一个片段为起点凑批，直到批次已满或等待超时"""
+        batch = [first]
+        size = first[0].size(0)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+            size += item[0].size(0)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = self._collect(first)
+            # 调用方已放弃的请求不再参与计算
+            batch = [(frames, future) for frames, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            # 帧数或分辨率不同的片段不能拼接，按形状分组各自前向
+            groups = {}
+            for item in batch:
+                groups.setdefault(tuple(item[0].shape[1:]), []).append(item)
+            for group in groups.values():
+                self._forward(group)
+
+    def _forward(self, group):
+        start = time.perf_counter()
+        try:
+            inputs = torch.cat([frames for frames, _ in group]).to(self.device)
+            outputs = self.infer_fn(inputs)
+        except Exception as e:
+            for _, future in group:
+                future.set_exception(e)
+            return
+        elapsed = time.perf_counter() - start
+
+        offset = 0
+        for frames, future in group:
+            count = frames.size(0)
+            future.set_result(outputs[offset] if count == 1 else outputs[offset:offset + count])
+            offset += count
+
+        with self._lock:
+            self.requests += len(group)
+            self.batches += 1
+            self.max_seen_batch = max(self.max_seen_batch, offset)
+            self.inference_seconds += elapsed
+
+    def stats(self):
+        """批处理统计信息"""
+        with self._lock:
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000,
+                'queued': self._queue.qsize(),
+                'requests': self.requests,
+                'batches': self.batches,
+                'avg_batch_size': round(self.requests / self.batches, 2) if self.batches else 0.0,
+                'max_seen_batch': self.max_seen_batch,
+                'avg_batch_ms': round(self.inference_seconds / self.batches * 1000, 2) if self.batches else 0.0
+            }
+
+    def close(self):
+        """停止后台线程，已排队的片段仍会处理完"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join()
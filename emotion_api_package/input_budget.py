@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频输入预算 - 体积、分辨率、时长和解码耗时的上限，以及只读容器头信息的 probe()
+
+打开视频后先用 probe() 读取容器头信息（编码、分辨率、帧率、帧数），超出 VideoBudget 的输入
+在解码任何帧之前被拒绝；解码过程中用 check_deadline() 限制耗时。
+
+视觉情绪服务（visionsimulation/emotion_recognition_api）也直接导入本模块。
+"""
+
+import time
+
+import cv2
+
+
+class InputBudgetError(ValueError):
+    """输入超出预算（体积、分辨率、时长或解码耗时）"""
+
+
+class VideoBudget:
+    """单个视频的输入预算，各项为 None 时不限制"""
+
+    def __init__(self, max_bytes=200 * 1024 * 1024, max_pixels=2560 * 1440, max_duration=3600.0,
+                 max_decode_frames=3000, max_decode_seconds=10.0):
+        """
+        Args:
+            max_bytes: 视频字节数上限
+            max_pixels: 单帧像素数（宽 x 高）上限，默认允许到 2560x1440
+            max_duration: 时长上限（秒）
+            max_decode_frames: 顺序读取的帧数上限；帧数更多的视频改为逐帧 seek 采样，
+                帧数未知的视频只读取前这么多帧
+            max_decode_seconds: 采样解码的耗时上限（秒），用于容器头信息与实际内容不符的输入
+        """
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.max_duration = max_duration
+        self.max_decode_frames = max_decode_frames
+        self.max_decode_seconds = max_decode_seconds
+
+    def check_size(self, size):
+        if self.max_bytes is not None and size > self.max_bytes:
+            raise InputBudgetError(f"视频过大: {size / 1024 ** 2:.1f}MB，上限 {self.max_bytes / 1024 ** 2:.0f}MB")
+
+    def check_frame_shape(self, width, height):
+        if self.max_pixels is not None and width * height > self.max_pixels:
+            raise InputBudgetError(f"分辨率过高: {width}x{height}，像素数上限 {self.max_pixels}")
+
+    def check(self, info):
+        """按容器头信息检查，超出预算时抛出 InputBudgetError"""
+        self.check_frame_shape(info['width'], info['height'])
+        if self.max_duration is not None and info['duration'] is not None and info['duration'] > self.max_duration:
+            raise InputBudgetError(f"视频过长: {info['duration']:.0f}秒，上限 {self.max_duration:.0f}秒")
+
+    def deadline(self):
+        if self.max_decode_seconds is None:
+            return None
+        return time.monotonic() + self.max_decode_seconds
+
+    def to_dict(self):
+        return {
+            'max_bytes': self.max_bytes,
+            'max_pixels': self.max_pixels,
+            'max_duration': self.max_duration,
+            'max_decode_frames': self.max_decode_frames,
+            'max_decode_seconds': self.max_decode_seconds
+        }
+
+
+def probe(cap):
+    """读取已打开视频的容器头信息，不解码任何帧
+
+    Returns:
+        {'codec', 'width', 'height', 'fps', 'frame_count', 'duration'}，容器没有记录的项为 None
+    """
+    fourcc = int(cap.get(cv2.CAP_PROP_FOURCC))
+    codec = ''.join(chr((fourcc >> (8 * i)) & 0xFF) for i in range(4)).strip('\0 ') if fourcc > 0 else ''
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = fps if fps and fps > 0 else None
+    frame_count = frame_count if frame_count > 0 else None
+    return {
+        'codec': codec or None,
+        'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        'fps': fps,
+        'frame_count': frame_count,
+        'duration': frame_count / fps if fps and frame_count else None
+    }
+
+
+def check_deadline(deadline):
+    """超过 deadline（time.monotonic() 时间，None 表示不限制）时抛出 InputBudgetError"""
+    if deadline is not None and time.monotonic() > deadline:
+        raise InputBudgetError("视频解码超时")
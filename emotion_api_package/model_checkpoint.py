@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型检查点加载与校验
+
+- load_checkpoint: 优先以内存映射方式加载（torch>=2.1 且为 zip 格式的检查点），
+  权重按需从页缓存读取，不必整份读入内存
+- 校验信息保存在检查点旁的 sidecar 文件（<模型文件>.verify.json）中，包含文件摘要
+  和每个参数的统计量。启动时只需计算一次文件摘要（同时用作模型版本号），不再构造
+  随机初始化的模型逐个比较参数；参数统计量的核对是可选的
+"""
+
+import hashlib
+import json
+import os
+
+import torch
+
+SIDECAR_SUFFIX = '.verify.json'
+SIDECAR_VERSION = 1
+
+
+def sidecar_path(model_path):
+    return model_path + SIDECAR_SUFFIX
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """文件的 sha256 摘要"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_checkpoint(model_path, map_location):
+    """加载检查点，能用内存映射时使用内存映射"""
+    try:
+        return torch.load(model_path, map_location=map_location, mmap=True)
+    except TypeError:
+        # 旧版 torch 不支持 mmap 参数
+        pass
+    except RuntimeError:
+        # 旧的非 zip 格式检查点无法内存映射
+        pass
+    return torch.load(model_path, map_location=map_location)
+
+
+def parameter_stats(state_dict):
+    """每个浮点参数的元素数、均值和平均绝对值"""
+    stats = {}
+    for name, tensor in state_dict.items():
+        if not torch.is_floating_point(tensor):
+            continue
+        values = tensor.detach().double()
+        stats[name] = {
+            'numel': values.numel(),
+            'mean': float(values.mean()) if values.numel() else 0.0,
+            'abs_mean': float(values.abs().mean()) if values.numel() else 0.0
+        }
+    return stats
+
+
+def write_sidecar(model_path, state_dict, digest=None, extra=None):
+    """生成校验 sidecar 文件，写入失败（例如只读文件系统）时返回 False"""
+    payload = {
+        'version': SIDECAR_VERSION,
+        'file_size': os.path.getsize(model_path),
+        'sha256': digest or file_digest(model_path),
+        'parameters': parameter_stats(state_dict)
+    }
+    if extra:
+        payload.update(extra)
+    try:
+        temp_path = sidecar_path(model_path) + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, sidecar_path(model_path))
+        return True
+    except OSError:
+        return False
+
+
+def read_sidecar(model_path):
+    """读取 sidecar 文件，不存在或无法解析时返回 None"""
+    try:
+        with open(sidecar_path(model_path), 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if payload.get('version') != SIDECAR_VERSION:
+        return None
+    return payload
+
+
+def verify_with_sidecar(model_path, state_dict, sidecar, rel_tol=1e-6, digest=None, check_parameters=True):
+    """用 sidecar 核对检查点，返回 (是否通过, 说明)
+
+    Args:
+        digest: 已经算好的文件摘要，为空时重新计算
+        check_parameters: 是否再核对参数统计量；摘要一致时文件内容已经一致，
+            这一步会把所有参数转成 double 读一遍，只在需要排查加载问题时打开
+    """
+    if os.path.getsize(model_path) != sidecar.get('file_size'):
+        return False, "文件大小与校验信息不一致"
+    if (digest or file_digest(model_path)) != sidecar.get('sha256'):
+        return False, "文件摘要与校验信息不一致"
+    if not check_parameters:
+        return True, f"sha256 {sidecar['sha256'][:12]}"
+
+    expected = sidecar.get('parameters', {})
+    actual = parameter_stats(state_dict)
+    if set(expected) != set(actual):
+        return False, "参数列表与校验信息不一致"
+    for name, stats in actual.items():
+        reference = expected[name]
+        if stats['numel'] != reference['numel']:
+            return False, f"参数 {name} 的形状与校验信息不一致"
+        for key in ('mean', 'abs_mean'):
+            tolerance = rel_tol * max(1.0, abs(reference[key]))
+            if abs(stats[key] - reference[key]) > tolerance:
+                return False, f"参数 {name} 的统计量与校验信息不一致"
+    return True, f"sha256 {sidecar['sha256'][:12]}"
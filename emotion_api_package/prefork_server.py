@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多进程情感识别服务 - 主进程加载一次模型，再 fork 出多个工作进程
+
+- 模型只在主进程加载、校验一次；fork 之后各工作进程以写时复制方式共享同一份权重内存
+- 所有工作进程共用主进程创建的监听 socket，由内核把连接分给空闲的进程
+- 每个工作进程单独设置 PyTorch / OpenCV 线程数，避免进程之间、请求线程与算子线程之间争抢 CPU
+- 每个工作进程内只有一个推理线程（微批推理引擎），排队超过 queue_depth 的请求直接返回错误
+- 工作进程异常退出时由主进程重新 fork，无需重新加载模型
+
+注意：流式推理的会话状态和内存中的预测结果缓存属于各个工作进程，
+多进程模式下同一会话的片段可能落到不同进程；需要流式推理时使用 --workers 1，
+需要跨进程共享缓存时设置 --cache-dir。
+
+用法:
+    python prefork_server.py --workers 4 --threads 2
+    python prefork_server.py --workers 8 --threads 1 --backend onnx --port 5000
+"""
+
+import argparse
+import os
+import signal
+import socket
+import time
+
+import cv2
+import torch
+
+
+def plan_workers(workers=None, threads=None, cpu_count=None):
+    """按 CPU 核数确定工作进程数和每个进程的算子线程数
+
+    两者都未指定时每个核一个单线程进程；只指定一个时另一个按核数推算。
+
+    Raises:
+        ValueError: 指定的进程数或线程数小于 1
+    """
+    if workers is not None and workers < 1:
+        raise ValueError(f"工作进程数至少为 1，实际为 {workers}")
+    if threads is not None and threads < 1:
+        raise ValueError(f"线程数至少为 1，实际为 {threads}")
+    cpu_count = cpu_count or os.cpu_count() or 1
+    if threads is None:
+        threads = max(1, cpu_count // workers) if workers is not None else 1
+    if workers is None:
+        workers = max(1, cpu_count // threads)
+    return int(workers), int(threads)
+
+
+class PreforkServer:
+    """预先 fork 的工作进程池，主进程只负责监督"""
+
+    def __init__(self, app, api, host='0.0.0.0', port=5000, workers=None, threads=None,
+                 opencv_threads=1, queue_depth=64, max_wait_ms=5.0, batching=True, backlog=1024):
+        """
+        Args:
+            app: Flask 应用
+            api: 已在主进程加载完成的 EmotionRecognitionAPI（需以 batching=False 创建）
+            workers: 工作进程数，默认按 CPU 核数
+            threads: 每个工作进程的 PyTorch 算子线程数
+            opencv_threads: 每个工作进程的 OpenCV 线程数（解码并行由请求线程提供，默认 1）
+            queue_depth: 每个工作进程推理队列的最大长度，超出时请求立即失败
+            max_wait_ms: 微批推理的凑批等待时间（毫秒）
+            batching: 工作进程内是否启用微批推理
+            backlog: 监听 socket 的连接队列长度
+        """
+        self.app = app
+        self.api = api
+        self.host = host
+        self.port = port
+        self.workers, self.threads = plan_workers(workers, threads)
+        self.opencv_threads = max(0, int(opencv_threads))
+        self.queue_depth = max(1, int(queue_depth))
+        self.max_wait_ms = max_wait_ms
+        self.batching = batching
+        self.backlog = backlog
+
+        self._socket = None
+        self._children = {}  # pid -> 工作进程序号
+        self._stopping = False
+
+    def _bind(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(self.backlog)
+        sock.set_inheritable(True)
+        return sock
+
+    def _spawn(self, index):
+        pid = os.fork()
+        if pid:
+            self._children[pid] = index
+            return
+        # 子进程：不再返回主进程的监督循环
+        code = 0
+        try:
+            self._run_worker(index)
+        except KeyboardInterrupt:
+            pass
+        except Exception as e:
+            print(f"❌ 工作进程 {index} 异常退出: {e}")
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _run_worker(self, index):
+        from werkzeug.serving import make_server
+
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+
+        # 线程数必须在 fork 之后设置：主进程以单线程加载模型，没有启动过 OpenMP 线程池
+        torch.set_num_threads(self.threads)
+        cv2.setNumThreads(self.opencv_threads)
+        if hasattr(self.api.backend, 'set_num_threads'):
+            self.api.backend.set_num_threads(self.threads)
+        if self.batching:
+            self.api.enable_batching(self.max_wait_ms, max_queue=self.queue_depth)
+        self.api.worker_info = {
+            'index': index,
+            'pid': os.getpid(),
+            'workers': self.workers,
+            'torch_threads': torch.get_num_threads(),
+            'opencv_threads': cv2.getNumThreads(),
+            'queue_depth': self.queue_depth if self.batching else None
+        }
+
+        server = make_server(self.host, self.port, self.app, threaded=True, fd=self._socket.fileno())
+        print(f"   👷 工作进程 {index} 已启动 (pid {os.getpid()}, {self.threads} 线程)")
+        server.serve_forever()
+
+    def _stop(self, signum, frame):
+        self._stopping = True
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def serve_forever(self):
+        """启动全部工作进程并监督，收到 SIGINT/SIGTERM 时结束所有工作进程"""
+        self._socket = self._bind()
+        print(f"🚀 多进程服务启动: http://{self.host}:{self.port}")
+        print(f"   工作进程: {self.workers}，每进程 PyTorch 线程: {self.threads}，OpenCV 线程: {self.opencv_threads}")
+
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for index in range(self.workers):
+            self._spawn(index)
+
+        while self._children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            index = self._children.pop(pid, None)
+            if index is None or self._stopping:
+                continue
+            print(f"⚠️ 工作进程 {index} (pid {pid}) 退出，状态 {status}，重新启动")
+            # 避免启动即崩溃时疯狂重启
+            time.sleep(1.0)
+            self._spawn(index)
+
+        self._socket.close()
+        print("👋 多进程服务已停止")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="多进程情感识别服务（工作进程共享同一份模型权重）")
+    parser.add_argument('--host', default='0.0.0.0', help="监听地址")
+    parser.add_argument('--port', type=int, default=5000, help="监听端口")
+    parser.add_argument('--model-path', default='best_fast_daisee_model.pth', help="模型权重文件")
+    parser.add_argument('--backend', default='eager', choices=['eager', 'torchscript', 'onnx', 'int8'], help="推理后端")
+    parser.add_argument('--calibration-dir', default=None, help="int8 量化的校准视频目录（--backend int8 时必填）")
+    parser.add_argument('--workers', type=int, default=None, help="工作进程数，默认为 CPU 核数 / 线程数")
+    parser.add_argument('--threads', type=int, default=None, help="每个工作进程的 PyTorch 线程数，默认为 CPU 核数 / 进程数")
+    parser.add_argument('--opencv-threads', type=int, default=1, help="每个工作进程的 OpenCV 线程数")
+    parser.add_argument('--queue-depth', type=int, default=64, help="每个工作进程推理队列的最大长度")
+    parser.add_argument('--max-batch-size', type=int, default=16, help="微批推理的最大批次")
+    parser.add_argument('--max-wait-ms', type=float, default=5.0, help="微批推理的凑批等待时间（毫秒）")
+    parser.add_argument('--no-batching', action='store_true', help="工作进程内不启用微批推理")
+    parser.add_argument('--cache-dir', default=None, help="预测结果缓存的落盘目录（各工作进程共享）")
+    parser.add_argument('--cache-disk-entries', type=int, default=None, help="落盘缓存的最大文件数，默认为内存条目数的 8 倍")
+    return parser
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.backend == 'int8' and not args.calibration_dir:
+        parser.error("--backend int8 需要通过 --calibration-dir 指定校准视频目录")
+    for name in ('workers', 'threads'):
+        value = getattr(args, name)
+        if value is not None and value < 1:
+            parser.error(f"--{name} 至少为 1")
+    print("🎯 DAiSEE情感识别API服务（多进程）")
+    print("=" * 50)
+
+    if not os.path.exists(args.model_path):
+        print(f"❌ 模型文件不存在: {args.model_path}")
+        return
+
+    # 主进程以单线程加载和校验模型：fork 之前启动过的 OpenMP 线程池在子进程中不可用，会导致推理卡死
+    torch.set_num_threads(1)
+    cv2.setNumThreads(1)
+
+    import emotion_recognition_api
+    calibration_clips = None
+    if args.backend == 'int8':
+        from quantization import calibration_clips_from_dir
+        calibration_clips = calibration_clips_from_dir(args.calibration_dir)
+    api = emotion_recognition_api.EmotionRecognitionAPI(
+        args.model_path, batching=False, backend=args.backend,
+        max_batch_size=args.max_batch_size, cache_dir=args.cache_dir,
+        cache_disk_entries=args.cache_disk_entries,
+        calibration_clips=calibration_clips
+    )
+    emotion_recognition_api.api_instance = api
+
+    server = PreforkServer(
+        emotion_recognition_api.app, api,
+        host=args.host, port=args.port,
+        workers=args.workers, threads=args.threads,
+        opencv_threads=args.opencv_threads,
+        queue_depth=args.queue_depth,
+        max_wait_ms=args.max_wait_ms,
+        batching=not args.no_batching
+    )
+    if server.workers > 1:
+        print("⚠️ 流式推理的会话状态属于各个工作进程，需要 /stream 接口时请使用 --workers 1")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
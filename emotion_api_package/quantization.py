@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+int8 量化 - 卷积部分静态量化，LSTM 和全连接层动态量化
+
+- 卷积块先融合 Conv+BN+ReLU，再插入 QuantStub/DeQuantStub，用样例片段校准激活范围
+- LSTM（2048->64 的输入投影占了大部分权重）和分类器使用动态量化，权重 int8、激活按批次量化
+- 量化前后输出的平均绝对差是 MAE 变化量的上界（三角不等式），
+  超过阈值时不启用量化，继续使用浮点模型
+"""
+
+import copy
+import io
+import warnings
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from video_decoder import find_videos
+
+# 校准视频的数量上限：激活范围在几十个片段后基本稳定，再多只会拖慢启动
+MAX_CALIBRATION_CLIPS = 64
+
+
+class QuantizedConvStack(nn.Module):
+    """把浮点卷积块包装成静态量化模块：float 输入、float 输出"""
+
+    def __init__(self, conv_layers):
+        super().__init__()
+        from torch.ao.quantization import DeQuantStub, QuantStub
+        self.quant = QuantStub()
+        self.layers = copy.deepcopy(conv_layers)
+        self.dequant = DeQuantStub()
+
+    def forward(self, x):
+        # 量化卷积输出为 channels_last 布局，转回连续内存以便 FastEmotionModel 中的 view
+        return self.dequant(self.layers(self.quant(x))).contiguous()
+
+
+def _quantized_engine():
+    engines = torch.backends.quantized.supported_engines
+    for engine in ('x86', 'fbgemm', 'qnnpack'):
+        if engine in engines:
+            return engine
+    raise RuntimeError("当前 PyTorch 不支持 int8 量化推理")
+
+
+def quantize_model(model, calibration_inputs):
+    """返回量化后的模型副本，原模型不变
+
+    Args:
+        model: eval 模式、CPU 上的 FastEmotionModel
+        calibration_inputs: 校准用的 [B, T, C, H, W] tensor 列表
+    """
+    from torch.ao.quantization import convert, fuse_modules, get_default_qconfig, prepare, quantize_dynamic
+
+    engine = _quantized_engine()
+    torch.backends.quantized.engine = engine
+
+    quantized = copy.deepcopy(model).cpu().eval()
+    stack = QuantizedConvStack(quantized.conv_layers).eval()
+    # Conv2d + BatchNorm2d + ReLU 的下标，与 FastEmotionModel.conv_layers 对应
+    fuse_modules(stack.layers, [['0', '1', '2'], ['4', '5', '6'], ['8', '9', '10']], inplace=True)
+    stack.qconfig = get_default_qconfig(engine)
+    quantized.conv_layers = stack
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        prepare(stack, inplace=True)
+        with torch.no_grad():
+            for inputs in calibration_inputs:
+                quantized(inputs.cpu())
+        convert(stack, inplace=True)
+        quantized = quantize_dynamic(quantized, {nn.LSTM, nn.Linear}, dtype=torch.qint8)
+    return quantized
+
+
+def calibration_clips_from_dir(directory, limit=MAX_CALIBRATION_CLIPS):
+    """从目录中均匀选取至多 limit 个视频作为校准集，目录中没有视频时抛出 ValueError"""
+    paths = find_videos(directory)
+    if not paths:
+        raise ValueError(f"校准目录中没有视频文件: {directory}")
+    if len(paths) <= limit:
+        return paths
+    step = len(paths) / limit
+    return [paths[int(i * step)] for i in range(limit)]
+
+
+def output_mae_delta(reference, candidate, inputs):
+    """两个模型在同一批输入上输出的平均绝对差"""
+    diffs = []
+    with torch.no_grad():
+        for x in inputs:
+            diffs.append(np.abs(candidate(x.cpu()).numpy() - reference(x.cpu()).numpy()).ravel())
+    return float(np.concatenate(diffs).mean())
+
+
+def model_size_bytes(model):
+    """序列化后的 state_dict 大小"""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+情感预测结果缓存 - 按视频内容寻址
+
+缓存键为 blake2b(模型版本 + 推理后端 + 预处理配置 + 视频原始字节)，同一视频重复提交
+（超时重试、刷新页面）时直接返回模型原始输出，跳过解码和推理。
+内存中为有界 LRU，可选按键落盘，重启后仍可命中。落盘文件同样有数量上限，
+超出时按最近访问时间（文件修改时间，命中时刷新）删除最久未用的文件。
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def content_key(video_bytes, config):
+    """计算缓存键
+
+    Args:
+        video_bytes: 视频原始字节
+        config: 影响输出的配置（模型版本、后端、预处理参数），需可 JSON 序列化
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(json.dumps(config, sort_keys=True).encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(video_bytes)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """有界 LRU 缓存，可选落盘"""
+
+    def __init__(self, max_entries=1024, persist_dir=None, max_disk_entries=None):
+        """
+        Args:
+            max_entries: 内存中最多保留的条目数
+            persist_dir: 落盘目录，为空时只使用内存
+            max_disk_entries: 落盘文件的最大数量，为空时取 max_entries 的 8 倍
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.persist_dir = persist_dir or None
+        if self.persist_dir:
+            os.makedirs(self.persist_dir, exist_ok=True)
+        self.max_disk_entries = max(1, int(max_disk_entries or self.max_entries * 8))
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        # 清理只允许一个线程执行；_disk_estimate 为上次清理后的文件数加之后的写入次数，None 表示尚未清理
+        self._prune_lock = threading.Lock()
+        self._disk_estimate = None
+        self.disk_evicted = 0
+
+    def _path(self, key):
+        # 按前两位分目录，避免单个目录下文件过多
+        return os.path.join(self.persist_dir, key[:2], f"{key}.json")
+
+    def _store_locked(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key):
+        """读取缓存，未命中时返回 None"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+        if self.persist_dir:
+            path = self._path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    value = json.load(f)['value']
+            except (OSError, ValueError, KeyError):
+                value = None
+            if value is not None:
+                # 刷新修改时间，清理时按最近访问顺序淘汰
+                try:
+                    os.utime(path)
+                except OSError:
+                    pass
+                with self._lock:
+                    self._store_locked(key, value)
+                    self.hits += 1
+                    self.disk_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        """写入缓存，value 需可 JSON 序列化"""
+        with self._lock:
+            self._store_locked(key, value)
+
+        if self.persist_dir:
+            # 先写临时文件再原子替换，避免并发读到半个文件
+            path = self._path(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump({'value': value}, f)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"⚠️ 预测结果缓存落盘失败: {e}")
+            self._maybe_prune()
+
+    def _maybe_prune(self):
+        with self._lock:
+            self._disk_estimate = None if self._disk_estimate is None else self._disk_estimate + 1
+            due = self._disk_estimate is None or self._disk_estimate > self.max_disk_entries
+        if due and self._prune_lock.acquire(blocking=False):
+            try:
+                self._prune_disk()
+            finally:
+                self._prune_lock.release()
+
+    def _prune_disk(self):
+        """删除最久未访问的落盘文件，降到上限的 90% 以下，避免每次写入都扫描目录
+
+        同时删除写入中途失败残留的临时文件。多个进程共享目录时可能同时清理，
+        删除失败的文件直接跳过。
+        """
+        now = time.time()
+        files = []
+        stale = []
+        for root, _, names in os.walk(self.persist_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                try:
+                    mtime = os.stat(path).st_mtime
+                except OSError:
+                    continue
+                if name.endswith('.json'):
+                    files.append((mtime, path))
+                elif name.endswith('.tmp') and now - mtime > 60:
+                    stale.append(path)
+
+        files.sort()
+        excess = len(files) - int(self.max_disk_entries * 0.9) if len(files) > self.max_disk_entries else 0
+        removed = 0
+        for path in [path for _, path in files[:excess]] + stale:
+            try:
+                os.unlink(path)
+                removed += 1
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_estimate = len(files) - excess
+            self.disk_evicted += min(removed, excess)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'persistent': self.persist_dir is not None,
+                'max_disk_entries': self.max_disk_entries if self.persist_dir else None,
+                'disk_evicted': self.disk_evicted,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式推理的会话状态存储
+
+每个会话保存 LSTM 的 (h, c) 状态和已处理的帧数。存储有容量上限，
+超出时淘汰最久未使用的会话；空闲超过 idle_timeout 的会话也会被清除。
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class SessionState:
+    """单个会话的流式推理状态，lock 保证同一会话的片段按顺序处理"""
+
+    __slots__ = ('lock', 'hidden', 'frames_seen', 'chunks', 'created_at', 'updated_at')
+
+    def __init__(self, now=None):
+        self.lock = threading.Lock()
+        self.hidden = None  # LSTM 的 (h, c)，尚未处理任何帧时为 None
+        self.frames_seen = 0
+        self.chunks = 0
+        self.created_at = now if now is not None else time.time()
+        self.updated_at = self.created_at
+
+    def reset(self):
+        self.hidden = None
+        self.frames_seen = 0
+        self.chunks = 0
+
+    def to_dict(self):
+        return {
+            'frames_seen': self.frames_seen,
+            'chunks': self.chunks,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+
+
+class SessionStateStore:
+    """LRU + 空闲超时淘汰的会话状态存储"""
+
+    def __init__(self, max_sessions=1024, idle_timeout=600.0):
+        """
+        Args:
+            max_sessions: 最多保存的会话数，超出时淘汰最久未使用的会话
+            idle_timeout: 会话空闲多少秒后被清除
+        """
+        self.max_sessions = max(1, int(max_sessions))
+        self.idle_timeout = float(idle_timeout)
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+        self.evicted = 0
+        self.expired = 0
+
+    def _purge_locked(self, now):
+        # 按最近使用排序，过期的会话都在队首
+        while self._sessions:
+            session_id, state = next(iter(self._sessions.items()))
+            if now - state.updated_at <= self.idle_timeout:
+                break
+            del self._sessions[session_id]
+            self.expired += 1
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+
+    def get(self, session_id):
+        """获取会话状态，不存在时创建"""
+        now = time.time()
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                state = self._sessions[session_id] = SessionState(now)
+            else:
+                self._sessions.move_to_end(session_id)
+            state.updated_at = now
+            self._purge_locked(now)
+            return state
+
+    def pop(self, session_id):
+        """结束会话，返回其状态（不存在时返回 None）"""
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            self._purge_locked(time.time())
+            return {
+                'sessions': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'idle_timeout': self.idle_timeout,
+                'evicted': self.evicted,
+                'expired': self.expired
+            }
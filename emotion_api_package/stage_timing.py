@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分阶段耗时统计 - 每个请求各阶段（解码、预处理、推理等）的耗时、滚动直方图和按需性能剖析
+
+- start_request() 为当前线程开启一次请求计时，代码中任意位置用 `with stage('decode'):` 记录阶段耗时；
+  没有开启计时的线程（进程池、离线脚本）中 stage() 不做任何事
+- RequestTimings.server_timing() 生成 Server-Timing 响应头，浏览器开发者工具可以直接展示
+- LatencyHistograms 按接口和阶段保留最近的样本，给出分位数和分桶计数
+- ProfileCapture 对接下来的 N 个请求做 cProfile 或 torch.profiler 剖析，结果写入文件
+
+视觉情绪服务（visionsimulation/emotion_recognition_api）也直接导入本模块。
+"""
+
+import bisect
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar('stage_timings', default=None)
+_torch_profiling = contextvars.ContextVar('torch_profiling', default=False)
+
+# 直方图分桶上界（毫秒），最后一个桶为 +inf
+BUCKET_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+
+class RequestTimings:
+    """单个请求的分阶段耗时，同名阶段多次进入时累加"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = OrderedDict()  # 阶段名 -> 毫秒
+
+    def add(self, name, elapsed_ms):
+        self.stages[name] = self.stages.get(name, 0.0) + elapsed_ms
+
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def to_dict(self):
+        return {
+            'stages_ms': {name: round(ms, 3) for name, ms in self.stages.items()},
+            'total_ms': round(self.total_ms(), 3)
+        }
+
+    def server_timing(self):
+        """Server-Timing 响应头的值"""
+        entries = [f"{name};dur={ms:.2f}" for name, ms in self.stages.items()]
+        entries.append(f"total;dur={self.total_ms():.2f}")
+        return ', '.join(entries)
+
+
+def start_request():
+    """为当前线程开启请求计时，返回 (timings, token)，结束时把 token 交给 finish_request"""
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def finish_request(token):
+    _current.reset(token)
+
+
+def current():
+    """当前请求的计时对象，没有开启计时时为 None"""
+    return _current.get()
+
+
+def torch_profiling():
+    """当前线程是否正在被 torch.profiler 剖析
+
+    torch.profiler 只记录开启它的线程上的算子，剖析期间应在本线程内推理，不交给后台线程
+    """
+    return _torch_profiling.get()
+
+
+@contextmanager
+def stage(name):
+    """记录一个阶段的耗时"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, (time.perf_counter() - start) * 1000)
+
+
+class LatencyHistograms:
+    """按接口和阶段的滚动延迟统计，每个阶段保留最近 max_samples 个样本"""
+
+    def __init__(self, max_samples=2048):
+        self.max_samples = max(1, int(max_samples))
+        self._lock = threading.Lock()
+        self._samples = {}  # (接口, 阶段) -> deque
+
+    def record(self, timings, group='default'):
+        """记录一个请求的各阶段耗时和总耗时
+
+        Args:
+            timings: RequestTimings
+            group: 分组名，一般为接口名（不同接口的阶段构成不同）
+        """
+        with self._lock:
+            for name, ms in list(timings.stages.items()) + [('total', timings.total_ms())]:
+                samples = self._samples.get((group, name))
+                if samples is None:
+                    samples = self._samples[(group, name)] = deque(maxlen=self.max_samples)
+                samples.append(ms)
+
+    @staticmethod
+    def _summarize(samples):
+        ordered = sorted(samples)
+        count = len(ordered)
+
+        def percentile(p):
+            return round(ordered[min(count - 1, int(p * count))], 3)
+
+        # buckets[i] 为耗时不超过 BUCKET_BOUNDS_MS[i] 的样本数（不累计），最后一项为超过最大上界的样本数
+        buckets = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        for ms in ordered:
+            buckets[bisect.bisect_left(BUCKET_BOUNDS_MS, ms)] += 1
+        return {
+            'count': count,
+            'mean_ms': round(sum(ordered) / count, 3),
+            'p50_ms': percentile(0.5),
+            'p90_ms': percentile(0.9),
+            'p99_ms': percentile(0.99),
+            'max_ms': round(ordered[-1], 3),
+            'buckets': buckets
+        }
+
+    def snapshot(self):
+        """{分组: {阶段: 统计}}"""
+        with self._lock:
+            samples = {key: list(values) for key, values in self._samples.items()}
+        groups = {}
+        for (group, name), values in samples.items():
+            groups.setdefault(group, {})[name] = self._summarize(values)
+        return {'window': self.max_samples, 'bucket_bounds_ms': list(BUCKET_BOUNDS_MS), 'groups': groups}
+
+
+class ProfileCapture:
+    """对接下来的 N 个请求做性能剖析
+
+    同一时间只剖析一个请求（cProfile 和 torch.profiler 都不适合多个线程同时开启），
+    剖析期间到达的其他请求照常处理、不计入 N。
+    """
+
+    MODES = ('cprofile', 'torch')
+
+    def __init__(self, output_dir='profiles'):
+        self.output_dir = output_dir
+        self._lock = threading.Lock()
+        self._busy = threading.Lock()
+        self.mode = None
+        self.remaining = 0
+        self.sequence = 0
+        self.captured = []  # 已写入的剖析文件
+
+    def arm(self, requests, mode='cprofile'):
+        """剖析接下来的 requests 个请求"""
+        if mode not in self.MODES:
+            raise ValueError(f"不支持的剖析方式: {mode}（可选 {', '.join(self.MODES)}）")
+        if mode == 'torch':
+            import torch.profiler  # noqa: F401  提前报错，避免在请求中失败
+        requests = int(requests)
+        if requests < 1:
+            raise ValueError("requests 需不小于1")
+        with self._lock:
+            self.mode = mode
+            self.remaining = requests
+        return self.status()
+
+    def _claim(self):
+        with self._lock:
+            if self.remaining <= 0 or not self._busy.acquire(blocking=False):
+                return None
+            self.remaining -= 1
+            self.sequence += 1
+            return self.mode, self.sequence
+
+    @contextmanager
+    def maybe_profile(self, label='request'):
+        """已启用剖析且没有其他请求正在剖析时，剖析 with 块中的代码"""
+        claimed = self._claim()
+        if claimed is None:
+            yield
+            return
+
+        mode, sequence = claimed
+        os.makedirs(self.output_dir, exist_ok=True)
+        label = label.strip('/').replace('/', '_') or 'root'
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{sequence}-{label}"
+        try:
+            if mode == 'torch':
+                from torch.profiler import ProfilerActivity, profile
+                import torch
+                activities = [ProfilerActivity.CPU]
+                if torch.cuda.is_available():
+                    activities.append(ProfilerActivity.CUDA)
+                token = _torch_profiling.set(True)
+                try:
+                    with profile(activities=activities, record_shapes=True) as prof:
+                        yield
+                finally:
+                    _torch_profiling.reset(token)
+                path = os.path.join(self.output_dir, f"{name}.trace.json")
+                prof.export_chrome_trace(path)
+            else:
+                import cProfile
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    yield
+                finally:
+                    profiler.disable()
+                path = os.path.join(self.output_dir, f"{name}.pstats")
+                profiler.dump_stats(path)
+            with self._lock:
+                self.captured.append(path)
+        finally:
+            self._busy.release()
+
+    def status(self):
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'remaining': self.remaining,
+                'output_dir': os.path.abspath(self.output_dir),
+                'captured': list(self.captured[-20:])
+            }
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""测试从 emotion_api_package 目录导入模块（各模块按文件名平铺导入），不需要模型权重"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cv2
+import numpy as np
+import pytest
+import torch
+
+
+@pytest.fixture(scope="session")
+def checkpoint_path(tmp_path_factory):
+    """随机初始化的 FastEmotionModel 检查点，用于不依赖训练权重的测试"""
+    from emotion_recognition_api import FastEmotionModel
+
+    torch.manual_seed(1)
+    path = tmp_path_factory.mktemp("model") / "model.pth"
+    torch.save({"model_state_dict": FastEmotionModel().state_dict(), "val_mae": 0.3, "epoch": 1}, str(path))
+    return str(path)
+
+
+@pytest.fixture
+def make_api(checkpoint_path):
+    """按需构造 EmotionRecognitionAPI，默认不启用微批、不校验权重、不缓存结果"""
+    from emotion_recognition_api import EmotionRecognitionAPI
+
+    apis = []
+
+    def make(**kwargs):
+        options = dict(batching=False, verify_weights="off", cache_size=0)
+        options.update(kwargs)
+        api = EmotionRecognitionAPI(checkpoint_path, **options)
+        apis.append(api)
+        return api
+
+    yield make
+    for api in apis:
+        if api.batcher is not None:
+            api.batcher.close()
+
+
+def write_video(path, frames=20, fps=10.0, size=(64, 48)):
+    """写出一段逐帧变亮的 mp4 测试视频，返回路径"""
+    width, height = size
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    for i in range(frames):
+        writer.write(np.full((height, width, 3), (i * 10) % 256, dtype=np.uint8))
+    writer.release()
+    return str(path)
+
+
+@pytest.fixture
+def make_video(tmp_path):
+    """在临时目录中生成测试视频"""
+    def make(name="clip.mp4", **kwargs):
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return write_video(path, **kwargs)
+
+    return make
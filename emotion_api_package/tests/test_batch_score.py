@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""离线批量打分：输入列表、断点续跑和输入预算"""
+
+import csv
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import batch_score
+from video_decoder import VideoBudget
+
+
+def write_journal(path, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=batch_score.COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def test_list_inputs_from_directory_and_manifest(make_video, tmp_path):
+    first = make_video("videos/a.mp4", frames=2)
+    second = make_video("videos/nested/b.MP4", frames=2)
+    assert batch_score.list_inputs(str(tmp_path / "videos")) == sorted([first, second])
+
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text("# 注释\nvideos/a.mp4\n\n/abs/c.mp4\n", encoding="utf-8")
+    assert batch_score.list_inputs(str(manifest)) == [str(tmp_path / "videos/a.mp4"), "/abs/c.mp4"]
+
+
+def test_only_ok_rows_count_as_done(tmp_path):
+    journal = str(tmp_path / "scores.csv")
+    write_journal(journal, [
+        {"path": "ok.mp4", "status": "ok"},
+        {"path": "bad.mp4", "status": "error", "error": "视频预处理失败"},
+    ])
+    assert batch_score.load_done(journal) == {"ok.mp4"}
+
+    assert batch_score.drop_failed_rows(journal) == 1
+    with open(journal, encoding="utf-8", newline="") as f:
+        assert [row["path"] for row in csv.DictReader(f)] == ["ok.mp4"]
+    assert batch_score.drop_failed_rows(journal) == 0
+    assert batch_score.drop_failed_rows(str(tmp_path / "missing.csv")) == 0
+
+
+def test_decode_applies_the_input_budget(make_video):
+    path = make_video(frames=4, size=(64, 48))
+    _, buffer, error = batch_score._decode(path, budget=VideoBudget(), frame_size=32)
+    assert error is None and buffer.shape == (8, 32, 32, 3)
+
+    _, buffer, error = batch_score._decode(path, budget=VideoBudget(max_pixels=100))
+    assert buffer is None and "分辨率" in error
+
+
+def test_predict_buffers_matches_predict_emotions(make_api, make_video):
+    api = make_api()
+    path = make_video(frames=10, size=(128, 128))
+    _, buffer, _ = batch_score._decode(path, budget=api.input_budget, frame_size=api.frame_size)
+    with open(path, "rb") as f:
+        expected = api.predict_emotions(f.read(), is_base64=False)
+    result, = api.predict_buffers([buffer])
+    assert abs(result["final_score"] - expected["final_score"]) < 1e-4
+
+
+def test_concurrent_batches_share_one_decode_pool(make_api, make_video):
+    api = make_api()
+    pool = api._decode_pool
+    # 线程在首次提交任务时才启动，prefork 主进程中创建 API 不会留下解码线程
+    assert not pool._threads
+    with open(make_video(frames=8), "rb") as f:
+        video = f.read()
+
+    with ThreadPoolExecutor(max_workers=4) as requests:
+        batches = list(requests.map(lambda _: api.predict_batch([video, video], is_base64=False), range(4)))
+    assert all("error" not in result for results in batches for result in results)
+    assert api._decode_pool is pool
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""预提取帧上传：npy / msgpack 解析和形状、类型、帧数校验"""
+
+import io
+
+import numpy as np
+import pytest
+
+from frame_payload import MAX_FRAMES, is_frame_payload, parse_frames
+
+
+def npy(array):
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    return buffer.getvalue()
+
+
+def test_content_type_detection():
+    assert is_frame_payload("application/x-npy")
+    assert is_frame_payload("application/msgpack")
+    assert not is_frame_payload("application/json")
+
+
+def test_npy_round_trip():
+    frames = np.random.default_rng(0).integers(0, 255, (3, 8, 8, 3), dtype=np.uint8)
+    parsed = parse_frames(npy(frames), "application/x-npy")
+    assert parsed.dtype == np.uint8
+    assert np.array_equal(parsed, frames)
+
+
+@pytest.mark.parametrize("array", [
+    np.zeros((2, 8, 8, 3), dtype=np.float32),
+    np.zeros((8, 8, 3), dtype=np.uint8),
+    np.zeros((2, 8, 8, 4), dtype=np.uint8),
+    np.zeros((0, 8, 8, 3), dtype=np.uint8),
+    np.zeros((MAX_FRAMES + 1, 1, 1, 3), dtype=np.uint8),
+])
+def test_invalid_arrays_are_rejected(array):
+    with pytest.raises(ValueError):
+        parse_frames(npy(array), "application/x-npy")
+
+
+@pytest.mark.parametrize("body", [b"", b"garbage", npy(np.zeros((2, 4, 4, 3), dtype=np.uint8))[:-5]])
+def test_malformed_npy_is_a_value_error(body):
+    with pytest.raises(ValueError):
+        parse_frames(body, "application/x-npy")
+
+
+def test_pickled_objects_are_not_loaded():
+    with pytest.raises(ValueError):
+        parse_frames(npy(np.array([{"a": 1}], dtype=object)), "application/x-npy")
+
+
+def test_msgpack_payload():
+    msgpack = pytest.importorskip("msgpack")
+    frames = np.arange(2 * 4 * 4 * 3, dtype=np.uint8).reshape(2, 4, 4, 3)
+    body = msgpack.packb({"shape": list(frames.shape), "dtype": "uint8", "data": frames.tobytes()})
+    assert np.array_equal(parse_frames(body, "application/msgpack"), frames)
+
+    wrong_size = msgpack.packb({"shape": [2, 4, 4, 3], "data": b"\0" * 10})
+    with pytest.raises(ValueError):
+        parse_frames(wrong_size, "application/msgpack")
+    with pytest.raises(ValueError):
+        parse_frames(b"\xc1", "application/msgpack")
+
+
+def test_unknown_content_type():
+    with pytest.raises(ValueError):
+        parse_frames(b"", "image/png")
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""推理后端：与 eager 的一致性校验和失败时的回退"""
+
+import pytest
+import torch
+
+from inference_backends import EagerBackend, create_backend, example_inputs, max_difference
+
+
+def test_create_backend_rejects_unknown_names():
+    model = torch.nn.Identity()
+    with pytest.raises(ValueError):
+        create_backend("tensorrt", model, torch.device("cpu"))
+    assert isinstance(create_backend("eager", model, torch.device("cpu")), EagerBackend)
+
+
+def test_torchscript_matches_eager(make_api):
+    api = make_api(backend="torchscript")
+    assert api.backend.name == "torchscript"
+    assert api.backend_info["max_diff"] <= 1e-4
+    inputs = example_inputs(api.device, batch_sizes=(2,))
+    assert max_difference(api.backend, EagerBackend(api.model, api.device), inputs) <= 1e-4
+
+
+def test_parity_failure_falls_back_to_eager(make_api):
+    # 容差为负时任何误差都不满足一致性要求
+    api = make_api(backend="torchscript", parity_atol=-1.0)
+    assert api.backend.name == "eager"
+    assert api.backend_info["requested"] == "torchscript"
+    assert "rejected_diff" in api.backend_info
+
+
+def test_backend_init_error_falls_back_to_eager(make_api):
+    api = make_api(backend="tensorrt")
+    assert api.backend.name == "eager"
+    assert "不支持的推理后端" in api.backend_info["error"]
+
+
+def test_int8_without_calibration_falls_back(make_api):
+    api = make_api(backend="int8")
+    assert api.backend.name == "eager"
+    assert "calibration_clips" in api.backend_info["error"]
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""动态微批：合并、按形状分组、结果分发和错误传播"""
+
+import threading
+
+import pytest
+import torch
+
+from inference_batcher import MicroBatcher
+
+
+class RecordingModel:
+    """输出每个片段的帧均值，记录每次前向的批大小"""
+
+    def __init__(self, gate=None):
+        self.batch_sizes = []
+        self.gate = gate
+
+    def __call__(self, inputs):
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.batch_sizes.append(inputs.size(0))
+        return inputs.flatten(1).mean(dim=1, keepdim=True).repeat(1, 4).numpy()
+
+
+def clip(value, frames=4, size=8):
+    return torch.full((frames, 3, size, size), float(value))
+
+
+@pytest.fixture
+def batcher_factory():
+    batchers = []
+
+    def make(model, **kwargs):
+        batcher = MicroBatcher(model, torch.device("cpu"), **kwargs)
+        batchers.append(batcher)
+        return batcher
+
+    yield make
+    for batcher in batchers:
+        batcher.close()
+
+
+def test_concurrent_clips_share_one_forward(batcher_factory):
+    gate = threading.Event()
+    model = RecordingModel(gate)
+    batcher = batcher_factory(model, max_batch_size=8, max_wait_ms=50)
+    # 第一个片段占住后台线程，其余片段在队列中凑成一批
+    first = batcher.submit(clip(0))
+    futures = [batcher.submit(clip(i)) for i in range(1, 6)]
+    gate.set()
+
+    assert first.result(5)[0] == pytest.approx(0.0)
+    for i, future in enumerate(futures, start=1):
+        assert future.result(5)[0] == pytest.approx(float(i))
+    assert sum(model.batch_sizes) == 6
+    assert max(model.batch_sizes) > 1
+    assert batcher.stats()["requests"] == 6
+
+
+def test_batch_size_is_capped(batcher_factory):
+    gate = threading.Event()
+    model = RecordingModel(gate)
+    batcher = batcher_factory(model, max_batch_size=2, max_wait_ms=50)
+    futures = [batcher.submit(clip(i)) for i in range(5)]
+    gate.set()
+    for future in futures:
+        future.result(5)
+    assert max(model.batch_sizes) <= 2
+
+
+def test_mismatched_shapes_run_in_separate_groups(batcher_factory):
+    gate = threading.Event()
+    model = RecordingModel(gate)
+    batcher = batcher_factory(model, max_batch_size=8, max_wait_ms=50)
+    blocker = batcher.submit(clip(0))
+    short = batcher.submit(clip(1, frames=2))
+    long = batcher.submit(clip(2, frames=4))
+    gate.set()
+    blocker.result(5)
+    assert short.result(5)[0] == pytest.approx(1.0)
+    assert long.result(5)[0] == pytest.approx(2.0)
+
+
+def test_errors_reach_every_caller(batcher_factory):
+    def broken(inputs):
+        raise ValueError("推理失败")
+
+    batcher = batcher_factory(broken, max_wait_ms=1)
+    with pytest.raises(ValueError):
+        batcher.infer(clip(0), timeout=5)
+
+
+def test_full_queue_and_closed_batcher_reject(batcher_factory):
+    gate = threading.Event()
+    batcher = batcher_factory(RecordingModel(gate), max_batch_size=1, max_queue=1)
+    batcher.submit(clip(0))
+    # 后台线程可能已经取走第一个片段，继续提交直到队列占满
+    with pytest.raises(RuntimeError):
+        for _ in range(3):
+            batcher.submit(clip(0))
+    gate.set()
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.submit(clip(0))
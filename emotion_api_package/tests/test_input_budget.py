@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""输入预算：各项上限、容器头信息读取，以及 open_video 在解码之前拒绝超出预算的输入"""
+
+import time
+
+import cv2
+import pytest
+
+import video_decoder
+from input_budget import InputBudgetError, VideoBudget, check_deadline, probe
+
+
+def test_size_limit():
+    budget = VideoBudget(max_bytes=1024)
+    budget.check_size(1024)
+    with pytest.raises(InputBudgetError, match="视频过大"):
+        budget.check_size(1025)
+
+
+def test_pixel_limit():
+    budget = VideoBudget(max_pixels=64 * 48)
+    budget.check_frame_shape(64, 48)
+    with pytest.raises(InputBudgetError, match="分辨率过高"):
+        budget.check_frame_shape(65, 48)
+
+
+def test_duration_limit_ignores_unknown_duration():
+    budget = VideoBudget(max_duration=2.0)
+    budget.check({"width": 64, "height": 48, "duration": None})
+    budget.check({"width": 64, "height": 48, "duration": 2.0})
+    with pytest.raises(InputBudgetError, match="视频过长"):
+        budget.check({"width": 64, "height": 48, "duration": 2.5})
+
+
+def test_none_disables_a_limit():
+    budget = VideoBudget(max_bytes=None, max_pixels=None, max_duration=None, max_decode_seconds=None)
+    budget.check_size(10 ** 12)
+    budget.check({"width": 10 ** 5, "height": 10 ** 5, "duration": 10 ** 6})
+    assert budget.deadline() is None
+    check_deadline(budget.deadline())
+
+
+def test_budget_error_is_a_value_error():
+    # 调用方按 ValueError 处理的路径（400）不会漏掉超出预算的输入
+    assert issubclass(InputBudgetError, ValueError)
+    assert video_decoder.InputBudgetError is InputBudgetError
+
+
+def test_check_deadline():
+    check_deadline(time.monotonic() + 60)
+    with pytest.raises(InputBudgetError, match="超时"):
+        check_deadline(time.monotonic() - 1)
+
+
+def test_probe_reads_the_container_header(make_video):
+    cap = cv2.VideoCapture(make_video(frames=20, fps=10.0, size=(64, 48)))
+    try:
+        info = probe(cap)
+    finally:
+        cap.release()
+    assert (info["width"], info["height"]) == (64, 48)
+    assert info["fps"] == pytest.approx(10.0)
+    assert info["frame_count"] == 20
+    assert info["duration"] == pytest.approx(2.0)
+    assert info["codec"]
+
+
+def test_open_video_rejects_before_decoding(make_video):
+    path = make_video(frames=20, fps=10.0, size=(64, 48))
+    before = video_decoder.decoder_stats()["rejected"]
+    with pytest.raises(InputBudgetError, match="视频过长"):
+        with video_decoder.open_video(path, budget=VideoBudget(max_duration=1.0)):
+            pytest.fail("超出预算的视频不应进入解码")
+    with open(path, "rb") as f:
+        data = f.read()
+    with pytest.raises(InputBudgetError, match="视频过大"):
+        with video_decoder.open_video(data, budget=VideoBudget(max_bytes=len(data) - 1)):
+            pytest.fail("超出预算的视频不应进入解码")
+    assert video_decoder.decoder_stats()["rejected"] == before + 2
+    with video_decoder.open_video(data, budget=VideoBudget()) as cap:
+        assert cap.read()[0]
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""检查点 sidecar 校验：摘要复用、可选的参数统计量核对和篡改检测"""
+
+import json
+
+import pytest
+import torch
+
+import model_checkpoint
+from model_checkpoint import (file_digest, load_checkpoint, read_sidecar, sidecar_path,
+                              verify_with_sidecar, write_sidecar)
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    torch.manual_seed(0)
+    state_dict = torch.nn.Linear(8, 4).state_dict()
+    path = str(tmp_path / "model.pth")
+    torch.save({"model_state_dict": state_dict, "val_mae": 0.3}, path)
+    return path, state_dict
+
+
+def test_sidecar_round_trip(checkpoint):
+    path, state_dict = checkpoint
+    digest = file_digest(path)
+    assert write_sidecar(path, state_dict, digest=digest, extra={"val_mae": 0.3})
+    sidecar = read_sidecar(path)
+    assert sidecar["sha256"] == digest
+    assert sidecar["val_mae"] == 0.3
+    assert load_checkpoint(path, "cpu")["val_mae"] == 0.3
+
+    ok, detail = verify_with_sidecar(path, state_dict, sidecar, digest=digest)
+    assert ok, detail
+
+
+def test_precomputed_digest_is_not_recomputed(checkpoint, monkeypatch):
+    path, state_dict = checkpoint
+    digest = file_digest(path)
+    write_sidecar(path, state_dict, digest=digest)
+    sidecar = read_sidecar(path)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("不应重复计算摘要")
+
+    monkeypatch.setattr(model_checkpoint, "file_digest", fail)
+    monkeypatch.setattr(model_checkpoint, "parameter_stats", fail)
+    ok, _ = verify_with_sidecar(path, state_dict, sidecar, digest=digest, check_parameters=False)
+    assert ok
+
+
+def test_parameter_stats_detect_mismatched_weights(checkpoint):
+    path, state_dict = checkpoint
+    write_sidecar(path, state_dict)
+    sidecar = read_sidecar(path)
+    changed = {name: tensor + 1.0 for name, tensor in state_dict.items()}
+
+    ok, detail = verify_with_sidecar(path, changed, sidecar, check_parameters=True)
+    assert not ok and "统计量" in detail
+    # 只核对摘要时文件本身没有变化
+    assert verify_with_sidecar(path, changed, sidecar, check_parameters=False)[0]
+
+
+def test_modified_file_fails_digest(checkpoint):
+    path, state_dict = checkpoint
+    write_sidecar(path, state_dict)
+    sidecar = read_sidecar(path)
+    with open(path, "r+b") as f:
+        f.seek(-1, 2)
+        last = f.read(1)
+        f.seek(-1, 2)
+        f.write(bytes([last[0] ^ 0xFF]))
+    ok, detail = verify_with_sidecar(path, state_dict, sidecar)
+    assert not ok and "摘要" in detail
+
+
+def test_unknown_sidecar_version_is_ignored(checkpoint):
+    path, state_dict = checkpoint
+    write_sidecar(path, state_dict)
+    with open(sidecar_path(path), "r", encoding="utf-8") as f:
+        payload = json.load(f)
+    payload["version"] = 999
+    with open(sidecar_path(path), "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+    assert read_sidecar(path) is None
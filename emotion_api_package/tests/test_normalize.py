@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""整批归一化与原来逐帧 transforms.Normalize 的结果逐位一致"""
+
+import numpy as np
+import pytest
+import torch
+from torchvision import transforms
+
+
+def reference_normalize(buffer):
+    """原来的预处理：整体 /255 后逐帧 transforms.Normalize，再堆叠"""
+    normalize = transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225])
+    frames = torch.from_numpy(buffer).float() / 255.0
+    frames = frames.permute(0, 3, 1, 2)
+    return torch.stack([normalize(frame) for frame in frames]).unsqueeze(0)
+
+
+@pytest.mark.parametrize("num_frames", [1, 8, 16])
+def test_batched_normalize_is_bit_identical(make_api, num_frames):
+    api = make_api()
+    buffer = np.random.default_rng(num_frames).integers(0, 256, (num_frames, 128, 128, 3), dtype=np.uint8)
+    buffer[0, 0, 0] = (0, 128, 255)
+
+    output = api._normalize(buffer)
+    expected = reference_normalize(buffer)
+    assert output.dtype == torch.float32
+    assert output.shape == (1, num_frames, 3, 128, 128)
+    assert torch.equal(output.cpu(), expected)
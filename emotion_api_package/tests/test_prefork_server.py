@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""多进程服务：进程数 / 线程数规划、参数校验，以及 fork、重启和关闭工作进程"""
+
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+import urllib.request
+
+import pytest
+from flask import Flask
+
+import prefork_server
+from prefork_server import PreforkServer, plan_workers
+
+
+def test_defaults_to_one_single_threaded_worker_per_core():
+    assert plan_workers(cpu_count=8) == (8, 1)
+
+
+def test_only_workers_splits_cores_into_threads():
+    assert plan_workers(workers=2, cpu_count=8) == (2, 4)
+    # 进程数多于核数时每个进程至少一个线程
+    assert plan_workers(workers=16, cpu_count=8) == (16, 1)
+
+
+def test_only_threads_derives_the_worker_count():
+    assert plan_workers(threads=2, cpu_count=8) == (4, 2)
+    assert plan_workers(threads=16, cpu_count=8) == (1, 16)
+
+
+def test_both_given_are_kept():
+    assert plan_workers(workers=3, threads=5, cpu_count=8) == (3, 5)
+
+
+def test_unknown_cpu_count_falls_back_to_one(monkeypatch):
+    monkeypatch.setattr(os, "cpu_count", lambda: None)
+    assert plan_workers() == (1, 1)
+
+
+@pytest.mark.parametrize("kwargs", [{"workers": 0}, {"threads": 0}, {"workers": -1, "threads": 2}])
+def test_non_positive_counts_are_rejected(kwargs):
+    with pytest.raises(ValueError):
+        plan_workers(cpu_count=8, **kwargs)
+
+
+@pytest.mark.parametrize("flag", ["--workers", "--threads"])
+def test_cli_rejects_zero(monkeypatch, flag):
+    monkeypatch.setattr(sys, "argv", ["prefork_server.py", flag, "0"])
+    with pytest.raises(SystemExit) as excinfo:
+        prefork_server.main()
+    assert excinfo.value.code == 2
+
+
+class StubAPI:
+    """工作进程只需要 backend 和 worker_info"""
+    backend = None
+    worker_info = None
+
+
+def make_app():
+    app = Flask(__name__)
+
+    @app.route("/pid")
+    def pid():
+        return str(os.getpid())
+
+    return app
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get_pid(port, timeout=15.0):
+    """轮询直到某个工作进程响应，返回其 pid"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/pid", timeout=2) as response:
+                return int(response.read())
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="需要 os.fork")
+def test_forks_restarts_and_stops_workers():
+    port = free_port()
+    server = PreforkServer(make_app(), StubAPI(), host="127.0.0.1", port=port, workers=1, threads=1,
+                           batching=False)
+    supervisor = multiprocessing.get_context("fork").Process(target=server.serve_forever)
+    supervisor.start()
+    try:
+        first = get_pid(port)
+        assert first not in (os.getpid(), supervisor.pid)
+
+        # 工作进程异常退出后由主进程重新 fork
+        os.kill(first, signal.SIGKILL)
+        deadline = time.monotonic() + 15
+        while get_pid(port) == first:
+            assert time.monotonic() < deadline
+            time.sleep(0.1)
+
+        os.kill(supervisor.pid, signal.SIGTERM)
+        supervisor.join(15)
+        assert supervisor.exitcode == 0
+        with pytest.raises(OSError):
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/pid", timeout=2)
+    finally:
+        if supervisor.is_alive():
+            supervisor.kill()
+            supervisor.join()
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""int8 量化：校准集选取、命令行参数和 MAE 护栏"""
+
+import pytest
+
+import batch_score
+import prefork_server
+from quantization import calibration_clips_from_dir
+
+
+def test_calibration_clips_are_spread_across_the_directory(make_video, tmp_path):
+    for i in range(6):
+        make_video(f"videos/{i // 3}/clip{i}.mp4", frames=2)
+    (tmp_path / "videos" / "notes.txt").write_text("不是视频", encoding="utf-8")
+
+    clips = calibration_clips_from_dir(str(tmp_path / "videos"), limit=3)
+    assert [clip.rsplit("clip", 1)[1] for clip in clips] == ["0.mp4", "2.mp4", "4.mp4"]
+    assert len(calibration_clips_from_dir(str(tmp_path / "videos"))) == 6
+
+
+def test_empty_calibration_dir_is_an_error(tmp_path):
+    with pytest.raises(ValueError):
+        calibration_clips_from_dir(str(tmp_path))
+
+
+@pytest.mark.parametrize("module", [prefork_server, batch_score])
+def test_int8_cli_requires_calibration_dir(module, monkeypatch):
+    argv = ["prog", "--backend", "int8"]
+    if module is batch_score:
+        argv.insert(1, "recordings/")
+    monkeypatch.setattr("sys.argv", argv)
+    with pytest.raises(SystemExit):
+        module.main()
+    args = module.build_parser().parse_args(argv[1:] + ["--calibration-dir", "calib/"])
+    assert args.calibration_dir == "calib/"
+
+
+def test_int8_backend_with_calibration_clips(make_api, make_video):
+    clips = [make_video(f"calib{i}.mp4", frames=10, size=(128, 128)) for i in range(2)]
+    api = make_api(backend="int8", calibration_clips=clips, max_mae_delta=10.0)
+    assert api.backend.name == "int8"
+    assert api.backend_info["calibration_clips"] == 2
+
+    # 护栏：阈值为负时任何误差都会被拒绝
+    strict = make_api(backend="int8", calibration_clips=clips, max_mae_delta=-1.0)
+    assert strict.backend.name == "eager"
+    assert "rejected_delta" in strict.backend_info
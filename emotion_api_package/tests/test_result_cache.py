@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""预测结果缓存：缓存键、内存 LRU、落盘命中和落盘淘汰"""
+
+import os
+import time
+
+from result_cache import ResultCache, content_key
+
+
+def disk_files(directory):
+    return sorted(name for _, _, names in os.walk(directory) for name in names)
+
+
+def test_key_depends_on_bytes_and_config():
+    config = {"model": "abc", "backend": "eager", "num_frames": 8}
+    assert content_key(b"video", config) == content_key(b"video", dict(reversed(list(config.items()))))
+    assert content_key(b"video", config) != content_key(b"video!", config)
+    assert content_key(b"video", config) != content_key(b"video", dict(config, backend="onnx"))
+    # 配置和视频字节之间有分隔符，拼接方式不同不会得到相同的键
+    assert content_key(b"", {"a": 1}) != content_key(b"1}", {"a": ""})
+
+
+def test_memory_tier_is_lru():
+    cache = ResultCache(max_entries=2)
+    cache.put("a", [1])
+    cache.put("b", [2])
+    cache.get("a")
+    cache.put("c", [3])
+    assert cache.get("b") is None
+    assert cache.get("a") == [1]
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 1, 2)
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    ResultCache(persist_dir=str(tmp_path)).put("ab12", [0.5, 1.5])
+    cache = ResultCache(persist_dir=str(tmp_path))
+    assert cache.get("ab12") == [0.5, 1.5]
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_disk_tier_prunes_least_recently_used(tmp_path):
+    cache = ResultCache(max_entries=1, persist_dir=str(tmp_path), max_disk_entries=10)
+    for i in range(10):
+        cache.put(f"k{i:02d}", [i])
+        path = cache._path(f"k{i:02d}")
+        os.utime(path, (time.time() - 100 + i, time.time() - 100 + i))
+    # 读取最早写入的条目，刷新它的访问时间
+    fresh = ResultCache(max_entries=1, persist_dir=str(tmp_path))
+    assert fresh.get("k00") == [0]
+
+    cache.put("k10", [10])
+    files = disk_files(tmp_path)
+    assert len(files) == 9
+    assert "k00.json" in files
+    assert "k01.json" not in files and "k02.json" not in files
+    assert cache.stats()["disk_evicted"] == 2
+
+
+def test_prune_removes_stale_temp_files(tmp_path):
+    stale = tmp_path / "ab" / "abcd.json.1.2.tmp"
+    stale.parent.mkdir()
+    stale.write_text("{", encoding="utf-8")
+    os.utime(stale, (0, 0))
+    ResultCache(persist_dir=str(tmp_path)).put("abcd", [1])
+    assert disk_files(tmp_path) == ["abcd.json"]
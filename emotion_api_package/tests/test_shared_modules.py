@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""视觉情绪服务（visionsimulation/emotion_recognition_api）直接导入本目录的共用模块，不保留副本"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VISION_DIR = os.path.join(os.path.dirname(PACKAGE_DIR), "visionsimulation", "emotion_recognition_api")
+
+SHARED = ["input_budget", "stage_timing"]
+
+
+@pytest.fixture(scope="module")
+def vision_modules():
+    """在视觉情绪服务目录中导入 emotion_api，返回各共用模块的文件路径"""
+    if not os.path.isdir(VISION_DIR):
+        pytest.skip("视觉情绪服务不在当前检出中")
+    pytest.importorskip("flask_cors")
+    code = "import emotion_api, sys; print('\\n'.join(sys.modules[name].__file__ for name in sys.argv[1:]))"
+    result = subprocess.run([sys.executable, "-c", code] + SHARED, cwd=VISION_DIR, capture_output=True,
+                            text=True, timeout=120, env=dict(os.environ, PYTHONPATH=""))
+    assert result.returncode == 0, result.stderr
+    return dict(zip(SHARED, result.stdout.split()))
+
+
+@pytest.mark.parametrize("name", SHARED)
+def test_vision_service_imports_the_shared_module(vision_modules, name):
+    assert os.path.samefile(vision_modules[name], os.path.join(PACKAGE_DIR, f"{name}.py"))
+    assert not os.path.exists(os.path.join(VISION_DIR, f"{name}.py"))
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""分阶段耗时：Server-Timing 格式、滚动分位数、按需剖析，以及接口上的响应头、timings 字段和管理接口"""
+
+import re
+import threading
+
+import pytest
+
+import emotion_recognition_api
+import stage_timing
+from stage_timing import LatencyHistograms, ProfileCapture, RequestTimings, stage
+
+
+def timings_with(**stages):
+    timings = RequestTimings()
+    timings.stages.update(stages)
+    return timings
+
+
+def test_stages_accumulate_and_format_as_server_timing():
+    timings, token = stage_timing.start_request()
+    try:
+        timings.add("decode", 1.234)
+        timings.add("decode", 1.0)
+        timings.add("inference", 0.5)
+        assert stage_timing.current() is timings
+    finally:
+        stage_timing.finish_request(token)
+    assert stage_timing.current() is None
+    assert re.fullmatch(r"decode;dur=2\.23, inference;dur=0\.50, total;dur=\d+\.\d{2}", timings.server_timing())
+    assert timings.to_dict()["stages_ms"] == {"decode": 2.234, "inference": 0.5}
+
+
+def test_stage_only_records_inside_a_request():
+    with stage("decode"):
+        pass
+    timings, token = stage_timing.start_request()
+    try:
+        with stage("decode"):
+            pass
+    finally:
+        stage_timing.finish_request(token)
+    assert list(timings.stages) == ["decode"]
+
+
+def test_histogram_percentiles_and_buckets():
+    histograms = LatencyHistograms()
+    for ms in range(1, 101):
+        histograms.record(timings_with(decode=float(ms)), "predict")
+    summary = histograms.snapshot()["groups"]["predict"]["decode"]
+    assert summary["count"] == 100
+    assert (summary["p50_ms"], summary["p90_ms"], summary["p99_ms"], summary["max_ms"]) == (51, 91, 100, 100)
+    assert summary["mean_ms"] == 50.5
+    # 上界 1, 2, 5, 10, 20, 50, 100 ms 的桶
+    assert summary["buckets"][:7] == [1, 1, 3, 5, 10, 30, 50]
+    assert sum(summary["buckets"]) == 100
+    assert "total" in histograms.snapshot()["groups"]["predict"]
+
+
+def test_histogram_keeps_only_the_latest_samples():
+    histograms = LatencyHistograms(max_samples=10)
+    for ms in range(100):
+        histograms.record(timings_with(decode=float(ms)), "predict")
+    summary = histograms.snapshot()["groups"]["predict"]["decode"]
+    assert summary["count"] == 10
+    assert summary["p50_ms"] == 95
+
+
+def test_profile_capture_writes_the_requested_number_of_profiles(tmp_path):
+    capture = ProfileCapture(output_dir=str(tmp_path))
+    with pytest.raises(ValueError):
+        capture.arm(1, mode="perf")
+    with pytest.raises(ValueError):
+        capture.arm(0)
+
+    capture.arm(2)
+    for _ in range(3):
+        with capture.maybe_profile("/predict"):
+            sum(range(100))
+    status = capture.status()
+    assert status["remaining"] == 0
+    assert len(status["captured"]) == 2
+    assert all(path.endswith("-predict.pstats") for path in status["captured"])
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def test_profile_capture_profiles_one_request_at_a_time(tmp_path):
+    capture = ProfileCapture(output_dir=str(tmp_path))
+    capture.arm(2)
+    inside = threading.Event()
+    release = threading.Event()
+
+    def profiled():
+        with capture.maybe_profile("/slow"):
+            inside.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=profiled)
+    thread.start()
+    assert inside.wait(5)
+    # 正在剖析时到达的请求照常处理，不计入 N
+    with capture.maybe_profile("/other"):
+        pass
+    assert capture.status()["remaining"] == 1
+    release.set()
+    thread.join(5)
+    assert len(capture.status()["captured"]) == 1
+
+
+@pytest.fixture
+def client(make_api, monkeypatch, tmp_path):
+    monkeypatch.setattr(emotion_recognition_api, "api_instance", make_api())
+    monkeypatch.setattr(emotion_recognition_api, "latency_histograms", LatencyHistograms())
+    monkeypatch.setattr(emotion_recognition_api, "profile_capture", ProfileCapture(output_dir=str(tmp_path)))
+    return emotion_recognition_api.app.test_client()
+
+
+@pytest.fixture
+def video(make_video):
+    with open(make_video(frames=12, size=(128, 128)), "rb") as f:
+        return f.read()
+
+
+def test_predict_reports_stage_timings(client, video):
+    response = client.post("/predict", data=video, content_type="application/octet-stream")
+    assert response.status_code == 200
+
+    header = response.headers["Server-Timing"]
+    names = [entry.split(";")[0] for entry in header.split(", ")]
+    assert {"decode", "inference"} <= set(names)
+    assert names[-1] == "total"
+
+    timings = response.get_json()["timings"]
+    assert set(timings["stages_ms"]) == set(names[:-1])
+    assert timings["total_ms"] >= max(timings["stages_ms"].values())
+
+    groups = emotion_recognition_api.latency_histograms.snapshot()["groups"]
+    assert groups["predict"]["total"]["count"] == 1
+
+
+def test_error_responses_are_timed_too(client):
+    response = client.delete("/stream/unknown")
+    assert response.status_code == 404
+    assert "timings" in response.get_json()
+    assert response.headers["Server-Timing"].startswith("total;dur=")
+
+
+def test_admin_endpoints_are_untimed_and_local_only(client):
+    response = client.get("/admin/latency")
+    assert response.status_code == 200
+    assert "Server-Timing" not in response.headers
+    assert "timings" not in response.get_json()
+
+    remote = {"REMOTE_ADDR": "10.0.0.8"}
+    assert client.get("/admin/latency", environ_base=remote).status_code == 403
+    assert client.post("/admin/profile", json={"requests": 1}, environ_base=remote).status_code == 403
+
+
+def test_admin_profile_captures_the_next_request(client, video):
+    assert client.post("/admin/profile", json={"requests": 1, "mode": "bogus"}).status_code == 400
+    assert client.post("/admin/profile", json={"requests": 1}).get_json()["remaining"] == 1
+
+    client.post("/predict", data=video, content_type="application/octet-stream")
+    status = client.get("/admin/profile").get_json()
+    assert status["remaining"] == 0
+    assert len(status["captured"]) == 1 and status["captured"][0].endswith("predict.pstats")
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""流式推理：会话状态存储、状态延续和 /stream 参数校验"""
+
+import base64
+
+import pytest
+import torch
+
+import emotion_recognition_api
+from emotion_recognition_api import FastEmotionModel
+from session_state import SessionStateStore
+
+
+def test_store_evicts_least_recent_and_expires_idle():
+    store = SessionStateStore(max_sessions=2, idle_timeout=60)
+    first = store.get("a")
+    store.get("b")
+    store.get("a")
+    store.get("c")
+    # b 最久未使用，被淘汰
+    assert store.stats()["sessions"] == 2
+    assert store.stats()["evicted"] == 1
+
+    first.updated_at -= 120
+    store.stats()
+    assert store.pop("a") is None
+    assert store.pop("b") is None
+    assert store.pop("c") is not None
+    assert store.stats()["expired"] == 1
+
+
+def test_forward_step_continues_the_sequence():
+    torch.manual_seed(0)
+    model = FastEmotionModel().eval()
+    clip = torch.randn(1, 6, 3, 128, 128)
+    with torch.no_grad():
+        full = model(clip)
+        _, state = model.forward_step(clip[:, :4])
+        stepped, _ = model.forward_step(clip[:, 4:], state)
+    assert torch.allclose(full, stepped, atol=1e-5)
+
+
+@pytest.fixture
+def client(make_api, monkeypatch):
+    api = make_api()
+    monkeypatch.setattr(emotion_recognition_api, "api_instance", api)
+    return emotion_recognition_api.app.test_client()
+
+
+@pytest.fixture
+def video_b64(make_video):
+    with open(make_video(frames=12, size=(128, 128)), "rb") as f:
+        return base64.b64encode(f.read()).decode()
+
+
+@pytest.mark.parametrize("num_frames", [0, -3, 65, "abc"])
+def test_stream_rejects_out_of_range_num_frames(client, video_b64, num_frames):
+    response = client.post("/stream/s1", json={"video": video_b64, "num_frames": num_frames})
+    assert response.status_code == 400
+
+
+def test_stream_accumulates_frames_and_resets(client, video_b64):
+    first = client.post("/stream/s1", json={"video": video_b64, "num_frames": 4}).get_json()
+    second = client.post("/stream/s1", json={"video": video_b64, "num_frames": 64}).get_json()
+    assert (first["stream"]["frames_seen"], second["stream"]["frames_seen"]) == (4, 68)
+    assert second["stream"]["chunks"] == 2
+
+    reset = client.post("/stream/s1", json={"video": video_b64, "num_frames": 1, "reset": True}).get_json()
+    assert reset["stream"]["frames_seen"] == 1
+
+    assert client.delete("/stream/s1").status_code == 200
+    assert client.delete("/stream/s1").status_code == 404
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""情感时间线：窗口划分、结尾窗口、参数上限和解码预算"""
+
+import pytest
+
+import emotion_recognition_api
+from video_decoder import InputBudgetError, VideoBudget
+
+
+@pytest.fixture
+def api(make_api):
+    return make_api()
+
+
+@pytest.fixture
+def video(make_video):
+    # 10fps、20 帧，共 2 秒
+    with open(make_video(frames=20, fps=10.0, size=(128, 128)), "rb") as f:
+        return f.read()
+
+
+def starts(result):
+    return [window["start"] for window in result["windows"]]
+
+
+def test_windows_follow_the_stride(api, video):
+    result = api.predict_timeline(video, is_base64=False, window_seconds=1.0, stride_seconds=0.5,
+                                  frames_per_window=4)
+    assert starts(result) == [0.0, 0.5, 1.0]
+    assert result["summary"]["tail_window"] is False
+    assert result["summary"]["frames_sampled"] == 8
+
+
+def test_tail_window_covers_the_end(api, video):
+    result = api.predict_timeline(video, is_base64=False, window_seconds=1.0, stride_seconds=0.75,
+                                  frames_per_window=4)
+    assert starts(result) == [0.0, 0.75, 1.0]
+    assert result["windows"][-1]["tail"] is True
+    assert "tail" not in result["windows"][0]
+    assert result["summary"]["tail_window"] is True
+
+
+def test_short_video_returns_one_padded_window(api, video):
+    result = api.predict_timeline(video, is_base64=False, window_seconds=10.0, stride_seconds=5.0,
+                                  frames_per_window=8)
+    assert len(result["windows"]) == 1
+
+
+@pytest.mark.parametrize("options", [
+    dict(frames_per_window=0),
+    dict(frames_per_window=65),
+    dict(window_seconds=0),
+    # 采样间隔 0.05 秒小于 10fps 视频的帧间隔
+    dict(window_seconds=1.0, frames_per_window=20),
+])
+def test_invalid_parameters(api, video, options):
+    with pytest.raises(ValueError):
+        api.predict_timeline(video, is_base64=False, **options)
+
+
+def test_window_count_is_capped(api, video, monkeypatch):
+    monkeypatch.setattr(emotion_recognition_api, "MAX_TIMELINE_WINDOWS", 2)
+    with pytest.raises(ValueError, match="窗口数"):
+        api.predict_timeline(video, is_base64=False, window_seconds=1.0, stride_seconds=0.25,
+                             frames_per_window=4)
+
+
+def test_decode_deadline_applies(make_api, video):
+    api = make_api(timeline_budget=VideoBudget(max_decode_seconds=0))
+    with pytest.raises(InputBudgetError):
+        api.predict_timeline(video, is_base64=False, window_seconds=1.0, stride_seconds=0.5,
+                             frames_per_window=4)
+
+
+def test_route_maps_errors(api, video, monkeypatch):
+    monkeypatch.setattr(emotion_recognition_api, "api_instance", api)
+    client = emotion_recognition_api.app.test_client()
+    url = "/predict_timeline?window_seconds=1&stride_seconds=0.5&frames_per_window={}"
+    ok = client.post(url.format(4), data=video, content_type="video/mp4")
+    assert ok.status_code == 200 and len(ok.get_json()["windows"]) == 3
+    assert client.post(url.format(100), data=video, content_type="video/mp4").status_code == 400
+    assert client.post(url.format(20), data=video, content_type="video/mp4").status_code == 400
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""上传体积上限：超过上限的请求体在读取之前即返回 413"""
+
+import io
+import json
+
+import pytest
+
+import emotion_recognition_api
+
+
+class CountingStream(io.BytesIO):
+    """记录读取次数的请求体，用来确认请求体没有被读取"""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+    def readinto(self, buffer):
+        self.reads += 1
+        return super().readinto(buffer)
+
+
+class UnusedAPI:
+    """只有在请求体通过检查时才会被调用的替身"""
+
+    input_budget = timeline_budget = emotion_recognition_api.VideoBudget()
+
+    def __getattr__(self, name):
+        raise AssertionError(f"超出上限的请求不应调用 {name}")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(emotion_recognition_api, "api_instance", UnusedAPI())
+    monkeypatch.setitem(emotion_recognition_api.app.config, "MAX_CONTENT_LENGTH", 4096)
+    return emotion_recognition_api.app.test_client()
+
+
+def test_limit_follows_the_input_budget():
+    budget = emotion_recognition_api.VideoBudget(max_bytes=3 * 1024 * 1024)
+    assert emotion_recognition_api.request_body_limit(budget) == 5 * 1024 * 1024
+    assert emotion_recognition_api.request_body_limit(emotion_recognition_api.VideoBudget(max_bytes=None)) is None
+
+
+def test_oversized_octet_stream_is_rejected_before_reading(client):
+    stream = CountingStream(b"\0" * 8192)
+    response = client.post("/predict", input_stream=stream, content_length=8192,
+                           content_type="application/octet-stream")
+    assert response.status_code == 413
+    assert "请求体过大" in response.get_json()["error"]
+    assert stream.reads == 0
+
+
+@pytest.mark.parametrize("path", ["/predict", "/stream/s"])
+def test_oversized_json_body_is_413_not_500(client, path):
+    body = json.dumps({"video": "A" * 8192})
+    response = client.post(path, data=body, content_type="application/json")
+    assert response.status_code == 413
+
+
+def test_oversized_file_upload_is_rejected(client):
+    response = client.post("/predict_file", data={"video": (io.BytesIO(b"\0" * 8192), "clip.mp4")},
+                           content_type="multipart/form-data")
+    assert response.status_code == 413
+
+
+class BudgetOnlyAPI:
+    """只提供输入预算的替身：请求体通过检查时记录调用"""
+
+    def __init__(self, max_bytes):
+        self.input_budget = emotion_recognition_api.VideoBudget(max_bytes=max_bytes)
+        self.timeline_budget = emotion_recognition_api.VideoBudget(max_bytes=max_bytes * 2)
+        self.calls = []
+
+    def predict_emotions(self, video, is_base64=True):
+        self.calls.append(len(video))
+        return {"ok": True}
+
+
+@pytest.fixture
+def budget_client(monkeypatch):
+    api = BudgetOnlyAPI(max_bytes=1024)
+    monkeypatch.setattr(emotion_recognition_api, "api_instance", api)
+    return api, emotion_recognition_api.app.test_client()
+
+
+def test_raw_upload_is_checked_against_the_budget_before_reading(budget_client):
+    api, client = budget_client
+    stream = CountingStream(b"\0" * 2048)
+    response = client.post("/predict", input_stream=stream, content_length=2048,
+                           content_type="application/octet-stream")
+    assert response.status_code == 413
+    assert "视频过大" in response.get_json()["error"]
+    assert stream.reads == 0
+
+    response = client.post("/predict", data=b"\0" * 1024, content_type="video/mp4")
+    assert response.status_code == 200
+    assert api.calls == [1024]
+
+
+def test_timeline_upload_uses_the_timeline_budget(budget_client):
+    _, client = budget_client
+    response = client.post("/predict_timeline", data=b"\0" * 4096, content_type="application/octet-stream")
+    assert response.status_code == 413
+    assert "视频过大" in response.get_json()["error"]
+
+
+def test_file_upload_is_checked_before_parsing_the_form(budget_client):
+    api, client = budget_client
+    video = b"\0" * (emotion_recognition_api.REQUEST_OVERHEAD_BYTES + 2048)
+    response = client.post("/predict_file", data={"video": (io.BytesIO(video), "clip.mp4")},
+                           content_type="multipart/form-data")
+    assert response.status_code == 413
+    assert "视频过大" in response.get_json()["error"]
+    assert api.calls == []
+
+    response = client.post("/predict_file", data={"video": (io.BytesIO(b"\0" * 512), "clip.mp4")},
+                           content_type="multipart/form-data")
+    assert response.status_code == 200
+    assert api.calls == [512]
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""open_video：内存解码、退回临时文件，以及出错时临时文件一定被删除"""
+
+import os
+import tempfile
+
+import pytest
+
+import video_decoder
+from video_decoder import InputBudgetError, VideoBudget, decoder_stats, open_video
+
+
+@pytest.fixture
+def video_bytes(make_video):
+    with open(make_video(frames=20, fps=10.0), "rb") as f:
+        return f.read()
+
+
+@pytest.fixture
+def temp_dir(tmp_path, monkeypatch):
+    """退回临时文件时写入的目录，用来检查是否有残留"""
+    directory = tmp_path / "temp"
+    directory.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(directory))
+    return directory
+
+
+@pytest.fixture
+def no_stream(monkeypatch):
+    """模拟不支持内存解码的 OpenCV"""
+    monkeypatch.setattr(video_decoder, "STREAM_DECODING", False)
+
+
+def counts():
+    return dict(decoder_stats())
+
+
+@pytest.mark.skipif(not video_decoder.STREAM_DECODING, reason="当前 OpenCV 不支持从内存流解码")
+def test_bytes_are_decoded_in_memory(video_bytes, temp_dir):
+    before = counts()
+    with open_video(video_bytes) as cap:
+        assert cap.read()[0]
+        assert list(temp_dir.iterdir()) == []
+    after = counts()
+    assert after["memory"] == before["memory"] + 1
+    assert after["tempfile"] == before["tempfile"]
+
+
+def test_falls_back_to_a_temp_file(video_bytes, temp_dir, no_stream):
+    before = counts()
+    with open_video(bytearray(video_bytes), suffix=".mp4") as cap:
+        assert cap.read()[0]
+        assert [p.suffix for p in temp_dir.iterdir()] == [".mp4"]
+    assert counts()["tempfile"] == before["tempfile"] + 1
+    assert list(temp_dir.iterdir()) == []
+
+
+def test_paths_are_opened_directly(make_video, temp_dir):
+    before = counts()
+    with open_video(make_video()) as cap:
+        assert cap.read()[0]
+    assert counts()["path"] == before["path"] + 1
+    assert list(temp_dir.iterdir()) == []
+
+
+def test_temp_file_is_removed_when_decoding_fails(video_bytes, temp_dir, no_stream):
+    with pytest.raises(RuntimeError):
+        with open_video(video_bytes):
+            raise RuntimeError("解码失败")
+    assert list(temp_dir.iterdir()) == []
+
+
+def test_temp_file_is_removed_on_budget_error(video_bytes, temp_dir, no_stream):
+    with pytest.raises(InputBudgetError):
+        with open_video(video_bytes, budget=VideoBudget(max_pixels=16)):
+            pytest.fail("超出预算的视频不应进入解码")
+    assert list(temp_dir.iterdir()) == []
+
+
+def test_unreadable_bytes_are_rejected(temp_dir, no_stream):
+    before = counts()
+    with pytest.raises(ValueError, match="无法打开"):
+        with open_video(b"not a video"):
+            pytest.fail("无法打开的视频不应进入解码")
+    assert counts()["failed"] == before["failed"] + 1
+    assert list(temp_dir.iterdir()) == []
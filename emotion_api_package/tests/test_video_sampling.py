@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""均匀采样：顺序读取、seek 回退、帧数未知和短视频补齐，与逐帧 seek 的采样位置一致"""
+
+import cv2
+import numpy as np
+import pytest
+
+import video_decoder
+from video_decoder import VideoBudget, sample_frames
+
+STEP = 8
+
+
+def write_indexed_video(path, frames):
+    """每帧的亮度编码帧序号；MJPG 只有帧内编码，seek 到任意帧都是精确的"""
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 10.0, (32, 24))
+    for i in range(frames):
+        writer.write(np.full((24, 32, 3), i * STEP, dtype=np.uint8))
+    writer.release()
+    return str(path)
+
+
+def frame_index(frame):
+    return int(round(frame.mean() / STEP))
+
+
+def seek_indices(path, num_frames):
+    """原来的采样方式：np.linspace 计算位置，逐个 CAP_PROP_POS_FRAMES seek 后读取"""
+    cap = cv2.VideoCapture(path)
+    try:
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        sampled = []
+        for index in np.linspace(0, total - 1, num_frames, dtype=int):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+            sampled.append(frame_index(cap.read()[1]))
+        return sampled
+    finally:
+        cap.release()
+
+
+def sample(path, num_frames, **kwargs):
+    cap = cv2.VideoCapture(path)
+    try:
+        return sample_frames(cap, num_frames, transform=frame_index, **kwargs)
+    finally:
+        cap.release()
+
+
+class UnknownLength:
+    """容器没有记录帧数的视频"""
+
+    def __init__(self, cap):
+        self.cap = cap
+
+    def get(self, prop):
+        return 0 if prop == cv2.CAP_PROP_FRAME_COUNT else self.cap.get(prop)
+
+    def __getattr__(self, name):
+        return getattr(self.cap, name)
+
+
+@pytest.fixture
+def video(tmp_path):
+    return write_indexed_video(tmp_path / "indexed.avi", 30)
+
+
+@pytest.mark.parametrize("num_frames", [1, 4, 8, 16, 30])
+def test_sequential_pass_matches_seek_sampling(video, num_frames):
+    assert sample(video, num_frames) == seek_indices(video, num_frames)
+    assert sample(video, num_frames, budget=VideoBudget()) == seek_indices(video, num_frames)
+
+
+def test_long_video_falls_back_to_seek(video):
+    before = video_decoder.decoder_stats()["seek"]
+    assert sample(video, 8, budget=VideoBudget(max_decode_frames=10)) == seek_indices(video, 8)
+    assert video_decoder.decoder_stats()["seek"] == before + 1
+
+
+def test_short_video_repeats_frames(tmp_path):
+    path = write_indexed_video(tmp_path / "short.avi", 5)
+    assert sample(path, 8) == [0, 0, 1, 1, 2, 2, 3, 4]
+    assert sample(path, 8) == seek_indices(path, 8)
+
+
+def test_unknown_length_picks_nearest_kept_frames(video):
+    cap = UnknownLength(cv2.VideoCapture(video))
+    try:
+        assert sample_frames(cap, 8, transform=frame_index) == [0, 4, 8, 12, 17, 21, 25, 29]
+    finally:
+        cap.release()
+
+
+def test_unknown_length_doubles_the_stride(video):
+    cap = UnknownLength(cv2.VideoCapture(video))
+    try:
+        # 最多保留 4 帧：步长加倍到 8，只剩第 0、8、16、24 帧可选
+        assert sample_frames(cap, 8, transform=frame_index, max_buffered=4) == [0, 8, 8, 16, 16, 24, 24, 24]
+    finally:
+        cap.release()
+
+
+def test_unknown_length_reads_at_most_max_decode_frames(video):
+    cap = UnknownLength(cv2.VideoCapture(video))
+    try:
+        sampled = sample_frames(cap, 4, transform=frame_index, budget=VideoBudget(max_decode_frames=10))
+    finally:
+        cap.release()
+    assert sampled == [0, 3, 6, 9]
+
+
+def test_decode_clip_matches_seek_sampling(video):
+    clip = video_decoder.decode_clip(video, num_frames=8, frame_size=16)
+    assert clip.shape == (8, 16, 16, 3) and clip.dtype == np.uint8
+    assert [frame_index(frame) for frame in clip] == seek_indices(video, 8)
+
+
+def test_decode_clip_fills_unread_frames(video, monkeypatch):
+    # 读取失败的帧沿用上一帧，开头读取失败时为黑帧
+    first = np.full((16, 16, 3), 5, dtype=np.uint8)
+    monkeypatch.setattr(video_decoder, "sample_frames", lambda *args, **kwargs: [None, first, None, None])
+    clip = video_decoder.decode_clip(video, num_frames=4, frame_size=16)
+    assert [int(frame.max()) for frame in clip] == [0, 5, 5, 5]
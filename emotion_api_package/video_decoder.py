@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+视频解码入口 - 直接从内存中的字节解码，避免每个请求都写临时文件
+
+OpenCV 4.11 起 FFmpeg 后端可以从 Python 文件对象读取数据（内存中解封装），
+解码结果与从文件读取完全一致。不支持时（旧版 OpenCV 或该格式无法从流中
+读取）退回到临时文件，临时文件在使用后一定会被删除。
+
+打开视频后先读取容器头信息（编码、分辨率、时长、帧数），超出 VideoBudget 的输入
+在解码任何帧之前被拒绝；帧数也决定采样方式（顺序读取或逐帧 seek）。
+"""
+
+import functools
+import io
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+from input_budget import InputBudgetError, VideoBudget, check_deadline, probe
+from stage_timing import stage
+
+
+def _stream_decoding_supported():
+    """当前 OpenCV 是否支持从内存流解码"""
+    if not hasattr(cv2, 'IStreamReader'):
+        return False
+    try:
+        return cv2.CAP_FFMPEG in cv2.videoio_registry.getStreamBufferedBackends()
+    except Exception:
+        return False
+
+
+STREAM_DECODING = _stream_decoding_supported()
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.webm', '.mov', '.mkv', '.m4v')
+
+_lock = threading.Lock()
+_stats = {'memory': 0, 'tempfile': 0, 'path': 0, 'failed': 0, 'rejected': 0, 'seek': 0}
+
+
+def _count(name):
+    with _lock:
+        _stats[name] += 1
+
+
+def _open_stream(video_bytes):
+    """从内存解码，返回 (cap, stream)；不可用时返回 (None, None)"""
+    if not STREAM_DECODING:
+        return None, None
+    # VideoCapture 不持有 stream 的引用，调用方必须保证 stream 在 cap 释放前存活
+    stream = io.BytesIO(video_bytes)
+    try:
+        cap = cv2.VideoCapture(stream, cv2.CAP_FFMPEG, [])
+    except cv2.error:
+        return None, None
+    if not cap.isOpened():
+        cap.release()
+        return None, None
+    return cap, stream
+
+
+def _reject(error):
+    _count('rejected')
+    raise error
+
+
+@contextmanager
+def open_video(source, suffix='.mp4', budget=None):
+    """打开视频，返回已打开的 cv2.VideoCapture
+
+    Args:
+        source: 视频文件路径，或内存中的视频字节（bytes / bytearray / memoryview）
+        suffix: 退回到临时文件时使用的扩展名
+        budget: VideoBudget，超出预算时在解码任何帧之前抛出 InputBudgetError
+
+    用法:
+        with open_video(video_bytes) as cap:
+            ret, frame = cap.read()
+    """
+    cap = None
+    stream = None
+    temp_path = None
+    try:
+        if budget is not None and isinstance(source, (bytes, bytearray, memoryview)):
+            try:
+                budget.check_size(len(source))
+            except InputBudgetError as e:
+                _reject(e)
+
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            with stage('open'):
+                cap, stream = _open_stream(bytes(source))
+            if cap is not None:
+                _count('memory')
+            else:
+                with stage('tempfile'):
+                    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as temp_file:
+                        temp_file.write(source)
+                        temp_path = temp_file.name
+                with stage('open'):
+                    cap = cv2.VideoCapture(temp_path)
+                _count('tempfile')
+        else:
+            with stage('open'):
+                cap = cv2.VideoCapture(source)
+            _count('path')
+
+        if not cap.isOpened():
+            _count('failed')
+            raise ValueError("无法打开视频文件")
+        if budget is not None:
+            try:
+                budget.check(probe(cap))
+            except InputBudgetError as e:
+                _reject(e)
+        yield cap
+    finally:
+        if cap is not None:
+            cap.release()
+        del stream
+        if temp_path is not None and os.path.exists(temp_path):
+            with stage('tempfile'):
+                os.unlink(temp_path)
+
+
+def _check_deadline(deadline):
+    try:
+        check_deadline(deadline)
+    except InputBudgetError as e:
+        _reject(e)
+
+
+def sample_frames(cap, num_frames, transform=None, max_buffered=64, budget=None):
+    """均匀采样 num_frames 帧
+
+    帧数不超过 budget.max_decode_frames 时顺序读取一遍，跳过的帧只调用 grab()，
+    只有被选中的帧才 retrieve() 取出图像；帧数更多时逐帧 seek，解码量与视频长度无关。
+    帧数未知（容器没有记录）时边读边保留按步长抽取的帧，读完后按实际帧数挑选。
+
+    Args:
+        cap: 已打开的 cv2.VideoCapture
+        num_frames: 采样帧数
+        transform: 对每个取出的帧（BGR）做的处理，例如颜色转换和缩放
+        max_buffered: 帧数未知时最多保留的帧数
+        budget: VideoBudget，决定采样方式和解码耗时上限；为 None 时总是顺序读取、不限时
+
+    Returns:
+        长度为 num_frames 的列表，读取失败的位置为 None
+    """
+    transform = transform or (lambda frame: frame)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    max_frames = budget.max_decode_frames if budget is not None else None
+    deadline = budget.deadline() if budget is not None else None
+    if total > 0 and max_frames is not None and total > max_frames:
+        _count('seek')
+        return _sample_seek(cap, total, num_frames, transform, deadline)
+    if total > 0:
+        return _sample_known(cap, total, num_frames, transform, deadline)
+    return _sample_unknown(cap, num_frames, transform, max_buffered, max_frames, deadline)
+
+
+def _sample_known(cap, total, num_frames, transform, deadline=None):
+    indices = np.linspace(0, total - 1, num_frames, dtype=int)
+    frames = [None] * num_frames
+    slot = 0
+    position = 0
+    while slot < num_frames:
+        _check_deadline(deadline)
+        # 容器记录的帧数可能偏大，读到结尾时剩余位置保持 None
+        if not cap.grab():
+            break
+        if position == indices[slot]:
+            ret, frame = cap.retrieve()
+            frame = transform(frame) if ret else None
+            # 视频帧数少于采样数时，同一帧会被选中多次
+            while slot < num_frames and indices[slot] == position:
+                frames[slot] = frame
+                slot += 1
+        position += 1
+    return frames
+
+
+def _sample_seek(cap, total, num_frames, transform, deadline=None):
+    # 每次 seek 从最近的关键帧解码到目标帧，长视频只解码采样点附近的帧
+    indices = np.linspace(0, total - 1, num_frames, dtype=int)
+    frames = [None] * num_frames
+    for slot, index in enumerate(indices):
+        _check_deadline(deadline)
+        if slot > 0 and index == indices[slot - 1]:
+            frames[slot] = frames[slot - 1]
+            continue
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+        ret, frame = cap.read()
+        frames[slot] = transform(frame) if ret else None
+    return frames
+
+
+def _sample_unknown(cap, num_frames, transform, max_buffered, max_frames=None, deadline=None):
+    stride = 1
+    kept = []
+    position = 0
+    # 帧数未知时只读取前 max_frames 帧
+    while (max_frames is None or position < max_frames) and cap.grab():
+        _check_deadline(deadline)
+        if position % stride == 0:
+            ret, frame = cap.retrieve()
+            if ret:
+                kept.append((position, transform(frame)))
+            # 保留的帧过多时步长加倍，丢弃不在新步长上的帧，内存占用有上限
+            if len(kept) > max_buffered:
+                stride *= 2
+                kept = [item for item in kept if item[0] % stride == 0]
+        position += 1
+
+    if not kept:
+        return [None] * num_frames
+    positions = np.array([item[0] for item in kept])
+    targets = np.linspace(0, position - 1, num_frames)
+    return [kept[int(np.abs(positions - target).argmin())][1] for target in targets]
+
+
+def to_model_rgb(frame, frame_size=128):
+    """BGR 原始帧 -> 模型输入尺寸的 RGB 帧
+
+    先缩小再换通道顺序：换通道是纯排列，与先换后缩结果相同、计算量更小
+    """
+    frame = cv2.resize(frame, (frame_size, frame_size))
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+
+def iter_frames_at_interval(cap, interval, transform=None, deadline=None):
+    """顺序读取一遍视频，每隔 interval 秒取一帧，逐帧产出 (时间戳秒, 帧)
+
+    只保留当前帧，内存占用与视频长度无关。帧率未知时使用解码器给出的时间戳；
+    采样间隔小于帧间隔时同一帧会按时间重复产出，保证采样在时间上均匀。
+    超过 deadline（time.monotonic() 时间）仍未读完时抛出 InputBudgetError。
+    """
+    transform = transform or (lambda frame: frame)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    next_time = None
+    position = 0
+    while cap.grab():
+        _check_deadline(deadline)
+        timestamp = position / fps if fps and fps > 0 else cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        position += 1
+        if next_time is None:
+            next_time = timestamp
+        if timestamp + 1e-6 < next_time:
+            continue
+        ret, frame = cap.retrieve()
+        if not ret:
+            continue
+        frame = transform(frame)
+        while timestamp + 1e-6 >= next_time:
+            yield next_time, frame
+            next_time += interval
+
+
+def decode_clip(video, num_frames=8, frame_size=128, budget=None):
+    """解码视频并均匀采样，返回 uint8 RGB 缓冲区 [T, H, W, 3]
+
+    只依赖 OpenCV 和 numpy，可以在进程池中调用。读取失败的帧沿用上一帧，开头读取失败时为黑帧。
+
+    Args:
+        video: 视频文件路径或视频字节
+        num_frames: 采样帧数
+        frame_size: 输出帧的边长
+        budget: VideoBudget，超出时抛出 InputBudgetError；为 None 时不限制
+    """
+    with open_video(video, budget=budget) as cap:
+        # 短视频顺序读取一遍均匀采样（帧间编码的视频每次 seek 都要从关键帧重新解码），长视频逐帧 seek
+        with stage('decode'):
+            sampled = sample_frames(cap, num_frames, transform=functools.partial(to_model_rgb, frame_size=frame_size),
+                                    budget=budget)
+
+    # 采样帧直接写入预先分配的缓冲区
+    buffer = np.zeros((num_frames, frame_size, frame_size, 3), dtype=np.uint8)
+    for i, frame in enumerate(sampled):
+        if frame is not None:
+            buffer[i] = frame
+        elif i > 0:
+            buffer[i] = buffer[i - 1]
+    return buffer
+
+
+def find_videos(directory):
+    """递归列出目录下的视频文件，按路径排序"""
+    paths = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith(VIDEO_EXTENSIONS):
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def decoder_stats():
+    """解码路径统计：memory 为内存解码次数，tempfile 为退回临时文件的次数，
+    rejected 为超出输入预算被拒绝的次数，seek 为长视频改用 seek 采样的次数"""
+    with _lock:
+        return dict(_stats, stream_decoding=STREAM_DECODING)
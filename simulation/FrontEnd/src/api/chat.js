@@ -9,9 +9,27 @@ const api = axios.create({
   }
 })
 
+const SESSION_STORAGE_KEY = 'interviewSessionId'
+
+/**
+ * 获取当前标签页的面试会话ID，不存在时生成新的ID
+ * @returns {string} - 会话ID
+ */
+export const getSessionId = () => {
+  let sessionId = sessionStorage.getItem(SESSION_STORAGE_KEY)
+  if (!sessionId) {
+    sessionId = (crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`)
+      .replace(/[^A-Za-z0-9_-]/g, '')
+    sessionStorage.setItem(SESSION_STORAGE_KEY, sessionId)
+  }
+  return sessionId
+}
+
 // 请求拦截器
 api.interceptors.request.use(
   (config) => {
+    // 每个标签页使用独立的面试会话，避免多位求职者互相覆盖对话
+    config.headers['X-Session-Id'] = getSessionId()
     // 在这里可以添加认证token等
     // const token = localStorage.getItem('token')
     // if (token) {
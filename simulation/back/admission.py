@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+准入控制 - 限制同时进行的上游调用数量，并在会话之间公平排队
+
+- 同时放行的请求数不超过 max_concurrency，其余请求进入等待队列
+- 每个会话一个 FIFO 队列，会话之间按加权公平队列（start-time fair queueing）调度：
+  连续发请求的会话不会饿死其他会话；同一会话同时只放行一个请求（会话内本就串行）
+- 每个请求有排队截止时间，超时仍未放行的请求返回 503，不再占用上游配额
+- 队列已满返回 503，单个会话排队过多返回 429；预计等待时间超过截止时间时
+  直接拒绝，不必排到超时。拒绝时附带根据平均服务时间估算的 Retry-After
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+
+class AdmissionRejected(Exception):
+    """请求未被放行"""
+
+    def __init__(self, status, reason, retry_after):
+        """
+        Args:
+            status: 建议返回的 HTTP 状态码（429 或 503）
+            reason: 面向用户的拒绝原因
+            retry_after: 建议的重试等待秒数
+        """
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    """排队中的单个请求"""
+
+    __slots__ = ("session_id", "tag", "seq", "deadline", "enqueued_at", "event", "state", "ticket")
+
+    def __init__(self, session_id, tag, seq, deadline, event):
+        self.session_id = session_id
+        self.tag = tag
+        self.seq = seq
+        self.deadline = deadline
+        self.enqueued_at = time.monotonic()
+        self.event = event
+        # queued -> admitted / expired / cancelled
+        self.state = "queued"
+        self.ticket = None
+
+    def __lt__(self, other):
+        return (self.tag, self.seq) < (other.tag, other.seq)
+
+
+class Ticket:
+    """已放行请求的凭证，release() 可重复调用"""
+
+    __slots__ = ("_controller", "session_id", "admitted_at", "wait_seconds", "_released")
+
+    def __init__(self, controller, session_id, wait_seconds):
+        self._controller = controller
+        self.session_id = session_id
+        self.admitted_at = time.monotonic()
+        self.wait_seconds = wait_seconds
+        self._released = False
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._controller._release(self)
+
+
+class AdmissionController:
+    """线程版准入控制器"""
+
+    def __init__(self, max_concurrency=32, max_queue=256, max_session_queue=4,
+                 queue_timeout=10.0, initial_service_time=2.0, sample_size=1024):
+        """
+        Args:
+            max_concurrency: 同时放行的请求数上限
+            max_queue: 所有会话排队请求总数上限
+            max_session_queue: 单个会话排队请求数上限
+            queue_timeout: 默认排队截止时间（秒）
+            initial_service_time: 尚无样本时假设的单次请求耗时（秒），用于估算等待时间
+            sample_size: 统计等待时间分位数时保留的最近样本数
+        """
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_queue = max(0, int(max_queue))
+        self.max_session_queue = max(1, int(max_session_queue))
+        self.queue_timeout = float(queue_timeout)
+
+        self._lock = threading.Lock()
+        self._active = 0
+        self._active_sessions = set()
+        # session_id -> deque[_Waiter]；只有队首可被调度
+        self._flows = {}
+        self._queued = 0
+        # 可调度的会话队首，按虚拟开始时间排序；可能含有已失效的条目，弹出时跳过
+        self._ready = []
+        self._virtual_time = 0.0
+        # session_id -> 该会话最后一个请求的虚拟完成时间
+        self._last_tag = {}
+        self._seq = itertools.count()
+
+        self._service_time = float(initial_service_time)
+        self._completed = 0
+        self._waits = deque(maxlen=sample_size)
+
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "session_limit": 0, "deadline": 0}
+        self.timed_out = 0
+
+    def _new_event(self):
+        return threading.Event()
+
+    def estimate_wait(self, position=None):
+        """估算排在第 position 位的请求需要等待多少秒"""
+        if position is None:
+            position = self._queued
+        return (position + 1) * self._service_time / self.max_concurrency
+
+    def _retry_after(self):
+        return max(1, math.ceil(self.estimate_wait()))
+
+    def _reject_locked(self, kind, status, reason):
+        self.rejected[kind] += 1
+        return AdmissionRejected(status, reason, self._retry_after())
+
+    def _enqueue(self, session_id, weight, timeout):
+        """登记请求，返回 (ticket, waiter)：可立即放行时 waiter 为 None"""
+        timeout = self.queue_timeout if timeout is None else timeout
+        now = time.monotonic()
+        with self._lock:
+            if self._active < self.max_concurrency and session_id not in self._active_sessions:
+                self._virtual_time = max(self._virtual_time, self._tag_locked(session_id, weight))
+                return self._admit_locked(session_id, 0.0), None
+
+            flow = self._flows.get(session_id)
+            if self._queued >= self.max_queue:
+                raise self._reject_locked("queue_full", 503, "服务繁忙，排队人数已满，请稍后再试")
+            if flow is not None and len(flow) >= self.max_session_queue:
+                raise self._reject_locked("session_limit", 429, "请求过于频繁，请等待上一条回复完成")
+            # 还没有完成过的请求时估算值只是猜测，不据此拒绝
+            if self._completed and self.estimate_wait() > timeout:
+                raise self._reject_locked("deadline", 503, "服务繁忙，预计等待时间过长，请稍后再试")
+
+            waiter = _Waiter(session_id, self._tag_locked(session_id, weight), next(self._seq), now + timeout, self._new_event())
+            if flow is None:
+                flow = self._flows[session_id] = deque()
+            flow.append(waiter)
+            self._queued += 1
+            if len(flow) == 1 and session_id not in self._active_sessions:
+                heapq.heappush(self._ready, waiter)
+            return None, waiter
+
+    def _tag_locked(self, session_id, weight):
+        """计算请求的虚拟开始时间
+
+        开始时间不早于当前虚拟时间，也不早于该会话上一个请求的虚拟完成时间；
+        权重越大，虚拟完成时间推进得越慢，分到的份额越多。
+        """
+        start = max(self._virtual_time, self._last_tag.get(session_id, 0.0))
+        self._last_tag[session_id] = start + 1.0 / max(weight, 1e-6)
+        return start
+
+    def _admit_locked(self, session_id, wait_seconds):
+        self._active += 1
+        self._active_sessions.add(session_id)
+        self.admitted += 1
+        self._waits.append(wait_seconds)
+        return Ticket(self, session_id, wait_seconds)
+
+    def _pop_flow_locked(self, waiter):
+        """把请求移出所在会话的队列，并在需要时让下一个请求参与调度"""
+        flow = self._flows.get(waiter.session_id)
+        if flow is None:
+            return
+        was_head = bool(flow) and flow[0] is waiter
+        try:
+            flow.remove(waiter)
+        except ValueError:
+            return
+        self._queued -= 1
+        if not flow:
+            del self._flows[waiter.session_id]
+            if waiter.session_id not in self._active_sessions:
+                self._last_tag.pop(waiter.session_id, None)
+        elif was_head and waiter.session_id not in self._active_sessions:
+            heapq.heappush(self._ready, flow[0])
+
+    def _dispatch_locked(self):
+        """在有空闲名额时按虚拟开始时间放行队首请求"""
+        now = time.monotonic()
+        while self._ready and self._active < self.max_concurrency:
+            waiter = heapq.heappop(self._ready)
+            flow = self._flows.get(waiter.session_id)
+            if waiter.state != "queued" or not flow or flow[0] is not waiter:
+                continue
+            if waiter.session_id in self._active_sessions:
+                # 会话已有请求在执行，等其结束后再参与调度
+                continue
+            if waiter.deadline <= now:
+                # 已过截止时间的请求直接出队，由等待方返回 503
+                waiter.state = "expired"
+                self._pop_flow_locked(waiter)
+                self.timed_out += 1
+                waiter.event.set()
+                continue
+            # 先占用名额再出队，避免同一会话的下一个请求被同时调度
+            waiter.ticket = self._admit_locked(waiter.session_id, now - waiter.enqueued_at)
+            waiter.state = "admitted"
+            self._pop_flow_locked(waiter)
+            self._virtual_time = max(self._virtual_time, waiter.tag)
+            waiter.event.set()
+
+    def _claim(self, waiter):
+        """等待结束后确认结果：放行返回 Ticket，否则抛出 AdmissionRejected"""
+        with self._lock:
+            if waiter.state == "admitted":
+                return waiter.ticket
+            if waiter.state == "queued":
+                waiter.state = "expired"
+                self._pop_flow_locked(waiter)
+                self.timed_out += 1
+            raise AdmissionRejected(503, "服务繁忙，排队超时，请稍后再试", self._retry_after())
+
+    def _cancel(self, waiter):
+        """等待方被取消（例如客户端断开）时撤回请求"""
+        with self._lock:
+            if waiter.state == "queued":
+                waiter.state = "cancelled"
+                self._pop_flow_locked(waiter)
+                return
+            ticket = waiter.ticket
+        # 已被放行但等待方不再需要：立即归还名额
+        if ticket is not None:
+            ticket.release()
+
+    def _release(self, ticket):
+        elapsed = time.monotonic() - ticket.admitted_at
+        with self._lock:
+            self._active -= 1
+            self._active_sessions.discard(ticket.session_id)
+            # 指数加权平均的单次服务时间，用于估算排队等待
+            self._service_time = 0.8 * self._service_time + 0.2 * elapsed
+            self._completed += 1
+            flow = self._flows.get(ticket.session_id)
+            if flow:
+                heapq.heappush(self._ready, flow[0])
+            else:
+                self._last_tag.pop(ticket.session_id, None)
+            self._dispatch_locked()
+
+    def acquire(self, session_id, weight=1.0, timeout=None):
+        """申请一个名额，排队直到放行或超过截止时间
+
+        Args:
+            session_id: 会话ID，公平调度的单位
+            weight: 会话权重，权重越大分到的份额越多
+            timeout: 排队截止时间（秒），为空时使用 queue_timeout
+
+        Returns:
+            Ticket，使用完毕后调用 release()
+
+        Raises:
+            AdmissionRejected: 队列已满、会话排队过多或排队超时
+        """
+        ticket, waiter = self._enqueue(session_id, weight, timeout)
+        if ticket is not None:
+            return ticket
+        waiter.event.wait(max(0.0, waiter.deadline - time.monotonic()))
+        return self._claim(waiter)
+
+    @contextmanager
+    def slot(self, session_id, weight=1.0, timeout=None):
+        """持有名额执行代码块
+
+        用法:
+            with admission.slot(session_id):
+                ...
+        """
+        ticket = self.acquire(session_id, weight, timeout)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def stats(self):
+        """准入统计信息"""
+        with self._lock:
+            waits = sorted(self._waits)
+            stats = {
+                "max_concurrency": self.max_concurrency,
+                "active": self._active,
+                "queued": self._queued,
+                "queued_sessions": len(self._flows),
+                "max_queue": self.max_queue,
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected),
+                "timed_out": self.timed_out,
+                "service_time_ms": round(self._service_time * 1000, 1),
+                "estimated_wait_ms": round(self.estimate_wait() * 1000, 1)
+            }
+        for name, q in (("wait_p50_ms", 0.5), ("wait_p95_ms", 0.95), ("wait_p99_ms", 0.99)):
+            stats[name] = round(waits[min(len(waits) - 1, int(q * len(waits)))] * 1000, 1) if waits else 0.0
+        return stats
+
+
+class AsyncAdmissionController(AdmissionController):
+    """协程版准入控制器，只能在同一个事件循环内使用"""
+
+    def _new_event(self):
+        return asyncio.Event()
+
+    async def acquire(self, session_id, weight=1.0, timeout=None):
+        ticket, waiter = self._enqueue(session_id, weight, timeout)
+        if ticket is not None:
+            return ticket
+        try:
+            await asyncio.wait_for(waiter.event.wait(), max(0.0, waiter.deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            pass
+        except BaseException:
+            self._cancel(waiter)
+            raise
+        return self._claim(waiter)
+
+    @asynccontextmanager
+    async def slot(self, session_id, weight=1.0, timeout=None):
+        ticket = await self.acquire(session_id, weight, timeout)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
@@ -1,218 +1,195 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-import requests
-import json
-import os
+import atexit
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from dotenv import load_dotenv
 
-# 加载环境变量
-load_dotenv()
+from config import (
+    ADMISSION_MAX_CONCURRENCY,
+    ADMISSION_MAX_QUEUE,
+    ADMISSION_QUEUE_TIMEOUT,
+    ADMISSION_SESSION_QUEUE,
+    AVAILABLE_MODELS,
+    CONTEXT_FOLD_BATCH,
+    CONTEXT_SUMMARY_WEIGHT,
+    CONTEXT_SUMMARY_TOKENS,
+    CONTEXT_SUMMARY_WORKERS,
+    CONTEXT_TOKEN_BUDGET,
+    FIRST_QUESTION_CACHE_DIR,
+    FIRST_QUESTION_CACHE_DISK_ENTRIES,
+    FIRST_QUESTION_CACHE_SIZE,
+    FIRST_QUESTION_CACHE_TTL,
+    HISTORY_BACKEND,
+    HISTORY_BATCH_SIZE,
+    HISTORY_DB_PATH,
+    HISTORY_FLUSH_INTERVAL,
+    SESSION_MAX_COUNT,
+    SESSION_TTL_SECONDS,
+    SPARK_API_KEY,
+    SPARK_API_URL,
+    SPARK_CONNECT_TIMEOUT,
+    SPARK_POOL_SIZE,
+    SPARK_READ_TIMEOUT,
+    create_resilience
+)
+from chat_service import ChatRuntime, ChatService, build_chat_payload, build_start_payload, format_sse
+from spark_client import SparkClient
+from context_builder import ContextWindow
+from history_store import create_history_store
+from first_question_cache import TTLCache, SingleFlight
+from session_store import SessionRegistry, DEFAULT_SESSION_ID, is_valid_session_id
+from admission import AdmissionController, AdmissionRejected
 
 app = Flask(__name__)
 CORS(app)  # 允许跨域请求
 
-# 星火大模型API配置 - 优先使用环境变量
-SPARK_API_URL = os.getenv("SPARK_API_URL", "https://spark-api-open.xf-yun.com/v1/chat/completions")
-SPARK_API_KEY = os.getenv("SPARK_API_KEY", "")
-SPARK_APP_ID = os.getenv("SPARK_APP_ID", "")
-SPARK_API_SECRET = os.getenv("SPARK_API_SECRET", "")
-
 # 检查API密钥是否配置
 if not SPARK_API_KEY:
     print("⚠️  警告：未正确配置星火大模型API密钥！请设置环境变量 SPARK_API_KEY")
 
-class ChatService:
-    def __init__(self):
-        self.conversation_history = []
-        self.resume_data = None
-        
-    def set_resume(self, resume_data):
-        """设置简历数据"""
-        self.resume_data = resume_data
-    
-    def add_message(self, role, content):
-        """添加消息到对话历史"""
-        self.conversation_history.append({
-            "role": role,
-            "content": content,
-            "timestamp": datetime.now().isoformat()
-        })
-    
-    def generate_interview_prompt(self, resume_data):
-        """生成面试官的系统提示词"""
-        prompt = f"""你是一位专业的面试官，正在为以下求职者进行面试。请根据他们的简历信息，进行专业、友好的面试对话。
+# 进程内共享的上游客户端，所有会话复用同一个连接池
+spark_client = SparkClient(
+    SPARK_API_URL,
+    SPARK_API_KEY,
+    pool_maxsize=SPARK_POOL_SIZE,
+    connect_timeout=SPARK_CONNECT_TIMEOUT,
+    read_timeout=SPARK_READ_TIMEOUT,
+    resilience=create_resilience()
+)
 
-===== 求职者简历信息 =====
-姓名：{resume_data.get('name', '未提供')}
-年龄：{resume_data.get('age', '未提供')}
-期望职位：{resume_data.get('targetPosition', '未提供')}
-期望薪资：{resume_data.get('expectedSalary', '未提供')}
-学历：{resume_data.get('education', '未提供')}
-专业：{resume_data.get('major', '未提供')}
-毕业院校：{resume_data.get('university', '未提供')}
-毕业年份：{resume_data.get('graduationYear', '未提供')}
-工作经验：{resume_data.get('workExperience', '未提供')}
-工作描述：{resume_data.get('workDescription', '未提供')}
-技术技能：{resume_data.get('technicalSkills', '未提供')}
-其他技能：{resume_data.get('otherSkills', '未提供')}
-项目经验：{resume_data.get('projectExperience', '未提供')}
-自我评价：{resume_data.get('selfEvaluation', '未提供')}
-===========================
+# 按 token 预算构建请求消息，旧消息在后台增量合并为摘要
+context_window = ContextWindow(
+    token_budget=CONTEXT_TOKEN_BUDGET,
+    summary_tokens=CONTEXT_SUMMARY_TOKENS,
+    fold_batch=CONTEXT_FOLD_BATCH
+)
+summary_executor = ThreadPoolExecutor(max_workers=CONTEXT_SUMMARY_WORKERS, thread_name_prefix="summary")
 
-面试要求：
-1. 作为专业面试官，你需要：
-   - 根据求职者的简历背景，问出有针对性的问题
-   - 保持专业、友好的语调，营造轻松的面试氛围
-   - 循序渐进地了解求职者的能力、经验和职业规划
-   - 适时给出正面反馈，鼓励求职者充分展示自己
+# 对话历史存储：会话被淘汰或服务重启后可从这里恢复
+history_store = create_history_store(
+    HISTORY_BACKEND,
+    max_sessions=SESSION_MAX_COUNT,
+    path=HISTORY_DB_PATH,
+    batch_size=HISTORY_BATCH_SIZE,
+    flush_interval=HISTORY_FLUSH_INTERVAL
+)
+atexit.register(history_store.close)
 
-2. 面试重点关注：
-   - 与目标职位相关的技能和经验
-   - 求职者的学习能力和适应能力
-   - 项目经验和技术深度
-   - 团队协作和沟通能力
-   - 职业规划和发展目标
+# 第一个问题：相同简历的并发请求合并为一次上游调用，结果进入 TTL 缓存
+first_question_cache = TTLCache(
+    max_entries=FIRST_QUESTION_CACHE_SIZE,
+    ttl_seconds=FIRST_QUESTION_CACHE_TTL,
+    persist_dir=FIRST_QUESTION_CACHE_DIR,
+    max_disk_entries=FIRST_QUESTION_CACHE_DISK_ENTRIES
+)
+first_question_flight = SingleFlight()
 
-3. 面试风格：
-   - 语言简洁清楚，避免过于复杂的表述
-   - 一次只问一个核心问题，给求职者充分表达机会
-   - 根据求职者的回答，进行适当的追问和深入
-   - 保持积极正面的面试体验
+# 准入控制：限制同时进行的上游调用，按会话公平排队，过载时尽早拒绝
+admission = AdmissionController(
+    max_concurrency=ADMISSION_MAX_CONCURRENCY,
+    max_queue=ADMISSION_MAX_QUEUE,
+    max_session_queue=ADMISSION_SESSION_QUEUE,
+    queue_timeout=ADMISSION_QUEUE_TIMEOUT
+)
 
-请现在开始面试，先给出一个合适的开场白和第一个问题。记住你是面试官，需要引导整个面试过程。"""
-        
-        return prompt
+# 同步模式下各会话共享的组件
+chat_runtime = ChatRuntime(
+    client=spark_client,
+    store=history_store,
+    context_window=context_window,
+    first_question_cache=first_question_cache,
+    first_question_flight=first_question_flight,
+    summary_executor=summary_executor,
+    admission=admission,
+    summary_weight=CONTEXT_SUMMARY_WEIGHT
+)
+
+# 会话注册表：每个会话拥有独立的聊天服务实例
+session_registry = SessionRegistry(
+    functools.partial(ChatService.for_session, chat_runtime),
+    max_sessions=SESSION_MAX_COUNT,
+    ttl_seconds=SESSION_TTL_SECONDS
+)
+
+def get_session_id(data=None):
+    """从请求中读取会话ID：请求头 X-Session-Id > JSON sessionId > 查询参数 sessionId"""
+    session_id = request.headers.get('X-Session-Id')
+    if not session_id and isinstance(data, dict):
+        session_id = data.get('sessionId')
+    if not session_id:
+        session_id = request.args.get('sessionId')
+    if not session_id:
+        return DEFAULT_SESSION_ID
+    session_id = str(session_id).strip()
+    if not is_valid_session_id(session_id):
+        raise ValueError("会话ID格式错误，只允许1-64位字母、数字、下划线或连字符")
+    return session_id
+
+def wants_stream(data=None):
+    """判断客户端是否请求 SSE 流式响应：JSON stream=true 或 Accept: text/event-stream"""
+    if isinstance(data, dict) and data.get('stream') is True:
+        return True
+    return 'text/event-stream' in request.headers.get('Accept', '')
+
+def sse_response(events):
+    """将事件生成器包装为 SSE 响应，禁用代理缓冲以便逐段推送"""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+def rejected_response(e, session_id=None):
+    """准入被拒时返回 429/503，并通过 Retry-After 告知客户端何时重试"""
+    response = jsonify({
+        "success": False,
+        "error": e.reason,
+        "retryAfter": e.retry_after,
+        "sessionId": session_id
+    })
+    response.status_code = e.status
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+def stream_session_events(session_id, produce, build_payload):
+    """在会话锁内消费服务产出的事件并转为 SSE
+
+    produce 接收会话的 ChatService，返回 (事件类型, 数据) 生成器；
+    build_payload 将最终结果转换为与非流式接口一致的响应体。
+    准入名额在返回响应前申请（被拒时抛出 AdmissionRejected，由路由返回 429/503），
+    流结束或客户端断开时随会话锁和上游连接一起释放。
+    """
+    ticket = admission.acquire(session_id)
     
-    def get_spark_response(self, user_message, model="generalv3.5"):
-        """调用星火大模型API获取回复"""
+    def generate():
         try:
-            # 添加用户消息到历史
-            self.add_message("user", user_message)
-            
-            # 准备请求数据 - 星火大模型需要特定的认证方式
-            headers = {
-                "Authorization": f"Bearer {SPARK_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            
-            # 构建消息历史（只发送最近10条消息以控制token使用）
-            messages = []
-            
-            # 如果是面试场景且有简历信息，添加系统提示词
-            if self.resume_data and len(self.conversation_history) <= 2:
-                system_prompt = self.generate_interview_prompt(self.resume_data)
-                messages.append({
-                    "role": "system",
-                    "content": system_prompt
-                })
-            
-            # 添加对话历史
-            recent_history = self.conversation_history[-10:]
-            for msg in recent_history:
-                if msg["role"] in ["user", "assistant"]:
-                    messages.append({
-                        "role": msg["role"],
-                        "content": msg["content"]
-                    })
-            
-            data = {
-                "model": model,
-                "messages": messages,
-                "temperature": 0.7,
-                "max_tokens": 2048,
-                "stream": False
-            }
-            
-            # 调用星火大模型API
-            response = requests.post(SPARK_API_URL, headers=headers, json=data, timeout=30)
-            response.raise_for_status()
-            
-            result = response.json()
-            
-            # 提取AI回复
-            ai_message = result["choices"][0]["message"]["content"]
-            
-            # 添加AI回复到历史
-            self.add_message("assistant", ai_message)
-            
-            return {
-                "success": True,
-                "message": ai_message,
-                "usage": result.get("usage", {}),
-                "model": model
-            }
-            
-        except requests.exceptions.RequestException as e:
-            return {
-                "success": False,
-                "error": f"API请求失败: {str(e)}",
-                "message": "抱歉，我现在无法回答您的问题，请稍后再试。"
-            }
+            yield format_sse("session", {"sessionId": session_id})
+            with session_registry.session(session_id) as chat_service:
+                for event, payload in produce(chat_service):
+                    if event == "done":
+                        payload = build_payload(payload, session_id)
+                    yield format_sse(event, payload)
         except Exception as e:
-            return {
+            yield format_sse("error", {
                 "success": False,
-                "error": f"处理失败: {str(e)}",
-                "message": "抱歉，处理您的请求时出现了错误。"
-            }
+                "error": f"服务器内部错误: {str(e)}",
+                "sessionId": session_id
+            })
+        finally:
+            ticket.release()
     
-    def generate_first_question(self, resume_data):
-        """根据简历生成第一个面试问题"""
-        try:
-            # 设置简历数据
-            self.set_resume(resume_data)
-            
-            # 生成系统提示词并获取第一个问题
-            system_prompt = self.generate_interview_prompt(resume_data)
-            
-            # 直接调用API获取第一个问题
-            headers = {
-                "Authorization": f"Bearer {SPARK_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            
-            messages = [
-                {
-                    "role": "system", 
-                    "content": system_prompt
-                },
-                {
-                    "role": "user",
-                    "content": "请开始面试，给出开场白和第一个问题。"
-                }
-            ]
-            
-            data = {
-                "model": "generalv3.5",
-                "messages": messages,
-                "temperature": 0.7,
-                "max_tokens": 1024,
-                "stream": False
-            }
-            
-            response = requests.post(SPARK_API_URL, headers=headers, json=data, timeout=30)
-            response.raise_for_status()
-            
-            result = response.json()
-            first_question = result["choices"][0]["message"]["content"]
-            
-            # 添加到对话历史
-            self.add_message("assistant", first_question)
-            
-            return {
-                "success": True,
-                "question": first_question
-            }
-            
-        except Exception as e:
-            return {
-                "success": False,
-                "error": f"生成面试问题失败: {str(e)}",
-                "question": f"您好 {resume_data.get('name', '求职者')}！很高兴见到您。请先简单介绍一下您自己，包括您的教育背景和工作经验。"
-            }
-
-# 创建聊天服务实例
-chat_service = ChatService()
+    try:
+        response = sse_response(generate())
+    except BaseException:
+        ticket.release()
+        raise
+    # 生成器未开始迭代就被丢弃时 finally 不会执行，响应关闭时再兜底释放一次
+    response.call_on_close(ticket.release)
+    return response
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
@@ -220,6 +197,11 @@ def health_check():
     return jsonify({
         "status": "healthy",
         "service": "DeepSeek Chat API",
+        "sessions": session_registry.stats(),
+        "upstream": spark_client.stats(),
+        "history": history_store.stats(),
+        "first_question_cache": dict(first_question_cache.stats(), **first_question_flight.stats()),
+        "admission": admission.stats(),
         "timestamp": datetime.now().isoformat()
     })
 
@@ -242,27 +224,35 @@ def chat():
                 "error": "消息内容不能为空"
             }), 400
         
+        try:
+            session_id = get_session_id(data)
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+        
         # 获取模型参数（可选）
         model = data.get('model', 'generalv3.5')
         
-        # 调用星火大模型API
-        result = chat_service.get_spark_response(user_message, model)
+        # 流式模式：边生成边推送，完整回复在流结束后写入历史
+        if wants_stream(data):
+            return stream_session_events(
+                session_id,
+                lambda chat_service: chat_service.stream_spark_response(user_message, model),
+                lambda result, sid: build_chat_payload(result, sid)[0]
+            )
         
-        if result["success"]:
-            return jsonify({
-                "success": True,
-                "response": result["message"],
-                "model": result["model"],
-                "usage": result.get("usage", {}),
-                "timestamp": datetime.now().isoformat()
-            })
-        else:
-            return jsonify({
-                "success": False,
-                "error": result["error"],
-                "response": result["message"]
-            }), 500
-            
+        # 调用星火大模型API（先通过准入控制，同一会话的请求串行执行）
+        with admission.slot(session_id):
+            with session_registry.session(session_id) as chat_service:
+                result = chat_service.get_spark_response(user_message, model)
+        
+        payload, status = build_chat_payload(result, session_id)
+        return jsonify(payload), status
+    
+    except AdmissionRejected as e:
+        return rejected_response(e, session_id)
     except Exception as e:
         return jsonify({
             "success": False,
@@ -272,16 +262,26 @@ def chat():
 
 @app.route('/api/chat/history', methods=['GET'])
 def get_chat_history():
-    """获取对话历史"""
+    """获取对话历史（按游标分页，cursor 为上一页返回的 nextCursor）"""
     try:
-        limit = request.args.get('limit', 50, type=int)
-        history = chat_service.conversation_history[-limit:]
+        session_id = get_session_id()
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 500)
+        cursor = request.args.get('cursor', None, type=int)
+        
+        history, next_cursor, total = history_store.page(session_id, limit=limit, before=cursor)
         
         return jsonify({
             "success": True,
             "history": history,
-            "total": len(chat_service.conversation_history)
+            "total": total,
+            "nextCursor": next_cursor,
+            "sessionId": session_id
         })
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             "success": False,
@@ -292,12 +292,25 @@ def get_chat_history():
 def clear_chat_history():
     """清空对话历史"""
     try:
-        chat_service.conversation_history.clear()
-        chat_service.resume_data = None
+        session_id = get_session_id(request.get_json(silent=True))
+        try:
+            # 持有会话锁清空，避免与同一会话正在处理的请求交错
+            with session_registry.session(session_id, create=False) as chat_service:
+                chat_service.reset_conversation()
+                session_registry.discard(session_id)
+        except KeyError:
+            # 会话不在内存中，只需清空存储
+            history_store.clear(session_id)
         return jsonify({
             "success": True,
-            "message": "对话历史已清空"
+            "message": "对话历史已清空",
+            "sessionId": session_id
         })
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             "success": False,
@@ -327,31 +340,36 @@ def start_interview():
                     "error": f"简历必填字段缺失: {field}"
                 }), 400
         
-        print(f"📋 收到简历提交：{resume_data.get('name')} - {resume_data.get('targetPosition')}")
-        
-        # 清空之前的对话历史，开始新的面试
-        chat_service.conversation_history.clear()
+        try:
+            session_id = get_session_id(data)
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
         
-        # 生成第一个面试问题
-        result = chat_service.generate_first_question(resume_data)
+        print(f"📋 收到简历提交：{resume_data.get('name')} - {resume_data.get('targetPosition')} (会话: {session_id})")
         
-        if result["success"]:
-            return jsonify({
-                "success": True,
-                "firstQuestion": result["question"],
-                "message": "简历提交成功，面试已开始",
-                "timestamp": datetime.now().isoformat()
-            })
-        else:
-            # 即使API调用失败，也返回默认问题
-            return jsonify({
-                "success": True,
-                "firstQuestion": result["question"],
-                "message": "简历提交成功，面试已开始（使用默认问题）",
-                "error": result.get("error"),
-                "timestamp": datetime.now().isoformat()
-            })
+        if wants_stream(data):
+            def produce(chat_service):
+                # 清空之前的对话历史，开始新的面试
+                chat_service.reset_conversation()
+                return chat_service.stream_first_question(resume_data)
             
+            return stream_session_events(session_id, produce, build_start_payload)
+        
+        with admission.slot(session_id):
+            with session_registry.session(session_id) as chat_service:
+                # 清空之前的对话历史，开始新的面试
+                chat_service.reset_conversation()
+                
+                # 生成第一个面试问题
+                result = chat_service.generate_first_question(resume_data)
+        
+        return jsonify(build_start_payload(result, session_id))
+    
+    except AdmissionRejected as e:
+        return rejected_response(e, session_id)
     except Exception as e:
         print(f"❌ 面试启动失败: {str(e)}")
         return jsonify({
@@ -363,22 +381,9 @@ def start_interview():
 @app.route('/api/models', methods=['GET'])
 def get_available_models():
     """获取可用的模型列表"""
-    models = [
-        {
-            "id": "generalv3.5",
-            "name": "星火大模型 3.5",
-            "description": "星火大模型通用版本，适合面试对话"
-        },
-        {
-            "id": "generalv2",
-            "name": "星火大模型 2.0",
-            "description": "星火大模型标准版本"
-        }
-    ]
-    
     return jsonify({
         "success": True,
-        "models": models
+        "models": AVAILABLE_MODELS
     })
 
 if __name__ == '__main__':
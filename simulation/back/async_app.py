@@ -0,0 +1,614 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步聊天服务 - 基于 aiohttp 的非阻塞服务模式
+
+提供与 app.py 相同的路由和响应格式（包括 SSE 流式模式），区别在于
+等待星火大模型响应时只占用一个协程而不是一个线程，单个进程即可同时
+挂起大量正在等待上游的面试会话。
+
+提示词构建、对话历史和结果格式沿用 chat_service.py 中的 ChatService，
+这里只替换上游调用方式；不导入 app.py，不会创建同步模式的客户端和线程池。
+
+启动方式:
+    python async_app.py
+"""
+
+import asyncio
+import atexit
+import functools
+import json
+import os
+from datetime import datetime
+
+import aiohttp
+from aiohttp import web
+
+from config import (
+    ADMISSION_MAX_CONCURRENCY,
+    ADMISSION_MAX_QUEUE,
+    ADMISSION_QUEUE_TIMEOUT,
+    ADMISSION_SESSION_QUEUE,
+    AVAILABLE_MODELS,
+    CONTEXT_FOLD_BATCH,
+    CONTEXT_SUMMARY_WEIGHT,
+    CONTEXT_SUMMARY_TOKENS,
+    CONTEXT_TOKEN_BUDGET,
+    FIRST_QUESTION_CACHE_DIR,
+    FIRST_QUESTION_CACHE_DISK_ENTRIES,
+    FIRST_QUESTION_CACHE_SIZE,
+    FIRST_QUESTION_CACHE_TTL,
+    HISTORY_BACKEND,
+    HISTORY_BATCH_SIZE,
+    HISTORY_DB_PATH,
+    HISTORY_FLUSH_INTERVAL,
+    SESSION_MAX_COUNT,
+    SESSION_TTL_SECONDS,
+    SPARK_API_KEY,
+    SPARK_API_URL,
+    SPARK_CONNECT_TIMEOUT,
+    SPARK_READ_TIMEOUT,
+    create_resilience
+)
+from chat_service import ChatRuntime, ChatService, build_chat_payload, build_start_payload, format_sse
+from admission import AsyncAdmissionController, AdmissionRejected
+from resilience import CircuitOpenError
+from context_builder import ContextWindow, build_summary_request, extractive_summary, truncate_to_tokens
+from first_question_cache import AsyncSingleFlight, TTLCache, first_question_key
+from history_store import create_history_store
+from session_store import SessionRegistry, DEFAULT_SESSION_ID, is_valid_session_id
+from spark_client import AsyncSparkClient
+
+# 异步模式下单进程可挂起的上游连接数
+SPARK_ASYNC_POOL_SIZE = int(os.getenv("SPARK_ASYNC_POOL_SIZE", "256"))
+
+async_spark_client = AsyncSparkClient(
+    SPARK_API_URL,
+    SPARK_API_KEY,
+    pool_maxsize=SPARK_ASYNC_POOL_SIZE,
+    connect_timeout=SPARK_CONNECT_TIMEOUT,
+    read_timeout=SPARK_READ_TIMEOUT,
+    resilience=create_resilience()
+)
+
+context_window = ContextWindow(
+    token_budget=CONTEXT_TOKEN_BUDGET,
+    summary_tokens=CONTEXT_SUMMARY_TOKENS,
+    fold_batch=CONTEXT_FOLD_BATCH
+)
+
+history_store = create_history_store(
+    HISTORY_BACKEND,
+    max_sessions=SESSION_MAX_COUNT,
+    path=HISTORY_DB_PATH,
+    batch_size=HISTORY_BATCH_SIZE,
+    flush_interval=HISTORY_FLUSH_INTERVAL
+)
+atexit.register(history_store.close)
+
+first_question_cache = TTLCache(
+    max_entries=FIRST_QUESTION_CACHE_SIZE,
+    ttl_seconds=FIRST_QUESTION_CACHE_TTL,
+    persist_dir=FIRST_QUESTION_CACHE_DIR,
+    max_disk_entries=FIRST_QUESTION_CACHE_DISK_ENTRIES
+)
+first_question_flight = AsyncSingleFlight()
+
+# 异步模式的准入控制（配置与同步模式相同）
+admission = AsyncAdmissionController(
+    max_concurrency=ADMISSION_MAX_CONCURRENCY,
+    max_queue=ADMISSION_MAX_QUEUE,
+    max_session_queue=ADMISSION_SESSION_QUEUE,
+    queue_timeout=ADMISSION_QUEUE_TIMEOUT
+)
+
+# 异步模式下各会话共享的组件（摘要任务直接在事件循环中运行，不需要线程池）
+chat_runtime = ChatRuntime(
+    client=async_spark_client,
+    store=history_store,
+    context_window=context_window,
+    first_question_cache=first_question_cache,
+    first_question_flight=first_question_flight,
+    admission=admission,
+    summary_weight=CONTEXT_SUMMARY_WEIGHT
+)
+
+# 正在运行的后台摘要任务
+_summary_tasks = set()
+
+
+class AsyncChatService(ChatService):
+    """ChatService 的异步版本：消息构建与历史管理沿用父类，只替换上游调用"""
+
+    transport_errors = (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError)
+
+    async def _stream_completion(self, data):
+        """以流式方式调用星火大模型，逐段产出 ("delta", 文本) 或 ("usage", 用量字典)"""
+        lines = self.client.stream_lines(dict(data, stream=True))
+        try:
+            async for line in lines:
+                events = self._parse_stream_line(line)
+                if events is None:
+                    break
+                for event in events:
+                    yield event
+        finally:
+            # 提前结束时及时关闭上游响应，连接归还连接池
+            await lines.aclose()
+
+    def _start_summary_job(self, generation, previous, messages, end):
+        """在事件循环中运行摘要任务"""
+        task = asyncio.get_running_loop().create_task(
+            self._run_summary_async(generation, previous, messages, end)
+        )
+        # 保留任务引用，避免任务在完成前被垃圾回收
+        _summary_tasks.add(task)
+        task.add_done_callback(_summary_tasks.discard)
+
+    async def _run_summary_async(self, generation, previous, messages, end):
+        """后台摘要任务：大模型失败时退化为截取式摘要"""
+        summary_tokens = self.runtime.context_window.summary_tokens
+        try:
+            data = build_summary_request(previous, messages, summary_tokens)
+            async with self._summary_slot():
+                result = await self.client.post_json(data)
+            text = result["choices"][0]["message"]["content"].strip()
+            text = truncate_to_tokens(text, summary_tokens)
+        except Exception as e:
+            print(f"⚠️  对话摘要生成失败，使用截取式摘要: {e}")
+            text = extractive_summary(previous, messages, summary_tokens)
+        self.summary.apply(generation, text, end)
+
+    async def get_spark_response(self, user_message, model="generalv3.5"):
+        """调用星火大模型API获取回复"""
+        try:
+            data = self._prepare_chat(user_message, model)
+            result = await self.client.post_json(data)
+            ai_message = result["choices"][0]["message"]["content"]
+            return self._finish_chat(ai_message, result.get("usage", {}), model)
+        except Exception as e:
+            return self._chat_error(e)
+
+    async def stream_spark_response(self, user_message, model="generalv3.5"):
+        """流式调用星火大模型API，事件格式与 ChatService.stream_spark_response 一致"""
+        data = self._prepare_chat(user_message, model)
+
+        parts = []
+        usage = {}
+        try:
+            async for kind, value in self._stream_completion(data):
+                if kind == "delta":
+                    parts.append(value)
+                    yield "delta", {"content": value}
+                else:
+                    usage = value
+        except Exception as e:
+            yield "done", self._chat_error(e)
+            return
+
+        yield "done", self._finish_chat("".join(parts), usage, model)
+
+    async def _fetch_first_question(self, key, data):
+        """向上游请求第一个问题并写入缓存"""
+        result = await self.client.post_json(data)
+        first_question = self._check_first_question(result["choices"][0]["message"]["content"])
+        self.runtime.first_question_cache.put(key, first_question)
+        return first_question
+
+    async def generate_first_question(self, resume_data):
+        """根据简历生成第一个面试问题（优先读缓存，并发的相同请求合并）"""
+        try:
+            data = self._prepare_first_question(resume_data)
+            key = first_question_key(resume_data, data["model"])
+
+            first_question = self.runtime.first_question_cache.get(key)
+            if first_question is None:
+                first_question = await self.runtime.first_question_flight.do(
+                    key, lambda: self._fetch_first_question(key, data)
+                )
+            return self._finish_first_question(first_question)
+        except Exception as e:
+            return self._first_question_error(resume_data, e)
+
+    async def stream_first_question(self, resume_data):
+        """流式生成第一个面试问题，事件格式与 ChatService.stream_first_question 一致"""
+        data = self._prepare_first_question(resume_data)
+        key = first_question_key(resume_data, data["model"])
+
+        first_question = self.runtime.first_question_cache.get(key)
+        if first_question is None:
+            leader, flight = self.runtime.first_question_flight.begin(key)
+            if not leader:
+                try:
+                    first_question = await self.runtime.first_question_flight.wait(flight)
+                except Exception as e:
+                    yield "done", self._first_question_error(resume_data, e)
+                    return
+
+        if first_question is not None:
+            yield "delta", {"content": first_question}
+            yield "done", self._finish_first_question(first_question)
+            return
+
+        parts = []
+        try:
+            async for kind, value in self._stream_completion(data):
+                if kind == "delta":
+                    parts.append(value)
+                    yield "delta", {"content": value}
+        except BaseException as e:
+            # 客户端断开或任务取消时也要唤醒等待同一结果的请求
+            self.runtime.first_question_flight.resolve(
+                key, flight, error=e if isinstance(e, Exception) else RuntimeError("流式请求已中断")
+            )
+            if not isinstance(e, Exception):
+                raise
+            yield "done", self._first_question_error(resume_data, e)
+            return
+
+        try:
+            first_question = self._check_first_question("".join(parts))
+        except RuntimeError as e:
+            # 空流按失败处理：等待者和领头者都回退到默认问题
+            self.runtime.first_question_flight.resolve(key, flight, error=e)
+            yield "done", self._first_question_error(resume_data, e)
+            return
+
+        self.runtime.first_question_cache.put(key, first_question)
+        self.runtime.first_question_flight.resolve(key, flight, value=first_question)
+        yield "done", self._finish_first_question(first_question)
+
+
+# 异步模式的会话注册表：会话锁使用 asyncio.Lock，等待时不阻塞事件循环
+session_registry = SessionRegistry(
+    functools.partial(AsyncChatService.for_session, chat_runtime),
+    max_sessions=SESSION_MAX_COUNT,
+    ttl_seconds=SESSION_TTL_SECONDS,
+    lock_factory=asyncio.Lock
+)
+
+
+def json_response(payload, status=200):
+    """返回不转义中文的 JSON 响应"""
+    return web.json_response(payload, status=status,
+                             dumps=lambda obj: json.dumps(obj, ensure_ascii=False))
+
+
+def rejected_response(e, session_id=None):
+    """准入被拒时返回 429/503，并通过 Retry-After 告知客户端何时重试"""
+    response = json_response({
+        "success": False,
+        "error": e.reason,
+        "retryAfter": e.retry_after,
+        "sessionId": session_id
+    }, e.status)
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+
+async def read_json(request):
+    """读取 JSON 请求体，格式错误时返回 None"""
+    try:
+        return await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+
+
+def get_session_id(request, data=None):
+    """从请求中读取会话ID：请求头 X-Session-Id > JSON sessionId > 查询参数 sessionId"""
+    session_id = request.headers.get('X-Session-Id')
+    if not session_id and isinstance(data, dict):
+        session_id = data.get('sessionId')
+    if not session_id:
+        session_id = request.query.get('sessionId')
+    if not session_id:
+        return DEFAULT_SESSION_ID
+    session_id = str(session_id).strip()
+    if not is_valid_session_id(session_id):
+        raise ValueError("会话ID格式错误，只允许1-64位字母、数字、下划线或连字符")
+    return session_id
+
+
+def wants_stream(request, data=None):
+    """判断客户端是否请求 SSE 流式响应：JSON stream=true 或 Accept: text/event-stream"""
+    if isinstance(data, dict) and data.get('stream') is True:
+        return True
+    return 'text/event-stream' in request.headers.get('Accept', '')
+
+
+async def run_blocking(fn, *args):
+    """在线程池中执行可能访问磁盘的同步调用（历史存储读写等），不阻塞事件循环"""
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args))
+
+
+async def stream_session_events(request, session_id, produce, build_payload):
+    """在会话锁内消费服务产出的异步事件并以 SSE 推送给客户端
+
+    produce(chat_service) 返回异步事件迭代器，也可以是返回该迭代器的协程函数。
+    准入名额在发送响应头之前申请，被拒时抛出 AdmissionRejected，由路由返回 429/503。
+    """
+    async with admission.slot(session_id):
+        return await _stream_admitted_events(request, session_id, produce, build_payload)
+
+
+async def _stream_admitted_events(request, session_id, produce, build_payload):
+    response = web.StreamResponse(headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+    response.content_type = 'text/event-stream'
+    response.charset = 'utf-8'
+    await response.prepare(request)
+
+    await response.write(format_sse("session", {"sessionId": session_id}).encode("utf-8"))
+    try:
+        async with session_registry.asession(session_id) as chat_service:
+            events = produce(chat_service)
+            if asyncio.iscoroutine(events):
+                events = await events
+            try:
+                async for event, payload in events:
+                    if event == "done":
+                        payload = build_payload(payload, session_id)
+                    await response.write(format_sse(event, payload).encode("utf-8"))
+            finally:
+                await events.aclose()
+    except ConnectionResetError:
+        # 客户端已断开，会话锁和上游连接已随生成器关闭而释放
+        return response
+    except Exception as e:
+        await response.write(format_sse("error", {
+            "success": False,
+            "error": f"服务器内部错误: {str(e)}",
+            "sessionId": session_id
+        }).encode("utf-8"))
+
+    await response.write_eof()
+    return response
+
+
+@web.middleware
+async def cors_middleware(request, handler):
+    """允许跨域请求（与 Flask 版本的 CORS(app) 行为一致）"""
+    if request.method == 'OPTIONS':
+        response = web.Response()
+    else:
+        response = await handler(request)
+    response.headers['Access-Control-Allow-Origin'] = request.headers.get('Origin', '*')
+    response.headers['Access-Control-Allow-Headers'] = request.headers.get(
+        'Access-Control-Request-Headers', 'Content-Type, X-Session-Id')
+    response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
+    return response
+
+
+async def health_check(request):
+    """健康检查接口"""
+    return json_response({
+        "status": "healthy",
+        "service": "DeepSeek Chat API",
+        "mode": "async",
+        "sessions": session_registry.stats(),
+        "upstream": async_spark_client.stats(),
+        "history": history_store.stats(),
+        "first_question_cache": dict(first_question_cache.stats(), **first_question_flight.stats()),
+        "admission": admission.stats(),
+        "timestamp": datetime.now().isoformat()
+    })
+
+
+async def chat(request):
+    """主要对话接口"""
+    try:
+        data = await read_json(request)
+
+        if not data or 'message' not in data:
+            return json_response({
+                "success": False,
+                "error": "请求格式错误，需要包含'message'字段"
+            }, 400)
+
+        user_message = data['message'].strip()
+        if not user_message:
+            return json_response({
+                "success": False,
+                "error": "消息内容不能为空"
+            }, 400)
+
+        try:
+            session_id = get_session_id(request, data)
+        except ValueError as e:
+            return json_response({
+                "success": False,
+                "error": str(e)
+            }, 400)
+
+        model = data.get('model', 'generalv3.5')
+
+        if wants_stream(request, data):
+            return await stream_session_events(
+                request,
+                session_id,
+                lambda chat_service: chat_service.stream_spark_response(user_message, model),
+                lambda result, sid: build_chat_payload(result, sid)[0]
+            )
+
+        async with admission.slot(session_id):
+            async with session_registry.asession(session_id) as chat_service:
+                result = await chat_service.get_spark_response(user_message, model)
+
+        payload, status = build_chat_payload(result, session_id)
+        return json_response(payload, status)
+
+    except AdmissionRejected as e:
+        return rejected_response(e, session_id)
+    except Exception as e:
+        return json_response({
+            "success": False,
+            "error": f"服务器内部错误: {str(e)}",
+            "response": "抱歉，服务器出现了问题，请稍后再试。"
+        }, 500)
+
+
+async def get_chat_history(request):
+    """获取对话历史（按游标分页，cursor 为上一页返回的 nextCursor）"""
+    try:
+        session_id = get_session_id(request)
+        try:
+            limit = min(max(int(request.query.get('limit', 50)), 1), 500)
+        except ValueError:
+            limit = 50
+        try:
+            cursor = int(request.query['cursor']) if 'cursor' in request.query else None
+        except ValueError:
+            cursor = None
+
+        history, next_cursor, total = await run_blocking(
+            functools.partial(history_store.page, session_id, limit=limit, before=cursor)
+        )
+
+        return json_response({
+            "success": True,
+            "history": history,
+            "total": total,
+            "nextCursor": next_cursor,
+            "sessionId": session_id
+        })
+    except ValueError as e:
+        return json_response({
+            "success": False,
+            "error": str(e)
+        }, 400)
+    except Exception as e:
+        return json_response({
+            "success": False,
+            "error": f"获取历史记录失败: {str(e)}"
+        }, 500)
+
+
+async def clear_chat_history(request):
+    """清空对话历史"""
+    try:
+        data = await read_json(request) if request.can_read_body else None
+        session_id = get_session_id(request, data)
+        try:
+            # 持有会话锁清空，避免与同一会话正在处理的请求交错
+            async with session_registry.asession(session_id, create=False) as chat_service:
+                await run_blocking(chat_service.reset_conversation)
+                session_registry.discard(session_id)
+        except KeyError:
+            # 会话不在内存中，只需清空存储
+            await run_blocking(history_store.clear, session_id)
+        return json_response({
+            "success": True,
+            "message": "对话历史已清空",
+            "sessionId": session_id
+        })
+    except ValueError as e:
+        return json_response({
+            "success": False,
+            "error": str(e)
+        }, 400)
+    except Exception as e:
+        return json_response({
+            "success": False,
+            "error": f"清空历史记录失败: {str(e)}"
+        }, 500)
+
+
+async def start_interview(request):
+    """开始面试：提交简历并获取第一个问题"""
+    try:
+        data = await read_json(request)
+
+        if not data or 'resume' not in data:
+            return json_response({
+                "success": False,
+                "error": "请求格式错误，需要包含'resume'字段"
+            }, 400)
+
+        resume_data = data['resume']
+
+        # 验证必要字段
+        required_fields = ['name', 'targetPosition', 'education']
+        for field in required_fields:
+            if not resume_data.get(field):
+                return json_response({
+                    "success": False,
+                    "error": f"简历必填字段缺失: {field}"
+                }, 400)
+
+        try:
+            session_id = get_session_id(request, data)
+        except ValueError as e:
+            return json_response({
+                "success": False,
+                "error": str(e)
+            }, 400)
+
+        print(f"📋 收到简历提交：{resume_data.get('name')} - {resume_data.get('targetPosition')} (会话: {session_id})")
+
+        if wants_stream(request, data):
+            async def produce(chat_service):
+                # 清空之前的对话历史，开始新的面试
+                await run_blocking(chat_service.reset_conversation)
+                return chat_service.stream_first_question(resume_data)
+
+            return await stream_session_events(request, session_id, produce, build_start_payload)
+
+        async with admission.slot(session_id):
+            async with session_registry.asession(session_id) as chat_service:
+                # 清空之前的对话历史，开始新的面试
+                await run_blocking(chat_service.reset_conversation)
+                result = await chat_service.generate_first_question(resume_data)
+
+        return json_response(build_start_payload(result, session_id))
+
+    except AdmissionRejected as e:
+        return rejected_response(e, session_id)
+    except Exception as e:
+        print(f"❌ 面试启动失败: {str(e)}")
+        return json_response({
+            "success": False,
+            "error": f"服务器内部错误: {str(e)}",
+            "firstQuestion": "您好！很高兴见到您。请先简单介绍一下您自己。"
+        }, 500)
+
+
+async def get_available_models(request):
+    """获取可用的模型列表"""
+    return json_response({
+        "success": True,
+        "models": AVAILABLE_MODELS
+    })
+
+
+async def close_upstream(app):
+    """服务退出时关闭上游连接"""
+    await async_spark_client.close()
+
+
+def create_app():
+    """创建 aiohttp 应用"""
+    app = web.Application(middlewares=[cors_middleware])
+    app.router.add_get('/api/health', health_check)
+    app.router.add_post('/api/chat', chat)
+    app.router.add_get('/api/chat/history', get_chat_history)
+    app.router.add_post('/api/chat/clear', clear_chat_history)
+    app.router.add_post('/api/interview/start', start_interview)
+    app.router.add_get('/api/models', get_available_models)
+    app.on_cleanup.append(close_upstream)
+    return app
+
+
+if __name__ == '__main__':
+    port = int(os.getenv("PORT", "5000"))
+    if not SPARK_API_KEY:
+        print("⚠️  警告：未正确配置星火大模型API密钥！请设置环境变量 SPARK_API_KEY")
+    print("🚀 启动DeepSeek聊天API服务（异步模式）...")
+    print(f"📡 API URL: {SPARK_API_URL}")
+    print(f"🔗 上游最大连接数: {SPARK_ASYNC_POOL_SIZE}")
+    print(f"🌐 服务器地址: http://localhost:{port}")
+    print(f"📋 健康检查: http://localhost:{port}/api/health")
+    print("-" * 50)
+
+    web.run_app(create_app(), host='0.0.0.0', port=port)
@@ -0,0 +1,526 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+聊天服务核心 - 同步（app.py）与异步（async_app.py）服务模式共用的会话服务和响应格式
+
+ChatService 只通过 ChatRuntime 访问进程内共享的组件（上游客户端、历史存储、
+上下文窗口、第一个问题缓存等），由各服务模式在启动时创建并注入；
+本模块导入时不创建任何运行时对象。
+"""
+
+import contextlib
+import json
+from datetime import datetime
+
+import requests
+
+from context_builder import (
+    RollingSummary,
+    build_summary_request,
+    extractive_summary,
+    truncate_to_tokens
+)
+from first_question_cache import first_question_key
+from resilience import CircuitOpenError
+
+
+class ChatRuntime:
+    """一个服务进程内所有会话共享的组件"""
+
+    def __init__(self, client, store, context_window, first_question_cache,
+                 first_question_flight, summary_executor=None, admission=None, summary_weight=0.25):
+        """
+        Args:
+            client: 上游客户端（SparkClient 或 AsyncSparkClient）
+            store: 对话历史存储
+            context_window: ContextWindow，按 token 预算构建请求消息
+            first_question_cache: 第一个问题的 TTLCache
+            first_question_flight: 第一个问题的请求合并（SingleFlight 或 AsyncSingleFlight）
+            summary_executor: 运行后台摘要任务的线程池（仅同步模式）
+            admission: 准入控制器，摘要请求也经过它调用上游；为空时直接调用
+            summary_weight: 摘要后台队列在准入控制中的权重
+        """
+        self.client = client
+        self.store = store
+        self.context_window = context_window
+        self.first_question_cache = first_question_cache
+        self.first_question_flight = first_question_flight
+        self.summary_executor = summary_executor
+        self.admission = admission
+        self.summary_weight = summary_weight
+
+
+class ChatService:
+    """单个面试会话的对话服务：提示词构建、对话历史、滚动摘要和上游调用"""
+
+    # 所有会话的摘要请求在准入控制中共用的队列：同时最多占用一个上游名额，
+    # 排队已满或超时时由调用方退化为截取式摘要
+    SUMMARY_FLOW = "__summary__"
+
+    def __init__(self, runtime, session_id=None):
+        self.runtime = runtime
+        # 只保留尚未合并进摘要的消息；完整历史在历史存储中，
+        # history_offset 为 conversation_history[0] 在完整历史中的下标
+        self.conversation_history = []
+        self.history_offset = 0
+        self.resume_data = None
+        self.client = runtime.client
+        self.summary = RollingSummary()
+        # 未绑定会话ID时不做持久化
+        self.session_id = session_id
+        self.store = runtime.store
+    
+    @classmethod
+    def for_session(cls, runtime, session_id):
+        """创建绑定到会话的服务实例，并从历史存储中恢复对话和简历"""
+        service = cls(runtime, session_id=session_id)
+        service.conversation_history = service.store.load(session_id)
+        service.resume_data = service.store.load_resume(session_id)
+        return service
+        
+    def set_resume(self, resume_data):
+        """设置简历数据"""
+        self.resume_data = resume_data
+        if self.session_id:
+            self.store.save_resume(self.session_id, resume_data)
+    
+    def reset_conversation(self):
+        """清空对话历史、简历和摘要，开始新的面试"""
+        self.conversation_history.clear()
+        self.history_offset = 0
+        self.resume_data = None
+        self.summary.reset()
+        if self.session_id:
+            self.store.clear(self.session_id)
+    
+    def add_message(self, role, content):
+        """添加消息到对话历史"""
+        message = {
+            "role": role,
+            "content": content,
+            "timestamp": datetime.now().isoformat()
+        }
+        self.conversation_history.append(message)
+        if self.session_id:
+            self.store.append(self.session_id, message)
+    
+    def generate_interview_prompt(self, resume_data, in_progress=False):
+        """生成面试官的系统提示词
+
+        in_progress 为 True 时表示面试已经开始，结尾改为继续面试的指令，
+        避免每轮都重复开场白。
+        """
+        prompt = f"""你是一位专业的面试官，正在为以下求职者进行面试。请根据他们的简历信息，进行专业、友好的面试对话。
+
+===== 求职者简历信息 =====
+姓名：{resume_data.get('name', '未提供')}
+年龄：{resume_data.get('age', '未提供')}
+期望职位：{resume_data.get('targetPosition', '未提供')}
+期望薪资：{resume_data.get('expectedSalary', '未提供')}
+学历：{resume_data.get('education', '未提供')}
+专业：{resume_data.get('major', '未提供')}
+毕业院校：{resume_data.get('university', '未提供')}
+毕业年份：{resume_data.get('graduationYear', '未提供')}
+工作经验：{resume_data.get('workExperience', '未提供')}
+工作描述：{resume_data.get('workDescription', '未提供')}
+技术技能：{resume_data.get('technicalSkills', '未提供')}
+其他技能：{resume_data.get('otherSkills', '未提供')}
+项目经验：{resume_data.get('projectExperience', '未提供')}
+自我评价：{resume_data.get('selfEvaluation', '未提供')}
+===========================
+
+面试要求：
+1. 作为专业面试官，你需要：
+   - 根据求职者的简历背景，问出有针对性的问题
+   - 保持专业、友好的语调，营造轻松的面试氛围
+   - 循序渐进地了解求职者的能力、经验和职业规划
+   - 适时给出正面反馈，鼓励求职者充分展示自己
+
+2. 面试重点关注：
+   - 与目标职位相关的技能和经验
+   - 求职者的学习能力和适应能力
+   - 项目经验和技术深度
+   - 团队协作和沟通能力
+   - 职业规划和发展目标
+
+3. 面试风格：
+   - 语言简洁清楚，避免过于复杂的表述
+   - 一次只问一个核心问题，给求职者充分表达机会
+   - 根据求职者的回答，进行适当的追问和深入
+   - 保持积极正面的面试体验
+
+请现在开始面试，先给出一个合适的开场白和第一个问题。记住你是面试官，需要引导整个面试过程。"""
+        
+        if in_progress:
+            prompt = prompt.replace(
+                "请现在开始面试，先给出一个合适的开场白和第一个问题。",
+                "面试已经在进行中，请根据之前的对话继续提问，不要重复开场白。"
+            )
+        
+        return prompt
+    
+    def _build_chat_messages(self):
+        """按 token 预算构建请求消息：系统提示词（含简历）+ 滚动摘要 + 最近的对话
+
+        每轮都携带简历信息；滑出窗口的旧消息积累到一定数量后在后台合并进摘要。
+        """
+        system_prompt = None
+        if self.resume_data:
+            system_prompt = self.generate_interview_prompt(self.resume_data, in_progress=True)
+        
+        summary_text, covered = self.summary.snapshot()
+        self._trim_history(covered)
+        context_window = self.runtime.context_window
+        messages, window_start = context_window.build(
+            system_prompt, summary_text, self.conversation_history, start=covered - self.history_offset
+        )
+        window_start += self.history_offset
+        
+        if context_window.pending_fold(covered, window_start):
+            self._schedule_summary(window_start)
+        
+        return messages
+    
+    def _trim_history(self, covered):
+        """丢弃已合并进摘要的消息（在会话锁内调用），服务实例只保留窗口附近的尾部"""
+        dropped = covered - self.history_offset
+        if dropped > 0:
+            del self.conversation_history[:dropped]
+            self.history_offset = covered
+    
+    def _schedule_summary(self, end):
+        """把窗口外尚未摘要的消息交给后台合并（同一会话同时只运行一个任务）"""
+        job = self.summary.try_begin()
+        if job is None:
+            return
+        generation, start, previous = job
+        # 在会话锁内复制待合并的消息，后台任务不再访问对话历史
+        messages = [
+            {"role": msg["role"], "content": msg["content"]}
+            for msg in self.conversation_history[start - self.history_offset:end - self.history_offset]
+            if msg["role"] in ["user", "assistant"]
+        ]
+        self._start_summary_job(generation, previous, messages, end)
+    
+    def _start_summary_job(self, generation, previous, messages, end):
+        """在线程池中运行摘要任务"""
+        self.runtime.summary_executor.submit(self._run_summary, generation, previous, messages, end)
+    
+    def _summary_slot(self):
+        """摘要请求的准入名额，未配置准入控制时不限制（异步模式用 async with）"""
+        if self.runtime.admission is None:
+            return contextlib.nullcontext()
+        return self.runtime.admission.slot(self.SUMMARY_FLOW, weight=self.runtime.summary_weight)
+    
+    def _summarize(self, previous, messages):
+        """调用星火大模型把新消息合并进已有摘要"""
+        data = build_summary_request(previous, messages, self.runtime.context_window.summary_tokens)
+        with self._summary_slot():
+            return self.client.post_json(data)["choices"][0]["message"]["content"]
+    
+    def _run_summary(self, generation, previous, messages, end):
+        """后台摘要任务：大模型失败时退化为截取式摘要"""
+        summary_tokens = self.runtime.context_window.summary_tokens
+        try:
+            text = self._summarize(previous, messages).strip()
+            text = truncate_to_tokens(text, summary_tokens)
+        except Exception as e:
+            print(f"⚠️  对话摘要生成失败，使用截取式摘要: {e}")
+            text = extractive_summary(previous, messages, summary_tokens)
+        self.summary.apply(generation, text, end)
+    
+    def _build_first_question_messages(self, resume_data):
+        """构建生成第一个面试问题的请求消息"""
+        system_prompt = self.generate_interview_prompt(resume_data)
+        return [
+            {
+                "role": "system", 
+                "content": system_prompt
+            },
+            {
+                "role": "user",
+                "content": "请开始面试，给出开场白和第一个问题。"
+            }
+        ]
+    
+    def _default_first_question(self, resume_data):
+        """大模型不可用时的默认第一个问题"""
+        return f"您好 {resume_data.get('name', '求职者')}！很高兴见到您。请先简单介绍一下您自己，包括您的教育背景和工作经验。"
+    
+    # 视为“上游请求失败”的传输层异常（含熔断），其余异常视为处理失败
+    transport_errors = (requests.exceptions.RequestException, CircuitOpenError)
+    
+    def _prepare_chat(self, user_message, model):
+        """记录用户消息并构建对话请求体"""
+        self.add_message("user", user_message)
+        return {
+            "model": model,
+            "messages": self._build_chat_messages(),
+            "temperature": 0.7,
+            "max_tokens": 2048,
+            "stream": False
+        }
+    
+    def _finish_chat(self, ai_message, usage, model):
+        """记录AI回复并构建成功结果"""
+        self.add_message("assistant", ai_message)
+        return {
+            "success": True,
+            "message": ai_message,
+            "usage": usage,
+            "model": model
+        }
+    
+    def _chat_error(self, e):
+        """构建对话失败结果"""
+        if isinstance(e, self.transport_errors):
+            return {
+                "success": False,
+                "error": f"API请求失败: {str(e)}",
+                "message": "抱歉，我现在无法回答您的问题，请稍后再试。"
+            }
+        return {
+            "success": False,
+            "error": f"处理失败: {str(e)}",
+            "message": "抱歉，处理您的请求时出现了错误。"
+        }
+    
+    def _prepare_first_question(self, resume_data):
+        """设置简历数据并构建生成第一个问题的请求体"""
+        self.set_resume(resume_data)
+        return {
+            "model": "generalv3.5",
+            "messages": self._build_first_question_messages(resume_data),
+            "temperature": 0.7,
+            "max_tokens": 1024,
+            "stream": False
+        }
+    
+    def _finish_first_question(self, first_question):
+        """将第一个问题加入对话历史并构建成功结果"""
+        self.add_message("assistant", first_question)
+        return {
+            "success": True,
+            "question": first_question
+        }
+    
+    @staticmethod
+    def _check_first_question(first_question):
+        """空的第一个问题视为上游失败，既不缓存也不共享给合并的请求"""
+        if not first_question or not first_question.strip():
+            raise RuntimeError("星火大模型返回了空的问题")
+        return first_question
+    
+    def _first_question_error(self, resume_data, e):
+        """构建第一个问题生成失败的结果（附带默认问题）"""
+        return {
+            "success": False,
+            "error": f"生成面试问题失败: {str(e)}",
+            "question": self._default_first_question(resume_data)
+        }
+    
+    @staticmethod
+    def _parse_stream_line(line):
+        """解析上游 SSE 流中的一行
+
+        上游使用 SSE 格式：每行 "data: {...}"，以 "data: [DONE]" 结束。
+        返回 None 表示流结束，否则返回 ("delta", 文本) / ("usage", 用量字典) 列表。
+        """
+        line = line.strip()
+        if not line.startswith("data:"):
+            return []
+        payload = line[len("data:"):].strip()
+        if payload == "[DONE]":
+            return None
+        
+        chunk = json.loads(payload)
+        # 星火在流中以非零 code 返回业务错误
+        if chunk.get("code", 0) != 0:
+            raise RuntimeError(f"星火大模型返回错误: {chunk.get('message', chunk.get('code'))}")
+        
+        events = []
+        for choice in chunk.get("choices", []):
+            content = (choice.get("delta") or {}).get("content")
+            if content:
+                events.append(("delta", content))
+        if chunk.get("usage"):
+            events.append(("usage", chunk["usage"]))
+        return events
+    
+    def _stream_completion(self, data):
+        """以流式方式调用星火大模型，逐段产出 ("delta", 文本) 或 ("usage", 用量字典)"""
+        data = dict(data, stream=True)
+        with self.client.open_stream(data) as response:
+            for raw_line in response.iter_lines():
+                if not raw_line:
+                    continue
+                events = self._parse_stream_line(raw_line.decode("utf-8"))
+                if events is None:
+                    break
+                yield from events
+    
+    def get_spark_response(self, user_message, model="generalv3.5"):
+        """调用星火大模型API获取回复"""
+        try:
+            # 添加用户消息到历史并构建请求
+            data = self._prepare_chat(user_message, model)
+            
+            # 调用星火大模型API（失败时按策略重试，慢响应时对冲，上游不可用时熔断）
+            result = self.client.post_json(data)
+            
+            # 提取AI回复并添加到历史
+            ai_message = result["choices"][0]["message"]["content"]
+            return self._finish_chat(ai_message, result.get("usage", {}), model)
+            
+        except Exception as e:
+            return self._chat_error(e)
+    
+    def stream_spark_response(self, user_message, model="generalv3.5"):
+        """流式调用星火大模型API，逐段产出事件
+
+        产出 ("delta", {"content": ...}) 表示增量文本，最后产出一次
+        ("done", 结果字典)，结果字典与 get_spark_response 的返回格式一致。
+        完整回复只在流正常结束后才写入对话历史。
+        """
+        data = self._prepare_chat(user_message, model)
+        
+        parts = []
+        usage = {}
+        try:
+            for kind, value in self._stream_completion(data):
+                if kind == "delta":
+                    parts.append(value)
+                    yield "delta", {"content": value}
+                else:
+                    usage = value
+        except Exception as e:
+            yield "done", self._chat_error(e)
+            return
+        
+        yield "done", self._finish_chat("".join(parts), usage, model)
+    
+    def _fetch_first_question(self, key, data):
+        """向上游请求第一个问题并写入缓存"""
+        result = self.client.post_json(data)
+        first_question = self._check_first_question(result["choices"][0]["message"]["content"])
+        self.runtime.first_question_cache.put(key, first_question)
+        return first_question
+    
+    def generate_first_question(self, resume_data):
+        """根据简历生成第一个面试问题
+
+        相同简历和模型的问题优先从缓存读取；并发的相同请求只调用一次上游。
+        """
+        try:
+            data = self._prepare_first_question(resume_data)
+            key = first_question_key(resume_data, data["model"])
+            
+            first_question = self.runtime.first_question_cache.get(key)
+            if first_question is None:
+                first_question = self.runtime.first_question_flight.do(
+                    key, lambda: self._fetch_first_question(key, data)
+                )
+            
+            # 添加到对话历史
+            return self._finish_first_question(first_question)
+            
+        except Exception as e:
+            return self._first_question_error(resume_data, e)
+    
+    def stream_first_question(self, resume_data):
+        """流式生成第一个面试问题
+
+        产出 ("delta", {"content": ...})，最后产出一次 ("done", 结果字典)，
+        结果字典与 generate_first_question 的返回格式一致。
+        命中缓存或与其他请求合并时，完整问题作为一个 delta 一次性推送。
+        """
+        data = self._prepare_first_question(resume_data)
+        key = first_question_key(resume_data, data["model"])
+        
+        first_question = self.runtime.first_question_cache.get(key)
+        if first_question is None:
+            leader, flight = self.runtime.first_question_flight.begin(key)
+            if not leader:
+                try:
+                    first_question = self.runtime.first_question_flight.wait(flight)
+                except Exception as e:
+                    yield "done", self._first_question_error(resume_data, e)
+                    return
+        
+        if first_question is not None:
+            yield "delta", {"content": first_question}
+            yield "done", self._finish_first_question(first_question)
+            return
+        
+        parts = []
+        try:
+            for kind, value in self._stream_completion(data):
+                if kind == "delta":
+                    parts.append(value)
+                    yield "delta", {"content": value}
+        except BaseException as e:
+            # 客户端断开（GeneratorExit）也要唤醒等待同一结果的请求
+            self.runtime.first_question_flight.resolve(
+                key, flight, error=e if isinstance(e, Exception) else RuntimeError("流式请求已中断")
+            )
+            if not isinstance(e, Exception):
+                raise
+            yield "done", self._first_question_error(resume_data, e)
+            return
+        
+        try:
+            first_question = self._check_first_question("".join(parts))
+        except RuntimeError as e:
+            # 空流按失败处理：等待者和领头者都回退到默认问题
+            self.runtime.first_question_flight.resolve(key, flight, error=e)
+            yield "done", self._first_question_error(resume_data, e)
+            return
+        
+        self.runtime.first_question_cache.put(key, first_question)
+        self.runtime.first_question_flight.resolve(key, flight, value=first_question)
+        yield "done", self._finish_first_question(first_question)
+
+
+def format_sse(event, payload):
+    """格式化一条 SSE 事件"""
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def build_chat_payload(result, session_id):
+    """将 ChatService 的对话结果转换为接口响应，返回 (响应体, 状态码)"""
+    if result["success"]:
+        return {
+            "success": True,
+            "response": result["message"],
+            "model": result["model"],
+            "usage": result.get("usage", {}),
+            "sessionId": session_id,
+            "timestamp": datetime.now().isoformat()
+        }, 200
+    return {
+        "success": False,
+        "error": result["error"],
+        "response": result["message"],
+        "sessionId": session_id
+    }, 500
+
+
+def build_start_payload(result, session_id):
+    """将第一个面试问题的生成结果转换为接口响应"""
+    if result["success"]:
+        return {
+            "success": True,
+            "firstQuestion": result["question"],
+            "message": "简历提交成功，面试已开始",
+            "sessionId": session_id,
+            "timestamp": datetime.now().isoformat()
+        }
+    # 即使API调用失败，也返回默认问题
+    return {
+        "success": True,
+        "firstQuestion": result["question"],
+        "message": "简历提交成功，面试已开始（使用默认问题）",
+        "error": result.get("error"),
+        "sessionId": session_id,
+        "timestamp": datetime.now().isoformat()
+    }
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+聊天服务配置 - 从环境变量（及 .env 文件）读取，同步与异步服务模式共用
+
+只定义常量和工厂函数，导入时不创建客户端、线程池等运行时对象。
+"""
+
+import os
+
+from dotenv import load_dotenv
+
+from resilience import CircuitBreaker, HedgePolicy, Resilience, RetryPolicy
+
+# 加载环境变量
+load_dotenv()
+
+# 星火大模型API配置 - 优先使用环境变量
+SPARK_API_URL = os.getenv("SPARK_API_URL", "https://spark-api-open.xf-yun.com/v1/chat/completions")
+SPARK_API_KEY = os.getenv("SPARK_API_KEY", "")
+SPARK_APP_ID = os.getenv("SPARK_APP_ID", "")
+SPARK_API_SECRET = os.getenv("SPARK_API_SECRET", "")
+
+# 上游连接池配置
+SPARK_POOL_SIZE = int(os.getenv("SPARK_POOL_SIZE", "64"))
+SPARK_CONNECT_TIMEOUT = float(os.getenv("SPARK_CONNECT_TIMEOUT", "5"))
+SPARK_READ_TIMEOUT = float(os.getenv("SPARK_READ_TIMEOUT", "30"))
+
+# 上游容错配置：重试、对冲（SPARK_HEDGE_PERCENTILE<=0 时关闭）和熔断
+SPARK_MAX_RETRIES = int(os.getenv("SPARK_MAX_RETRIES", "2"))
+SPARK_RETRY_BASE_DELAY = float(os.getenv("SPARK_RETRY_BASE_DELAY", "0.2"))
+SPARK_RETRY_MAX_DELAY = float(os.getenv("SPARK_RETRY_MAX_DELAY", "2"))
+SPARK_HEDGE_PERCENTILE = float(os.getenv("SPARK_HEDGE_PERCENTILE", "0.95"))
+SPARK_HEDGE_MIN_DELAY = float(os.getenv("SPARK_HEDGE_MIN_DELAY", "0.5"))
+SPARK_HEDGE_MAX_RATIO = float(os.getenv("SPARK_HEDGE_MAX_RATIO", "0.1"))
+SPARK_BREAKER_THRESHOLD = int(os.getenv("SPARK_BREAKER_THRESHOLD", "5"))
+SPARK_BREAKER_RECOVERY = float(os.getenv("SPARK_BREAKER_RECOVERY", "30"))
+
+# 上下文窗口配置
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+CONTEXT_SUMMARY_TOKENS = int(os.getenv("CONTEXT_SUMMARY_TOKENS", "400"))
+CONTEXT_FOLD_BATCH = int(os.getenv("CONTEXT_FOLD_BATCH", "4"))
+CONTEXT_SUMMARY_WORKERS = int(os.getenv("CONTEXT_SUMMARY_WORKERS", "4"))
+# 摘要请求在准入控制中的权重（所有会话的摘要共用一个低权重的后台队列）
+CONTEXT_SUMMARY_WEIGHT = float(os.getenv("CONTEXT_SUMMARY_WEIGHT", "0.25"))
+
+# 对话历史存储配置：memory（进程内）或 sqlite（持久化，多进程共享）
+HISTORY_BACKEND = os.getenv("HISTORY_BACKEND", "memory")
+HISTORY_DB_PATH = os.getenv("HISTORY_DB_PATH", "chat_history.db")
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "100"))
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "0.5"))
+
+# 第一个问题缓存配置：目录为空时只缓存在内存中
+FIRST_QUESTION_CACHE_SIZE = int(os.getenv("FIRST_QUESTION_CACHE_SIZE", "1024"))
+FIRST_QUESTION_CACHE_TTL = float(os.getenv("FIRST_QUESTION_CACHE_TTL", "3600"))
+FIRST_QUESTION_CACHE_DIR = os.getenv("FIRST_QUESTION_CACHE_DIR", "")
+FIRST_QUESTION_CACHE_DISK_ENTRIES = int(os.getenv("FIRST_QUESTION_CACHE_DISK_ENTRIES", "4096"))
+
+# 会话注册表配置
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "5000"))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+
+# 准入控制配置：同时调用上游的请求数上限、排队上限和排队截止时间
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "32"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "256"))
+ADMISSION_SESSION_QUEUE = int(os.getenv("ADMISSION_SESSION_QUEUE", "4"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+
+# 可用的星火大模型
+AVAILABLE_MODELS = [
+    {
+        "id": "generalv3.5",
+        "name": "星火大模型 3.5",
+        "description": "星火大模型通用版本，适合面试对话"
+    },
+    {
+        "id": "generalv2",
+        "name": "星火大模型 2.0",
+        "description": "星火大模型标准版本"
+    }
+]
+
+
+def create_resilience(max_workers=None):
+    """按环境变量创建上游容错策略（同步与异步客户端各自持有一份）
+
+    线程版对冲线程数默认为准入并发上限的 2 倍：每个获准的请求最多同时占用主请求和对冲请求两个线程
+    """
+    if max_workers is None:
+        max_workers = 2 * ADMISSION_MAX_CONCURRENCY
+    return Resilience(
+        retry=RetryPolicy(
+            max_retries=SPARK_MAX_RETRIES,
+            base_delay=SPARK_RETRY_BASE_DELAY,
+            max_delay=SPARK_RETRY_MAX_DELAY
+        ),
+        hedge=HedgePolicy(
+            percentile=SPARK_HEDGE_PERCENTILE,
+            min_delay=SPARK_HEDGE_MIN_DELAY,
+            max_ratio=SPARK_HEDGE_MAX_RATIO
+        ),
+        breaker=CircuitBreaker(
+            failure_threshold=SPARK_BREAKER_THRESHOLD,
+            recovery_timeout=SPARK_BREAKER_RECOVERY
+        ),
+        max_workers=max_workers
+    )
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对话上下文构建 - 按 token 预算选取最近的对话轮次，并维护滚动摘要
+
+每次请求都会携带系统提示词（简历信息）和此前对话的摘要，剩余预算从
+最新的消息开始向前填充。滑出窗口的旧消息不会每轮重新计算，而是积累到
+一定数量后在后台增量合并进摘要。
+"""
+
+import math
+import re
+import threading
+
+# 中日韩字符、全角标点大致一个字符一个 token
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+# 每条消息的角色、分隔符等固定开销
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_HEADER = "===== 此前面试要点摘要 ====="
+
+
+def estimate_tokens(text):
+    """估算文本的 token 数
+
+    不依赖具体模型的分词器：中文按每字一个 token，其余字符按每 4 个一个 token。
+    对中文为主的面试对话偏保守，足以用于预算控制。
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def message_tokens(message):
+    """估算单条消息的 token 数"""
+    return estimate_tokens(message.get("content", "")) + MESSAGE_OVERHEAD_TOKENS
+
+
+def truncate_to_tokens(text, max_tokens):
+    """把文本截断到不超过 max_tokens（按估算值）"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) + 1 <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low] + "…"
+
+
+def extractive_summary(previous, messages, max_tokens, snippet_chars=60):
+    """不调用大模型的兜底摘要：保留每条消息的开头片段，超出预算时丢弃最旧的内容"""
+    lines = [previous] if previous else []
+    for msg in messages:
+        speaker = "面试官" if msg["role"] == "assistant" else "求职者"
+        content = " ".join(msg["content"].split())
+        if len(content) > snippet_chars:
+            content = content[:snippet_chars] + "…"
+        lines.append(f"{speaker}：{content}")
+
+    text = "\n".join(lines)
+    while estimate_tokens(text) > max_tokens and "\n" in text:
+        text = text.split("\n", 1)[1]
+    return truncate_to_tokens(text, max_tokens)
+
+
+class RollingSummary:
+    """单个会话的滚动摘要状态
+
+    covered 表示对话历史中前多少条消息已经合并进摘要；generation 在
+    会话重置时递增，用于丢弃重置前提交、重置后才完成的后台任务结果。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.text = ""
+        self.covered = 0
+        self.generation = 0
+        self.pending = False
+        self.updates = 0
+
+    def reset(self):
+        with self._lock:
+            self.text = ""
+            self.covered = 0
+            self.generation += 1
+            self.pending = False
+
+    def snapshot(self):
+        """返回一致的 (摘要文本, 已覆盖消息数)"""
+        with self._lock:
+            return self.text, self.covered
+
+    def try_begin(self):
+        """标记开始一次后台合并，已有任务在运行时返回 None"""
+        with self._lock:
+            if self.pending:
+                return None
+            self.pending = True
+            return self.generation, self.covered, self.text
+
+    def apply(self, generation, text, covered):
+        """提交合并结果；会话已重置时丢弃"""
+        with self._lock:
+            if generation != self.generation:
+                return False
+            self.pending = False
+            if covered > self.covered:
+                self.text = text
+                self.covered = covered
+                self.updates += 1
+            return True
+
+
+class ContextWindow:
+    """按 token 预算构建请求消息"""
+
+    def __init__(self, token_budget=6000, summary_tokens=400, fold_batch=4):
+        """
+        Args:
+            token_budget: 请求消息（系统提示词 + 摘要 + 对话）的 token 上限
+            summary_tokens: 摘要的 token 上限
+            fold_batch: 窗口外至少积累多少条未摘要的消息才触发一次后台合并
+        """
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.fold_batch = max(1, fold_batch)
+
+    def build(self, system_prompt, summary_text, history, start=0):
+        """构建请求消息
+
+        Args:
+            system_prompt: 系统提示词，可为空
+            summary_text: 滚动摘要，可为空
+            history: 完整对话历史
+            start: 已合并进摘要的消息数量，窗口不会早于该位置，避免与摘要重复
+
+        Returns:
+            (messages, window_start): window_start 为窗口内第一条消息在
+            history 中的下标，之前的消息需要由摘要覆盖。
+        """
+        system_parts = []
+        if system_prompt:
+            system_parts.append(system_prompt)
+        if summary_text:
+            system_parts.append(f"{SUMMARY_HEADER}\n{summary_text}")
+        system_content = "\n\n".join(system_parts)
+
+        remaining = self.token_budget
+        if system_content:
+            remaining -= estimate_tokens(system_content) + MESSAGE_OVERHEAD_TOKENS
+
+        # 从最新的消息向前填充，至少保留最新一条（单条超出剩余预算时截断）
+        window = []
+        window_start = len(history)
+        for index in range(len(history) - 1, start - 1, -1):
+            msg = history[index]
+            if msg["role"] not in ["user", "assistant"]:
+                window_start = index
+                continue
+            content = msg["content"]
+            cost = message_tokens(msg)
+            if cost > remaining:
+                if window:
+                    break
+                content = truncate_to_tokens(content, max(0, remaining - MESSAGE_OVERHEAD_TOKENS))
+                cost = estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+            remaining -= cost
+            window.append({
+                "role": msg["role"],
+                "content": content
+            })
+            window_start = index
+        window.reverse()
+
+        messages = []
+        if system_content:
+            messages.append({
+                "role": "system",
+                "content": system_content
+            })
+        messages.extend(window)
+        return messages, window_start
+
+    def pending_fold(self, covered, window_start):
+        """窗口外尚未合并进摘要的消息数量是否达到触发阈值"""
+        return window_start - covered >= self.fold_batch
+
+
+def build_summary_request(previous, messages, max_tokens, model="generalv3.5"):
+    """构建增量摘要的大模型请求体"""
+    transcript = "\n".join(
+        f"{'面试官' if msg['role'] == 'assistant' else '求职者'}：{msg['content']}"
+        for msg in messages
+    )
+    prompt = f"""请把下面新增的面试对话合并到已有摘要中，输出更新后的摘要。
+要求：
+1. 保留求职者回答中的关键事实（经历、项目、技术细节、数据）和面试官已问过的问题
+2. 删除寒暄和重复内容，使用简洁的要点
+3. 不超过{max_tokens}字，只输出摘要本身
+
+已有摘要：
+{previous or '（无）'}
+
+新增对话：
+{transcript}"""
+
+    return {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": 0.3,
+        "max_tokens": max_tokens,
+        "stream": False
+    }
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+第一个面试问题的请求合并与结果缓存
+
+- 同一份简历（规范化后）+ 同一模型的并发请求只向上游发起一次调用，
+  其余请求等待并共享结果（single-flight）
+- 生成成功的问题写入有界 TTL 缓存，可选落盘（落盘文件同样有数量上限并定期清理过期文件），
+  重复提交和刷新页面直接命中
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# 参与生成提示词的简历字段，只有这些字段影响第一个问题
+RESUME_FIELDS = [
+    'name', 'age', 'targetPosition', 'expectedSalary', 'education', 'major',
+    'university', 'graduationYear', 'workExperience', 'workDescription',
+    'technicalSkills', 'otherSkills', 'projectExperience', 'selfEvaluation'
+]
+
+
+def first_question_key(resume_data, model):
+    """根据规范化后的简历和模型计算缓存键
+
+    只取参与提示词的字段，去掉首尾空白并合并连续空白，
+    避免表单里无关字段或多余空格导致缓存失效。
+    """
+    normalized = {}
+    for field in RESUME_FIELDS:
+        value = resume_data.get(field)
+        if value is None or value == "":
+            continue
+        normalized[field] = " ".join(str(value).split())
+    payload = json.dumps({"model": model, "resume": normalized}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    """有界 LRU + TTL 缓存，可选按键落盘持久化"""
+
+    def __init__(self, max_entries=1024, ttl_seconds=3600, persist_dir=None,
+                 max_disk_entries=None, sweep_interval=60):
+        """
+        Args:
+            max_entries: 内存中最多保留的条目数
+            ttl_seconds: 条目有效期（秒）
+            persist_dir: 落盘目录，为空时只使用内存
+            max_disk_entries: 落盘文件的最大数量，为空时取 max_entries 的 4 倍
+            sweep_interval: 写入时清理落盘目录的最小间隔（秒）；文件数超过上限时立即清理
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        self.persist_dir = persist_dir or None
+        if self.persist_dir:
+            os.makedirs(self.persist_dir, exist_ok=True)
+        self.max_disk_entries = max(1, int(max_disk_entries or self.max_entries * 4))
+        self.sweep_interval = float(sweep_interval)
+
+        self._lock = threading.Lock()
+        # 落盘清理只允许一个线程执行，其余写入者直接跳过
+        self._sweep_lock = threading.Lock()
+        # 上次清理后的文件数加上之后的写入次数；None 表示还没有清理过
+        self._disk_estimate = None
+        self._last_sweep = 0.0
+        self.disk_removed = 0
+        # key -> (value, expires_at)，expires_at 为 time.time() 时间戳以便跨进程落盘
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.persist_dir, f"{key}.json")
+
+    def _load_from_disk(self, key):
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                record = json.load(f)
+            return record["value"], record["expires_at"]
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _remove_from_disk(self, key):
+        try:
+            os.unlink(self._path(key))
+        except OSError:
+            pass
+
+    def _sweep_disk(self, now):
+        """删除过期的落盘文件，并按写入时间从旧到新删除超出上限的文件
+
+        过期时间按文件修改时间加有效期估算，避免逐个解析文件；
+        读取时仍以文件内记录的过期时间为准。
+        """
+        files = []
+        try:
+            with os.scandir(self.persist_dir) as it:
+                for entry in it:
+                    if not entry.is_file():
+                        continue
+                    try:
+                        mtime = entry.stat().st_mtime
+                    except OSError:
+                        continue
+                    if entry.name.endswith(".json"):
+                        files.append((mtime, entry.path))
+                    elif entry.name.endswith(".tmp") and mtime + self.sweep_interval < now:
+                        # 写入中途失败残留的临时文件
+                        files.append((0.0, entry.path))
+        except OSError as e:
+            print(f"⚠️  第一个问题缓存清理失败: {e}")
+            return
+
+        files.sort()
+        expired = [path for mtime, path in files if mtime + self.ttl_seconds <= now]
+        alive = len(files) - len(expired)
+        overflow = [path for _, path in files[len(expired):len(expired) + max(0, alive - self.max_disk_entries)]]
+        removed = 0
+        for path in expired + overflow:
+            try:
+                os.unlink(path)
+                removed += 1
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_estimate = alive - len(overflow)
+            self._last_sweep = now
+            self.disk_removed += removed
+
+    def _maybe_sweep_disk(self):
+        now = time.time()
+        with self._lock:
+            self._disk_estimate = None if self._disk_estimate is None else self._disk_estimate + 1
+            due = (self._disk_estimate is None
+                   or self._disk_estimate > self.max_disk_entries
+                   or now - self._last_sweep >= self.sweep_interval)
+        if due and self._sweep_lock.acquire(blocking=False):
+            try:
+                self._sweep_disk(now)
+            finally:
+                self._sweep_lock.release()
+
+    def get(self, key):
+        """读取缓存，未命中或已过期时返回 None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+
+        if self.persist_dir:
+            entry = self._load_from_disk(key)
+            if entry is not None:
+                if entry[1] > now:
+                    with self._lock:
+                        self._store_locked(key, entry)
+                        self.hits += 1
+                    return entry[0]
+                self._remove_from_disk(key)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _store_locked(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def put(self, key, value):
+        """写入缓存"""
+        entry = (value, time.time() + self.ttl_seconds)
+        with self._lock:
+            self._store_locked(key, entry)
+
+        if self.persist_dir:
+            # 先写临时文件再原子替换，避免并发读到半个文件
+            path = self._path(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"value": value, "expires_at": entry[1]}, f, ensure_ascii=False)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"⚠️  第一个问题缓存落盘失败: {e}")
+            self._maybe_sweep_disk()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "persistent": self.persist_dir is not None,
+                "max_disk_entries": self.max_disk_entries if self.persist_dir else None,
+                "disk_removed": self.disk_removed,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+class _Flight:
+    """一次正在进行的上游调用"""
+
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self, done):
+        self.done = done
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """线程版请求合并：同一个键同时只有一个调用在执行"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.coalesced = 0
+
+    def begin(self, key):
+        """登记调用，返回 (是否为领头者, flight)
+
+        领头者负责执行调用并通过 resolve() 发布结果；
+        其他调用者通过 wait() 等待同一个结果。
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return False, flight
+            flight = _Flight(threading.Event())
+            self._flights[key] = flight
+            return True, flight
+
+    def resolve(self, key, flight, value=None, error=None):
+        """发布调用结果并唤醒所有等待者"""
+        flight.value = value
+        flight.error = error
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.done.set()
+
+    def wait(self, flight, timeout=None):
+        """等待领头者的结果，失败时抛出领头者的异常"""
+        if not flight.done.wait(timeout):
+            raise TimeoutError("等待合并请求的结果超时")
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def do(self, key, fn, timeout=None):
+        """执行 fn()，并发的相同键请求共享同一次调用的结果"""
+        leader, flight = self.begin(key)
+        if not leader:
+            return self.wait(flight, timeout)
+        try:
+            value = fn()
+        except BaseException as e:
+            self.resolve(key, flight, error=e if isinstance(e, Exception) else RuntimeError("合并请求被中断"))
+            raise
+        self.resolve(key, flight, value=value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "coalesced": self.coalesced
+            }
+
+
+class AsyncSingleFlight(SingleFlight):
+    """协程版请求合并，只能在同一个事件循环内使用"""
+
+    def begin(self, key):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return False, flight
+            flight = _Flight(asyncio.Event())
+            self._flights[key] = flight
+            return True, flight
+
+    async def wait(self, flight, timeout=None):
+        try:
+            await asyncio.wait_for(flight.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError("等待合并请求的结果超时")
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    async def do(self, key, fn, timeout=None):
+        """执行协程函数 fn()，并发的相同键请求共享同一次调用的结果"""
+        leader, flight = self.begin(key)
+        if not leader:
+            return await self.wait(flight, timeout)
+        try:
+            value = await fn()
+        except BaseException as e:
+            self.resolve(key, flight, error=e if isinstance(e, Exception) else RuntimeError("合并请求被中断"))
+            raise
+        self.resolve(key, flight, value=value)
+        return value
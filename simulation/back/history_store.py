@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对话历史存储 - 可插拔的会话历史后端
+
+- MemoryHistoryStore: 进程内存储，按会话数量做 LRU 淘汰，重启后丢失
+- SQLiteHistoryStore: SQLite（WAL 模式）持久化存储，写入先进入队列，
+  由后台线程批量提交（write-behind）；读取时合并已提交的行和本进程尚未提交的写入，
+  不等待后台线程
+
+每条消息都有一个单调递增的 id，/api/chat/history 以 id 作为分页游标。
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class HistoryStore:
+    """对话历史存储接口"""
+
+    def append(self, session_id, message):
+        """追加一条消息（message 包含 role、content、timestamp）"""
+        raise NotImplementedError
+
+    def load(self, session_id):
+        """按时间顺序返回会话的全部消息"""
+        raise NotImplementedError
+
+    def page(self, session_id, limit=50, before=None):
+        """分页读取会话历史
+
+        Args:
+            limit: 每页最多返回的消息数
+            before: 游标，只返回 id 小于该值的消息；为空时从最新的消息开始
+
+        Returns:
+            (messages, next_cursor, total): messages 按时间顺序排列，
+            next_cursor 为读取更早一页时使用的游标，没有更早的消息时为 None
+        """
+        raise NotImplementedError
+
+    def save_resume(self, session_id, resume_data):
+        """保存会话的简历数据"""
+        raise NotImplementedError
+
+    def load_resume(self, session_id):
+        """读取会话的简历数据，不存在时返回 None"""
+        raise NotImplementedError
+
+    def clear(self, session_id):
+        """删除会话的全部历史和简历"""
+        raise NotImplementedError
+
+    def flush(self):
+        """确保此前的写入都已提交"""
+
+    def close(self):
+        """释放资源"""
+
+    def stats(self):
+        """存储统计信息"""
+        return {}
+
+
+class MemoryHistoryStore(HistoryStore):
+    """进程内历史存储，会话数超过上限时淘汰最久未写入的会话"""
+
+    def __init__(self, max_sessions=5000):
+        self.max_sessions = max(1, int(max_sessions))
+        self._lock = threading.Lock()
+        # session_id -> {"messages": [(id, message), ...], "resume": dict}
+        self._sessions = OrderedDict()
+        self._next_id = 1
+
+    def _touch_locked(self, session_id):
+        state = self._sessions.get(session_id)
+        if state is None:
+            state = {"messages": [], "resume": None}
+            self._sessions[session_id] = state
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        return state
+
+    def append(self, session_id, message):
+        with self._lock:
+            state = self._touch_locked(session_id)
+            state["messages"].append((self._next_id, message))
+            self._next_id += 1
+
+    def load(self, session_id):
+        with self._lock:
+            state = self._sessions.get(session_id)
+            return [dict(message) for _, message in state["messages"]] if state else []
+
+    def page(self, session_id, limit=50, before=None):
+        with self._lock:
+            state = self._sessions.get(session_id)
+            items = state["messages"] if state else []
+            total = len(items)
+
+            end = total
+            if before is not None:
+                # id 单调递增，二分查找游标位置
+                low, high = 0, total
+                while low < high:
+                    mid = (low + high) // 2
+                    if items[mid][0] < before:
+                        low = mid + 1
+                    else:
+                        high = mid
+                end = low
+            start = max(0, end - limit)
+            page = [dict(message, id=message_id) for message_id, message in items[start:end]]
+
+        next_cursor = page[0]["id"] if page and start > 0 else None
+        return page, next_cursor, total
+
+    def save_resume(self, session_id, resume_data):
+        with self._lock:
+            self._touch_locked(session_id)["resume"] = resume_data
+
+    def load_resume(self, session_id):
+        with self._lock:
+            state = self._sessions.get(session_id)
+            return state["resume"] if state else None
+
+    def clear(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions
+            }
+
+
+class SQLiteHistoryStore(HistoryStore):
+    """SQLite 历史存储（WAL 模式 + 批量 write-behind）
+
+    多个工作进程可以共享同一个数据库文件：WAL 模式下读写互不阻塞，
+    每个进程只有一个后台写线程，写入按批次在单个事务中提交。
+
+    尚未提交的写入按会话记录在内存中，读取时叠加在已提交的行之上；
+    后台线程提交事务和移除对应记录在同一把锁内完成，并递增提交计数。读取只在锁内
+    取待写快照，查询数据库时不持有锁，查询期间有过提交则重新读取，不会重复或遗漏。
+    尚未提交的消息没有 id（page() 中为 None），总是出现在第一页；超过一页时
+    page() 先等待后台线程提交，再按 id 分页。
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            timestamp TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id);
+        CREATE TABLE IF NOT EXISTS sessions (
+            session_id TEXT PRIMARY KEY,
+            resume TEXT
+        );
+    """
+
+    def __init__(self, path="chat_history.db", batch_size=100, flush_interval=0.5):
+        """
+        Args:
+            path: 数据库文件路径
+            batch_size: 单个事务最多提交的写操作数
+            flush_interval: 后台线程最长等待多少秒提交一次
+        """
+        self.path = path
+        self.batch_size = max(1, int(batch_size))
+        self.flush_interval = flush_interval
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(self._SCHEMA)
+        conn.close()
+
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._closed = False
+        # session_id -> deque[(kind, args)]：已提交到队列、尚未写入数据库的操作
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        # 每次提交（或丢弃）一批操作时递增，读取据此判断快照是否仍然有效
+        self._generation = 0
+
+        self._written = 0
+        self._batches = 0
+        self._errors = 0
+
+        self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    def _reader(self):
+        """每个线程使用独立的只读连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+        return conn
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            op = self._queue.get()
+            if op is None:
+                break
+
+            batch = [op]
+            waiters = []
+            # 尽量凑满一个批次，最多等待 flush_interval 秒；遇到刷新请求或关闭信号立即提交
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and not isinstance(batch[-1], threading.Event) and batch[-1] is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            stop = None in batch
+            ops = []
+            for item in batch:
+                if item is None:
+                    continue
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    ops.append(item)
+
+            if ops:
+                try:
+                    for kind, args in ops:
+                        if kind == "append":
+                            conn.execute(
+                                "INSERT INTO messages (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+                                args
+                            )
+                        elif kind == "resume":
+                            conn.execute(
+                                "INSERT INTO sessions (session_id, resume) VALUES (?, ?) "
+                                "ON CONFLICT(session_id) DO UPDATE SET resume = excluded.resume",
+                                args
+                            )
+                        elif kind == "clear":
+                            conn.execute("DELETE FROM messages WHERE session_id = ?", args)
+                            conn.execute("DELETE FROM sessions WHERE session_id = ?", args)
+                    # 提交与移除内存中的待写记录必须原子完成，读取方才不会看到重复或缺失的消息
+                    with self._pending_lock:
+                        conn.commit()
+                        self._forget_locked(ops)
+                        self._generation += 1
+                    self._written += len(ops)
+                    self._batches += 1
+                except sqlite3.Error as e:
+                    conn.rollback()
+                    with self._pending_lock:
+                        self._forget_locked(ops)
+                        self._generation += 1
+                    self._errors += 1
+                    print(f"⚠️  对话历史写入失败（丢弃 {len(ops)} 条操作）: {e}")
+
+            for event in waiters:
+                event.set()
+            if stop:
+                break
+        conn.close()
+
+    def _submit(self, kind, args):
+        if self._closed:
+            raise RuntimeError("历史存储已关闭")
+        op = (kind, args)
+        with self._pending_lock:
+            self._pending.setdefault(args[0], deque()).append(op)
+            self._queue.put(op)
+
+    def _forget_locked(self, ops):
+        """移除已写入（或已丢弃）的操作（调用方需持有 _pending_lock）"""
+        for _, args in ops:
+            pending = self._pending.get(args[0])
+            if pending:
+                pending.popleft()
+                if not pending:
+                    del self._pending[args[0]]
+
+    def _read(self, session_id, query, attempts=3):
+        """执行只读查询，结果与待写快照一致
+
+        query 接收 (只读连接, 待写视图)，待写视图见 _pending_view()。只在锁内取快照，
+        查询数据库时不持有锁；查询期间后台线程提交过事务时快照可能与数据库重复，
+        重新读取，连续 attempts 次都有提交时在锁内查询。
+        """
+        for _ in range(attempts):
+            with self._pending_lock:
+                generation = self._generation
+                view = self._pending_view(self._pending.get(session_id, ()))
+            result = query(self._reader(), view)
+            with self._pending_lock:
+                if self._generation == generation:
+                    return result
+        with self._pending_lock:
+            view = self._pending_view(self._pending.get(session_id, ()))
+            return query(self._reader(), view)
+
+    @staticmethod
+    def _pending_view(pending):
+        """把待写操作归纳为 (是否已清空, 待追加的消息, 最新简历)
+
+        已清空表示队列中有 clear 操作，数据库中已提交的历史和简历都应视为不存在；
+        最新简历为 None 表示待写操作没有改动简历。
+        """
+        cleared = False
+        messages = []
+        resume = None
+        for kind, args in pending:
+            if kind == "clear":
+                cleared = True
+                messages = []
+                resume = None
+            elif kind == "append":
+                _, role, content, timestamp = args
+                messages.append({"role": role, "content": content, "timestamp": timestamp})
+            elif kind == "resume":
+                resume = args[1]
+        return cleared, messages, resume
+
+    def append(self, session_id, message):
+        self._submit("append", (session_id, message["role"], message["content"], message["timestamp"]))
+
+    def save_resume(self, session_id, resume_data):
+        self._submit("resume", (session_id, json.dumps(resume_data, ensure_ascii=False)))
+
+    def clear(self, session_id):
+        self._submit("clear", (session_id,))
+
+    def flush(self, timeout=None):
+        if self._closed:
+            return
+        event = threading.Event()
+        self._queue.put(event)
+        event.wait(timeout)
+
+    def load(self, session_id):
+        def query(conn, view):
+            cleared, unwritten, _ = view
+            if cleared:
+                return unwritten
+            rows = conn.execute(
+                "SELECT role, content, timestamp FROM messages WHERE session_id = ? ORDER BY id",
+                (session_id,)
+            ).fetchall()
+            return [
+                {"role": role, "content": content, "timestamp": timestamp} for role, content, timestamp in rows
+            ] + unwritten
+
+        return self._read(session_id, query)
+
+    def page(self, session_id, limit=50, before=None):
+        waited = False
+
+        def query(conn, view):
+            cleared, unwritten, _ = view
+            pending_total = len(unwritten)
+            if before is not None:
+                # 游标只指向已提交的消息，未提交的消息只出现在第一页
+                unwritten = []
+            elif pending_total > limit and not waited:
+                return None
+            unwritten = unwritten[-limit:]
+            committed_limit = max(0, limit - len(unwritten))
+            if cleared:
+                return [], pending_total, unwritten, committed_limit
+
+            total = conn.execute("SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)).fetchone()[0]
+            # 多取一条用来判断是否还有更早的消息
+            if before is None:
+                rows = conn.execute(
+                    "SELECT id, role, content, timestamp FROM messages WHERE session_id = ? "
+                    "ORDER BY id DESC LIMIT ?",
+                    (session_id, committed_limit + 1)
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT id, role, content, timestamp FROM messages WHERE session_id = ? AND id < ? "
+                    "ORDER BY id DESC LIMIT ?",
+                    (session_id, before, committed_limit + 1)
+                ).fetchall()
+            return rows, total + pending_total, unwritten, committed_limit
+
+        result = self._read(session_id, query)
+        if result is None:
+            # 未提交的消息超过一页：先等后台线程提交，让它们获得 id 和游标；
+            # 等待期间又有新的写入超过一页时只返回最新的一页
+            self.flush()
+            waited = True
+            result = self._read(session_id, query)
+        rows, total, unwritten, committed_limit = result
+        has_more = len(rows) > committed_limit
+        newest_id = rows[0][0] if rows else None
+        rows = rows[:committed_limit]
+        rows.reverse()
+        page = [
+            {"id": message_id, "role": role, "content": content, "timestamp": timestamp}
+            for message_id, role, content, timestamp in rows
+        ]
+        if page:
+            next_cursor = page[0]["id"] if has_more else None
+        else:
+            # 第一页只有未提交的消息时，游标从最新一条已提交的消息开始
+            next_cursor = newest_id + 1 if has_more else None
+        page.extend(dict(message, id=None) for message in unwritten)
+        return page, next_cursor, total
+
+    def load_resume(self, session_id):
+        def query(conn, view):
+            cleared, _, resume = view
+            if resume is None and not cleared:
+                row = conn.execute(
+                    "SELECT resume FROM sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                resume = row[0] if row else None
+            return resume
+
+        resume = self._read(session_id, query)
+        return json.loads(resume) if resume else None
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+
+    def stats(self):
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "pending_writes": self._queue.qsize(),
+            "written": self._written,
+            "batches": self._batches,
+            "errors": self._errors
+        }
+
+
+def create_history_store(backend="memory", **options):
+    """按名称创建历史存储
+
+    Args:
+        backend: "memory" 或 "sqlite"
+        options: memory 支持 max_sessions；sqlite 支持 path、batch_size、flush_interval
+    """
+    if backend == "memory":
+        return MemoryHistoryStore(max_sessions=options.get("max_sessions", 5000))
+    if backend == "sqlite":
+        return SQLiteHistoryStore(
+            path=options.get("path", "chat_history.db"),
+            batch_size=options.get("batch_size", 100),
+            flush_interval=options.get("flush_interval", 0.5)
+        )
+    raise ValueError(f"不支持的历史存储后端: {backend}")
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+聊天后端压测脚本 - 并发模拟多场面试，统计吞吐量与延迟分位数
+
+每场模拟面试使用独立的会话ID：先调用 /api/interview/start 提交简历，
+再进行若干轮 /api/chat 对话。支持 JSON 和 SSE 流式两种模式，流式模式
+额外统计首个增量到达的时间。
+
+配合 mock_spark_server.py 可以在没有网络的环境下得到可重复的容量数据:
+    python mock_spark_server.py --port 18080 &
+    SPARK_API_URL=http://127.0.0.1:18080/v1/chat/completions python app.py &
+    python load_test.py --interviews 200 --concurrency 50 --turns 4
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import Counter, defaultdict
+
+import aiohttp
+
+POSITIONS = ["前端开发工程师", "后端开发工程师", "算法工程师", "测试工程师", "产品经理"]
+EDUCATIONS = ["本科", "硕士", "博士"]
+ANSWERS = [
+    "我在上一家公司主要负责订单系统的重构，把单体服务拆成了几个独立的模块。",
+    "遇到分歧时我会先把双方的方案和数据摆出来，再一起评估风险和成本。",
+    "我会先用监控和火焰图定位瓶颈，再针对热点做缓存和批量化处理。",
+    "未来三年我希望在技术深度上继续积累，同时承担更多的架构设计工作。",
+    "这个项目最大的难点是数据一致性，我们最后采用了消息队列加补偿任务的方案。"
+]
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+class Recorder:
+    """按接口汇总延迟、状态码和失败次数"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.first_event = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.failures = Counter()
+
+    def record(self, endpoint, status, seconds, ok, first_event=None):
+        self.statuses[endpoint][status] += 1
+        if ok:
+            self.latencies[endpoint].append(seconds)
+            if first_event is not None:
+                self.first_event[endpoint].append(first_event)
+        else:
+            self.failures[endpoint] += 1
+
+    def summary(self, elapsed):
+        endpoints = {}
+        for endpoint in sorted(self.statuses):
+            latencies = sorted(self.latencies[endpoint])
+            total = sum(self.statuses[endpoint].values())
+            item = {
+                "requests": total,
+                "failures": self.failures[endpoint],
+                "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+                "statuses": {str(k): v for k, v in sorted(self.statuses[endpoint].items(), key=lambda kv: str(kv[0]))},
+                "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+                "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+                "max_ms": round(latencies[-1] * 1000, 1) if latencies else 0.0
+            }
+            first = sorted(self.first_event[endpoint])
+            if first:
+                item["first_delta_p50_ms"] = round(percentile(first, 0.50) * 1000, 1)
+                item["first_delta_p95_ms"] = round(percentile(first, 0.95) * 1000, 1)
+                item["first_delta_p99_ms"] = round(percentile(first, 0.99) * 1000, 1)
+            endpoints[endpoint] = item
+        return endpoints
+
+
+def make_resume(index, same_resume):
+    """生成模拟简历；same_resume 时所有面试使用同一份简历（用于验证第一个问题缓存）"""
+    seed = 0 if same_resume else index
+    rng = random.Random(seed)
+    return {
+        "name": f"候选人{seed}",
+        "age": str(rng.randint(22, 35)),
+        "targetPosition": rng.choice(POSITIONS),
+        "education": rng.choice(EDUCATIONS),
+        "major": "计算机科学与技术",
+        "workExperience": f"{rng.randint(0, 10)}年",
+        "technicalSkills": "Python, JavaScript, SQL",
+        "projectExperience": f"参与过{rng.randint(1, 6)}个中大型项目"
+    }
+
+
+async def post_json(http, url, body, session_id):
+    async with http.post(url, json=body, headers={"X-Session-Id": session_id}) as response:
+        payload = await response.json(content_type=None)
+        return response.status, payload
+
+
+async def post_stream(http, url, body, session_id):
+    """读取 SSE 响应，返回 (状态码, done 事件数据, 首个 delta 到达时间)"""
+    start = time.monotonic()
+    first_delta = None
+    done = None
+    event = None
+    headers = {"X-Session-Id": session_id, "Accept": "text/event-stream"}
+    async with http.post(url, json=dict(body, stream=True), headers=headers) as response:
+        if response.status != 200:
+            await response.read()
+            return response.status, None, None
+        async for raw_line in response.content:
+            line = raw_line.decode("utf-8").strip()
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                if event == "delta" and first_delta is None:
+                    first_delta = time.monotonic() - start
+                elif event in ("done", "error"):
+                    done = json.loads(line[len("data:"):].strip())
+        return response.status, done, first_delta
+
+
+async def timed_call(http, recorder, args, endpoint, body, session_id):
+    url = f"{args.base_url}{endpoint}"
+    start = time.monotonic()
+    try:
+        if args.stream:
+            status, payload, first_delta = await post_stream(http, url, body, session_id)
+        else:
+            status, payload = await post_json(http, url, body, session_id)
+            first_delta = None
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        recorder.record(endpoint, type(e).__name__, time.monotonic() - start, False)
+        return False
+    elapsed = time.monotonic() - start
+
+    ok = status == 200 and isinstance(payload, dict) and payload.get("success") is True
+    # 使用默认问题的降级结果也算失败，便于观察上游故障的影响
+    if ok and endpoint == "/api/interview/start" and payload.get("error"):
+        ok = False
+    recorder.record(endpoint, status, elapsed, ok, first_delta)
+    return ok
+
+
+async def run_interview(http, recorder, args, index):
+    session_id = f"load-{uuid.uuid4().hex[:16]}"
+    body = {"resume": make_resume(index, args.same_resume)}
+    if not await timed_call(http, recorder, args, "/api/interview/start", body, session_id) and args.stop_on_error:
+        return
+    for turn in range(args.turns):
+        if args.think_time > 0:
+            await asyncio.sleep(random.uniform(0, 2 * args.think_time))
+        body = {"message": f"{ANSWERS[(index + turn) % len(ANSWERS)]}（第{turn + 1}轮）"}
+        if not await timed_call(http, recorder, args, "/api/chat", body, session_id) and args.stop_on_error:
+            return
+
+
+async def run(args):
+    recorder = Recorder()
+    queue = asyncio.Queue()
+    for index in range(args.interviews):
+        queue.put_nowait(index)
+
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as http:
+        async def worker():
+            while True:
+                try:
+                    index = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await run_interview(http, recorder, args, index)
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.monotonic() - started
+
+        health = None
+        try:
+            async with http.get(f"{args.base_url}/api/health") as response:
+                health = await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            pass
+
+    return {
+        "config": {
+            "base_url": args.base_url,
+            "interviews": args.interviews,
+            "concurrency": args.concurrency,
+            "turns": args.turns,
+            "stream": args.stream,
+            "same_resume": args.same_resume
+        },
+        "elapsed_seconds": round(elapsed, 2),
+        "interviews_per_second": round(args.interviews / elapsed, 2) if elapsed else 0.0,
+        "requests_per_second": round(sum(sum(c.values()) for c in recorder.statuses.values()) / elapsed, 2) if elapsed else 0.0,
+        "endpoints": recorder.summary(elapsed),
+        "server": {key: health[key] for key in ("admission", "upstream", "first_question_cache") if health and key in health}
+    }
+
+
+def print_report(report):
+    print("=" * 60)
+    print(f"📊 压测结果（{report['config']['interviews']} 场面试，并发 {report['config']['concurrency']}，"
+          f"每场 {report['config']['turns']} 轮，{'流式' if report['config']['stream'] else 'JSON'}）")
+    print("=" * 60)
+    print(f"⏱️  总耗时: {report['elapsed_seconds']}s")
+    print(f"🚀 吞吐量: {report['requests_per_second']} 请求/秒，{report['interviews_per_second']} 场面试/秒")
+    for endpoint, item in report["endpoints"].items():
+        print(f"\n📍 {endpoint}")
+        print(f"   请求数 {item['requests']}，失败 {item['failures']}，状态码 {item['statuses']}")
+        print(f"   延迟 p50 {item['p50_ms']}ms / p95 {item['p95_ms']}ms / p99 {item['p99_ms']}ms / max {item['max_ms']}ms")
+        if "first_delta_p50_ms" in item:
+            print(f"   首个增量 p50 {item['first_delta_p50_ms']}ms / p95 {item['first_delta_p95_ms']}ms"
+                  f" / p99 {item['first_delta_p99_ms']}ms")
+
+    admission = report["server"].get("admission")
+    if admission:
+        print(f"\n🚦 准入控制: 放行 {admission['admitted']}，拒绝 {admission['rejected']}，"
+              f"排队等待 p99 {admission['wait_p99_ms']}ms")
+    resilience = (report["server"].get("upstream") or {}).get("resilience")
+    if resilience:
+        print(f"🛡️  上游容错: 重试 {resilience['retries']}，对冲 {resilience['hedges']}（胜出 {resilience['hedge_wins']}），"
+              f"熔断器 {resilience.get('breaker', {}).get('state')}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="聊天后端并发压测")
+    parser.add_argument("--base-url", default="http://localhost:5000", help="后端地址")
+    parser.add_argument("--interviews", type=int, default=100, help="模拟面试场数")
+    parser.add_argument("--concurrency", type=int, default=20, help="同时进行的面试场数")
+    parser.add_argument("--turns", type=int, default=3, help="每场面试的对话轮数")
+    parser.add_argument("--think-time", type=float, default=0.0, help="每轮回答前的平均思考时间（秒）")
+    parser.add_argument("--stream", action="store_true", help="使用 SSE 流式接口")
+    parser.add_argument("--same-resume", action="store_true", help="所有面试使用同一份简历")
+    parser.add_argument("--stop-on-error", action="store_true", help="请求失败时结束该场面试")
+    parser.add_argument("--timeout", type=float, default=120.0, help="单个请求的超时时间（秒）")
+    parser.add_argument("--json-out", default=None, help="把结果写入 JSON 文件")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    print(f"🧪 开始压测 {args.base_url} ...")
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 结果已保存到 {args.json_out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+星火大模型模拟服务 - 本地替代 chat-completions 接口，用于离线开发和压测
+
+兼容星火的 OpenAI 风格接口：
+- stream=false 返回 {"choices": [{"message": {...}}], "usage": {...}}
+- stream=true 以 SSE 逐段返回 "data: {...}"，以 "data: [DONE]" 结束，
+  业务错误以非零 code 的数据块返回
+
+可配置响应延迟分布、错误率、限流和流式输出速度，统计信息见 GET /stats。
+
+启动方式:
+    python mock_spark_server.py --port 18080 --latency lognormal:0.8,0.5 --error-rate 0.02
+
+后端指向模拟服务:
+    SPARK_API_URL=http://127.0.0.1:18080/v1/chat/completions python app.py
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+
+from aiohttp import web
+
+# 模拟回复的素材，按请求内容挑选，保证同一请求的回复稳定
+REPLY_TEMPLATES = [
+    "谢谢您的回答。能否具体说说您在这个项目中负责的部分，以及遇到的最大技术难点是什么？",
+    "很好。请您谈谈在团队协作中遇到分歧时，您通常是如何处理的？",
+    "明白了。如果让您重新设计这个系统，您会在哪些方面做出改进？",
+    "您提到了性能优化，可以举一个具体的例子说明您是如何定位和解决瓶颈的吗？",
+    "非常感谢。最后想了解一下，您未来三到五年的职业规划是怎样的？"
+]
+
+
+def parse_distribution(spec):
+    """解析延迟分布描述，返回无参的采样函数（单位秒）
+
+    支持:
+        fixed:0.5              固定值
+        uniform:0.2,1.0        均匀分布
+        normal:0.8,0.2         正态分布（均值, 标准差），截断到 0 以上
+        lognormal:0.8,0.5      对数正态分布（中位数, sigma），长尾
+        exponential:0.8        指数分布（均值）
+    """
+    name, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()] if args else []
+    if name == "fixed":
+        return lambda: values[0]
+    if name == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if name == "normal":
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if name == "lognormal":
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1])
+    if name == "exponential":
+        return lambda: random.expovariate(1.0 / values[0])
+    raise ValueError(f"不支持的延迟分布: {spec}")
+
+
+class MockSpark:
+    """模拟服务的配置与统计"""
+
+    def __init__(self, args):
+        self.latency = parse_distribution(args.latency)
+        self.args = args
+        self.in_flight = 0
+        self.stats = {
+            "requests": 0,
+            "stream_requests": 0,
+            "ok": 0,
+            "errors_500": 0,
+            "errors_503": 0,
+            "rate_limited": 0,
+            "stream_errors": 0,
+            "hangs": 0,
+            "max_in_flight": 0
+        }
+        self.started_at = time.time()
+
+    def reply_for(self, messages):
+        """根据最后一条用户消息生成稳定的模拟回复"""
+        last = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        text = REPLY_TEMPLATES[sum(map(ord, last)) % len(REPLY_TEMPLATES)]
+        # 按需要的长度重复补齐，模拟长回复
+        while len(text) < self.args.reply_chars:
+            text += text
+        return text[:self.args.reply_chars]
+
+    @staticmethod
+    def usage(messages, reply):
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(reply),
+            "total_tokens": prompt_tokens + len(reply)
+        }
+
+
+def error_response(status, message):
+    return web.json_response({"error": {"message": message, "code": status}}, status=status)
+
+
+async def chat_completions(request):
+    mock = request.app["mock"]
+    args = mock.args
+    body = await request.json()
+    messages = body.get("messages", [])
+    stream = bool(body.get("stream"))
+
+    mock.stats["requests"] += 1
+    if stream:
+        mock.stats["stream_requests"] += 1
+
+    # 模拟上游配额：同时处理的请求超过上限时返回 429
+    if args.max_concurrency and mock.in_flight >= args.max_concurrency:
+        mock.stats["rate_limited"] += 1
+        return error_response(429, "请求过于频繁")
+
+    mock.in_flight += 1
+    mock.stats["max_in_flight"] = max(mock.stats["max_in_flight"], mock.in_flight)
+    try:
+        roll = random.random()
+        if roll < args.rate_limit_rate:
+            mock.stats["rate_limited"] += 1
+            return error_response(429, "请求过于频繁")
+        roll -= args.rate_limit_rate
+        if roll < args.error_rate:
+            mock.stats["errors_503"] += 1
+            await asyncio.sleep(mock.latency() * 0.1)
+            return error_response(503, "服务暂时不可用")
+        roll -= args.error_rate
+        if roll < args.server_error_rate:
+            mock.stats["errors_500"] += 1
+            return error_response(500, "内部错误")
+        roll -= args.server_error_rate
+        if roll < args.hang_rate:
+            # 模拟卡住的上游，触发客户端读取超时
+            mock.stats["hangs"] += 1
+            await asyncio.sleep(args.hang_seconds)
+
+        delay = mock.latency()
+        if random.random() < args.slow_rate:
+            delay += args.slow_latency
+
+        reply = mock.reply_for(messages)
+        usage = mock.usage(messages, reply)
+
+        if not stream:
+            await asyncio.sleep(delay)
+            mock.stats["ok"] += 1
+            return web.json_response({
+                "code": 0,
+                "message": "Success",
+                "choices": [{"message": {"role": "assistant", "content": reply}, "index": 0}],
+                "usage": usage
+            })
+
+        # 流式：delay 视为首个数据块的等待时间，之后按 token_interval 逐段推送
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        await asyncio.sleep(delay)
+
+        fail_at = None
+        if random.random() < args.stream_error_rate:
+            fail_at = random.randrange(0, max(1, len(reply) // args.chunk_chars))
+            mock.stats["stream_errors"] += 1
+
+        for index, start in enumerate(range(0, len(reply), args.chunk_chars)):
+            if index == fail_at:
+                chunk = {"code": 10013, "message": "模拟的流式业务错误"}
+                await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                await response.write_eof()
+                return response
+            chunk = {
+                "code": 0,
+                "choices": [{"delta": {"role": "assistant", "content": reply[start:start + args.chunk_chars]}, "index": 0}]
+            }
+            await response.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            if args.token_interval > 0:
+                await asyncio.sleep(args.token_interval)
+
+        final = {"code": 0, "choices": [{"delta": {"content": ""}, "index": 0}], "usage": usage}
+        await response.write(f"data: {json.dumps(final, ensure_ascii=False)}\n\n".encode("utf-8"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        mock.stats["ok"] += 1
+        return response
+    finally:
+        mock.in_flight -= 1
+
+
+async def get_stats(request):
+    mock = request.app["mock"]
+    return web.json_response(dict(
+        mock.stats,
+        in_flight=mock.in_flight,
+        uptime_seconds=round(time.time() - mock.started_at, 1)
+    ))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="星火大模型 chat-completions 模拟服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--latency", default="lognormal:0.8,0.4",
+                        help="响应延迟分布：fixed:s | uniform:a,b | normal:mean,std | lognormal:median,sigma | exponential:mean")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="额外变慢的请求比例（模拟长尾）")
+    parser.add_argument("--slow-latency", type=float, default=5.0, help="变慢请求增加的延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 503 的比例")
+    parser.add_argument("--server-error-rate", type=float, default=0.0, help="返回 500 的比例")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="随机返回 429 的比例")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="卡住不响应的比例")
+    parser.add_argument("--hang-seconds", type=float, default=60.0, help="卡住的时长（秒）")
+    parser.add_argument("--stream-error-rate", type=float, default=0.0, help="流式输出中途返回业务错误的比例")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="同时处理的请求上限，超出返回 429（0 表示不限）")
+    parser.add_argument("--reply-chars", type=int, default=120, help="模拟回复的字数")
+    parser.add_argument("--chunk-chars", type=int, default=4, help="流式输出每个数据块的字数")
+    parser.add_argument("--token-interval", type=float, default=0.02, help="流式数据块之间的间隔（秒）")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子，便于复现")
+    return parser
+
+
+def create_app(args):
+    if args.seed is not None:
+        random.seed(args.seed)
+    app = web.Application(client_max_size=16 * 1024 * 1024)
+    app["mock"] = MockSpark(args)
+    app.router.add_post("/v1/chat/completions", chat_completions)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+
+def main():
+    args = build_parser().parse_args()
+    print("🧪 启动星火大模型模拟服务...")
+    print(f"📡 接口地址: http://{args.host}:{args.port}/v1/chat/completions")
+    print(f"⏱️  延迟分布: {args.latency}（长尾比例 {args.slow_rate}，错误率 {args.error_rate}）")
+    print(f"📊 统计信息: http://{args.host}:{args.port}/stats")
+    print("-" * 50)
+    web.run_app(create_app(args), host=args.host, port=args.port, print=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+上游调用的容错策略 - 抖动退避重试、对冲请求和熔断器
+
+- RetryPolicy: 可重试的失败（连接错误、超时、429/5xx）按指数退避 + 全抖动重试
+- HedgePolicy: 记录最近成功调用的耗时，请求超过指定分位数仍未返回时再发一个
+  相同的请求，先返回者胜出；对冲请求占比受预算限制，过载时不会成倍放大流量
+- CircuitBreaker: 连续失败达到阈值后熔断，冷却期内直接失败（由调用方走降级逻辑），
+  冷却结束后放行一个探测请求，成功则恢复
+
+Resilience 把三者组合在一起，call() 用于线程版客户端，acall() 用于协程版客户端。
+"""
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求未发出"""
+
+
+class RetryPolicy:
+    """指数退避 + 全抖动（full jitter）重试策略"""
+
+    def __init__(self, max_retries=2, base_delay=0.2, max_delay=2.0):
+        """
+        Args:
+            max_retries: 首次调用失败后最多重试的次数
+            base_delay: 第一次重试的退避上限（秒），之后每次翻倍
+            max_delay: 单次退避的上限（秒）
+        """
+        self.max_retries = max(0, int(max_retries))
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+
+    def backoff(self, attempt):
+        """第 attempt 次重试（从 0 开始）前的等待秒数，在 [0, 上限] 内均匀随机"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class HedgePolicy:
+    """按耗时分位数触发对冲请求"""
+
+    def __init__(self, percentile=0.95, min_samples=20, min_delay=0.2,
+                 max_ratio=0.1, window=512):
+        """
+        Args:
+            percentile: 超过该分位数的耗时仍未返回时发出对冲请求，<=0 表示不对冲
+            min_samples: 样本数不足时不对冲
+            min_delay: 对冲等待时间的下限（秒）
+            max_ratio: 最近 100 次调用中对冲请求的最大占比
+            window: 统计分位数时保留的最近样本数
+        """
+        self.percentile = float(percentile)
+        self.min_samples = max(1, int(min_samples))
+        self.min_delay = float(min_delay)
+        self.max_ratio = float(max_ratio)
+
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._recent = deque(maxlen=100)
+
+    def observe(self, seconds):
+        """记录一次成功调用的耗时"""
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def quantile(self, q):
+        with self._lock:
+            samples = sorted(self._latencies)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def delay(self):
+        """发出对冲请求前等待的秒数，返回 None 表示本次不对冲"""
+        if self.percentile <= 0 or len(self._latencies) < self.min_samples:
+            return None
+        return max(self.min_delay, self.quantile(self.percentile))
+
+    def record_call(self, hedged):
+        with self._lock:
+            self._recent.append(hedged)
+
+    def try_acquire(self):
+        """对冲预算：最近的调用中对冲占比未超过 max_ratio 时才允许对冲"""
+        with self._lock:
+            budget = max(1, int(self.max_ratio * self._recent.maxlen))
+            return sum(self._recent) < budget
+
+
+class CircuitBreaker:
+    """连续失败熔断器：closed -> open -> half_open -> closed"""
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30.0):
+        """
+        Args:
+            failure_threshold: 连续失败多少次后熔断
+            recovery_timeout: 熔断后多少秒放行探测请求
+        """
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.recovery_timeout = float(recovery_timeout)
+
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+        self.opened = 0
+        self.rejected = 0
+
+    def allow(self):
+        """检查是否允许发出请求，不允许时抛出 CircuitOpenError"""
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.recovery_timeout:
+                    self.rejected += 1
+                    raise CircuitOpenError("上游服务暂不可用（熔断中），请稍后再试")
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open":
+                # 半开状态只放行一个探测请求
+                if self._probing:
+                    self.rejected += 1
+                    raise CircuitOpenError("上游服务暂不可用（熔断恢复探测中），请稍后再试")
+                self._probing = True
+
+    def release(self):
+        """调用在得出结果前被中断（取消、客户端断开）时归还探测名额
+
+        不计成功也不计失败，半开状态下由下一个请求重新探测。
+        """
+        with self._lock:
+            self._probing = False
+
+    def is_open(self):
+        with self._lock:
+            return self.state == "open"
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.opened += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "recovery_timeout": self.recovery_timeout,
+                "opened": self.opened,
+                "rejected": self.rejected
+            }
+
+
+class Resilience:
+    """组合重试、对冲和熔断的上游调用包装"""
+
+    def __init__(self, retry=None, hedge=None, breaker=None, max_workers=64):
+        """
+        Args:
+            retry: RetryPolicy，为空时不重试
+            hedge: HedgePolicy，为空时不对冲
+            breaker: CircuitBreaker，为空时不熔断
+            max_workers: 线程版对冲调用使用的线程数上限。线程全部占用时新的调用直接在调用方线程中
+                执行、不对冲，不会在线程池中排队；一般取同时调用上游的请求数上限的 2 倍（主请求 + 对冲请求）
+        """
+        self.retry = retry or RetryPolicy(max_retries=0)
+        self.hedge = hedge
+        self.breaker = breaker
+        self._max_workers = max_workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # 线程池中空闲的线程数，提交前先占用，避免任务在线程池队列中等待
+        self._slots = threading.BoundedSemaphore(max_workers)
+
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.hedge_pool_full = 0
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _allow(self):
+        if self.breaker is not None:
+            self.breaker.allow()
+
+    def _release(self):
+        if self.breaker is not None:
+            self.breaker.release()
+
+    def _record(self, error, retryable):
+        """把调用结果反馈给熔断器，返回该错误是否值得重试"""
+        if self.breaker is None:
+            return error is not None and retryable(error)
+        if error is None or not retryable(error):
+            # 上游有响应（包括 4xx 等不可重试的错误）说明服务本身是可达的
+            self.breaker.record_success()
+            return False
+        self.breaker.record_failure()
+        return True
+
+    def _should_retry(self, attempt):
+        if attempt >= self.retry.max_retries:
+            return False
+        return self.breaker is None or not self.breaker.is_open()
+
+    # ---------- 线程版 ----------
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="spark-hedge")
+            return self._executor
+
+    def _timed(self, fn):
+        start = time.monotonic()
+        result = fn()
+        if self.hedge is not None:
+            self.hedge.observe(time.monotonic() - start)
+        return result
+
+    def _submit(self, fn):
+        """在线程池中执行 fn，没有空闲线程时返回 None（不排队）"""
+        if not self._slots.acquire(blocking=False):
+            self._count("hedge_pool_full")
+            return None
+        try:
+            return self._get_executor().submit(self._run_slot, fn)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _run_slot(self, fn):
+        try:
+            return self._timed(fn)
+        finally:
+            self._slots.release()
+
+    def _hedged(self, fn):
+        delay = self.hedge.delay() if self.hedge is not None else None
+        primary = self._submit(fn) if delay is not None else None
+        if primary is None:
+            # 不对冲，或线程池已满：在调用方线程中执行，不受线程池大小限制
+            if self.hedge is not None:
+                self.hedge.record_call(False)
+            return self._timed(fn)
+
+        done, _ = wait([primary], timeout=delay)
+        futures = [primary]
+        if not done and self.hedge.try_acquire():
+            hedge = self._submit(fn)
+            if hedge is not None:
+                futures.append(hedge)
+        hedged = len(futures) > 1
+        self.hedge.record_call(hedged)
+        if hedged:
+            self._count("hedges")
+
+        # 先成功返回的请求胜出；落后的请求无法中断，完成后结果被丢弃
+        error = None
+        pending = futures
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        self._count("hedge_wins")
+                    return future.result()
+                if error is None or future is primary:
+                    error = future.exception()
+        raise error
+
+    def call(self, fn, retryable, hedge=True):
+        """调用 fn()，按策略重试、对冲和熔断
+
+        Args:
+            fn: 发出一次上游请求的无参函数
+            retryable: 判断异常是否可重试的函数
+            hedge: 是否允许对冲（流式请求一旦开始推送便无法对冲）
+        """
+        self._count("calls")
+        attempt = 0
+        while True:
+            self._allow()
+            try:
+                result = self._hedged(fn) if hedge else fn()
+            except Exception as e:
+                if not self._record(e, retryable) or not self._should_retry(attempt):
+                    raise
+                self._count("retries")
+                time.sleep(self.retry.backoff(attempt))
+                attempt += 1
+                continue
+            except BaseException:
+                self._release()
+                raise
+            self._record(None, retryable)
+            return result
+
+    # ---------- 协程版 ----------
+
+    async def _atimed(self, fn):
+        start = time.monotonic()
+        result = await fn()
+        if self.hedge is not None:
+            self.hedge.observe(time.monotonic() - start)
+        return result
+
+    async def _ahedged(self, fn):
+        delay = self.hedge.delay() if self.hedge is not None else None
+        if delay is None:
+            if self.hedge is not None:
+                self.hedge.record_call(False)
+            return await self._atimed(fn)
+
+        primary = asyncio.ensure_future(self._atimed(fn))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait([primary], timeout=delay)
+            hedged = not done and self.hedge.try_acquire()
+            self.hedge.record_call(hedged)
+            if hedged:
+                self._count("hedges")
+                tasks.append(asyncio.ensure_future(self._atimed(fn)))
+
+            error = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self._count("hedge_wins")
+                        return task.result()
+                    if error is None or task is primary:
+                        error = task.exception()
+            raise error
+        finally:
+            # 落后的请求直接取消，连接随之关闭
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def acall(self, fn, retryable, hedge=True):
+        """call() 的协程版本，fn 为返回协程的无参函数"""
+        self._count("calls")
+        attempt = 0
+        while True:
+            self._allow()
+            try:
+                result = await (self._ahedged(fn) if hedge else fn())
+            except Exception as e:
+                if not self._record(e, retryable) or not self._should_retry(attempt):
+                    raise
+                self._count("retries")
+                await asyncio.sleep(self.retry.backoff(attempt))
+                attempt += 1
+                continue
+            except BaseException:
+                # CancelledError 等不是 Exception，不归还名额会让熔断器永远停在半开探测中
+                self._release()
+                raise
+            self._record(None, retryable)
+            return result
+
+    def stats(self):
+        """容错统计信息"""
+        stats = {
+            "calls": self.calls,
+            "retries": self.retries,
+            "max_retries": self.retry.max_retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_pool_full": self.hedge_pool_full
+        }
+        if self.hedge is not None:
+            delay = self.hedge.delay()
+            stats["hedge_delay_ms"] = round(delay * 1000, 1) if delay is not None else None
+            for name, q in (("latency_p50_ms", 0.5), ("latency_p95_ms", 0.95), ("latency_p99_ms", 0.99)):
+                value = self.hedge.quantile(q)
+                stats[name] = round(value * 1000, 1) if value is not None else None
+        if self.breaker is not None:
+            stats["breaker"] = self.breaker.stats()
+        return stats
+
+    def close(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+会话注册表 - 按会话ID隔离每位求职者的面试状态
+
+每个会话持有独立的服务实例（对话历史、简历数据）和一把会话级锁：
+同一会话内的请求串行执行，不同会话之间互不阻塞。
+注册表本身只在增删查时短暂持有全局锁（创建服务实例在锁外进行），并通过
+LRU 淘汰和空闲 TTL 控制常驻会话数量。
+"""
+
+import asyncio
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+
+# 未携带会话ID的旧客户端共用的默认会话
+DEFAULT_SESSION_ID = "default"
+
+# 会话ID只允许字母、数字、下划线和连字符，避免把任意字符串当作键
+_SESSION_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def is_valid_session_id(session_id):
+    """校验会话ID格式"""
+    return bool(session_id) and bool(_SESSION_ID_PATTERN.match(session_id))
+
+
+class _SessionEntry:
+    """注册表中的单个会话"""
+
+    __slots__ = ("session_id", "service", "lock", "created_at", "last_access")
+
+    def __init__(self, session_id, service, lock):
+        now = time.monotonic()
+        self.session_id = session_id
+        self.service = service
+        self.lock = lock
+        self.created_at = now
+        self.last_access = now
+
+
+class SessionRegistry:
+    """按会话ID管理服务实例，支持会话级锁、数量上限、LRU 淘汰和空闲 TTL"""
+
+    def __init__(self, factory, max_sessions=5000, ttl_seconds=3600,
+                 lock_factory=threading.Lock, on_evict=None):
+        """
+        Args:
+            factory: 以会话ID为参数的可调用对象，为新会话创建服务实例
+            max_sessions: 常驻会话数量上限，超出时淘汰最久未访问的空闲会话
+            ttl_seconds: 会话空闲超过该秒数即过期，<=0 表示不过期
+            lock_factory: 会话级锁的构造函数
+            on_evict: 会话被淘汰或过期时的回调，参数为 (session_id, service)
+        """
+        self._factory = factory
+        self.max_sessions = max(1, int(max_sessions))
+        self.ttl_seconds = float(ttl_seconds)
+        self._lock_factory = lock_factory
+        self._on_evict = on_evict
+
+        # 按最近访问顺序排列：队首最久未访问，队尾最近访问
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._created = 0
+        self._evicted = 0
+        self._expired = 0
+
+    def _is_expired(self, entry, now):
+        return self.ttl_seconds > 0 and now - entry.last_access > self.ttl_seconds
+
+    def _purge_expired_locked(self, now):
+        """清理队首的过期会话（调用方需持有全局锁）
+
+        由于字典按访问时间排序，过期会话一定集中在队首，遇到第一个
+        未过期的会话即可停止，均摊开销为 O(1)。
+        """
+        removed = []
+        while self._sessions:
+            session_id, entry = next(iter(self._sessions.items()))
+            if not self._is_expired(entry, now):
+                break
+            del self._sessions[session_id]
+            self._expired += 1
+            removed.append(entry)
+        return removed
+
+    def _evict_overflow_locked(self):
+        """超出数量上限时淘汰最久未访问的空闲会话（调用方需持有全局锁）"""
+        removed = []
+        skipped = 0
+        while len(self._sessions) > self.max_sessions and skipped < len(self._sessions):
+            session_id, entry = next(iter(self._sessions.items()))
+            if entry.lock.locked():
+                # 正在处理请求的会话不淘汰，移到队尾后继续检查下一个
+                self._sessions.move_to_end(session_id)
+                skipped += 1
+                continue
+            del self._sessions[session_id]
+            self._evicted += 1
+            removed.append(entry)
+        return removed
+
+    def _notify_removed(self, entries):
+        if self._on_evict is None:
+            return
+        for entry in entries:
+            try:
+                self._on_evict(entry.session_id, entry.service)
+            except Exception as e:
+                print(f"⚠️  会话淘汰回调失败 ({entry.session_id}): {e}")
+
+    def _lookup(self, session_id):
+        """查找已有会话并刷新访问时间，返回 (entry, 被清理的条目)"""
+        now = time.monotonic()
+        with self._lock:
+            removed = self._purge_expired_locked(now)
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                entry.last_access = now
+                self._sessions.move_to_end(session_id)
+        return entry, removed
+
+    def _insert(self, session_id, service):
+        """登记新建的服务实例；其他线程已抢先创建时沿用已有实例，返回 (entry, 被淘汰的条目)"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                entry.last_access = time.monotonic()
+                self._sessions.move_to_end(session_id)
+                return entry, []
+            entry = _SessionEntry(session_id, service, self._lock_factory())
+            self._sessions[session_id] = entry
+            self._created += 1
+            return entry, self._evict_overflow_locked()
+
+    def get(self, session_id, create=True):
+        """获取会话条目，不存在时按需创建；返回 None 表示会话不存在
+
+        创建服务实例可能较慢（例如从历史存储恢复对话），在全局锁之外执行，
+        全局锁只用于查找和登记；同一会话并发创建时只保留先登记的实例。
+        """
+        entry, removed = self._lookup(session_id)
+        if entry is None and create:
+            entry, evicted = self._insert(session_id, self._factory(session_id))
+            removed.extend(evicted)
+
+        # 回调可能较慢（例如落盘），放在全局锁之外执行
+        self._notify_removed(removed)
+        return entry
+
+    async def aget(self, session_id, create=True):
+        """get() 的异步版本：在线程池中创建服务实例，不阻塞事件循环"""
+        entry, removed = self._lookup(session_id)
+        if entry is None and create:
+            service = await asyncio.get_running_loop().run_in_executor(None, self._factory, session_id)
+            entry, evicted = self._insert(session_id, service)
+            removed.extend(evicted)
+
+        self._notify_removed(removed)
+        return entry
+
+    @contextmanager
+    def session(self, session_id, create=True):
+        """持有会话级锁使用服务实例
+
+        用法:
+            with registry.session(session_id) as service:
+                service.get_spark_response(...)
+        """
+        while True:
+            entry = self.get(session_id, create=create)
+            if entry is None:
+                raise KeyError(session_id)
+            with entry.lock:
+                # 等锁期间会话可能已被淘汰或清空，此时改用注册表中的当前实例
+                if not self._is_current(entry):
+                    continue
+                entry.last_access = time.monotonic()
+                yield entry.service
+                return
+
+    @asynccontextmanager
+    async def asession(self, session_id, create=True):
+        """session() 的异步版本，用于以 asyncio.Lock 作为会话锁的注册表
+
+        用法:
+            async with registry.asession(session_id) as service:
+                await service.get_spark_response(...)
+        """
+        while True:
+            entry = await self.aget(session_id, create=create)
+            if entry is None:
+                raise KeyError(session_id)
+            async with entry.lock:
+                if not self._is_current(entry):
+                    continue
+                entry.last_access = time.monotonic()
+                yield entry.service
+                return
+
+    def _is_current(self, entry):
+        """条目是否仍在注册表中（未被淘汰、过期或移除）"""
+        with self._lock:
+            return self._sessions.get(entry.session_id) is entry
+
+    def discard(self, session_id):
+        """移除会话，返回是否存在
+
+        不获取会话锁：需要与同一会话的请求串行时，在 session() 内部调用。
+        """
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+        return entry is not None
+
+    def purge_expired(self):
+        """主动清理所有过期会话，返回清理数量"""
+        with self._lock:
+            removed = self._purge_expired_locked(time.monotonic())
+        self._notify_removed(removed)
+        return len(removed)
+
+    def __contains__(self, session_id):
+        with self._lock:
+            return session_id in self._sessions
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+    def stats(self):
+        """注册表统计信息"""
+        with self._lock:
+            active = len(self._sessions)
+            busy = sum(1 for entry in self._sessions.values() if entry.lock.locked())
+        return {
+            "active": active,
+            "busy": busy,
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl_seconds,
+            "created": self._created,
+            "evicted": self._evicted,
+            "expired": self._expired
+        }
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+星火大模型上游客户端 - 复用连接池的 HTTP 客户端
+
+所有对星火 chat-completions 接口的调用都经过同一个 requests.Session：
+连接按主机放入固定大小的连接池并保持 keep-alive，避免每轮对话都重新
+进行 TCP+TLS 握手。连接超时与读取超时分开配置，连接池统计信息可通过
+stats() 暴露给健康检查接口。
+
+post_json() / open_stream() 通过可选的 Resilience 对上游调用做重试、对冲和熔断；
+post() 只发送一次请求，不经过容错策略。
+
+AsyncSparkClient 是基于 aiohttp 的非阻塞版本，供异步服务模式使用。
+"""
+
+import asyncio
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from resilience import Resilience
+
+try:
+    import aiohttp
+except ImportError:  # 仅异步服务模式需要 aiohttp
+    aiohttp = None
+
+
+class SparkClient:
+    """星火大模型 HTTP 客户端（线程安全，进程内共享）"""
+
+    def __init__(self, api_url, api_key, pool_connections=4, pool_maxsize=64,
+                 pool_block=False, connect_timeout=5.0, read_timeout=30.0, resilience=None):
+        """
+        Args:
+            api_url: chat-completions 接口地址
+            api_key: API 密钥，以 Bearer 方式认证
+            pool_connections: 缓存连接池的主机数量
+            pool_maxsize: 每个主机保留的最大空闲连接数
+            pool_block: 连接池耗尽时是否阻塞等待，False 时临时新建连接
+            connect_timeout: 建立连接的超时时间（秒）
+            read_timeout: 两次读取之间的最大等待时间（秒）
+            resilience: 容错策略（重试、对冲、熔断），为空时每次调用只尝试一次
+        """
+        self.api_url = api_url
+        self.resilience = resilience or Resilience()
+        self.pool_maxsize = pool_maxsize
+        self.timeout = (connect_timeout, read_timeout)
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            "Connection": "keep-alive"
+        })
+
+        # 重试交给调用方决定，适配器本身不重试
+        self._adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            max_retries=0
+        )
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+
+        self._stats_lock = threading.Lock()
+        self._requests = 0
+        self._errors = 0
+        self._in_flight = 0
+
+    def post(self, data, stream=False):
+        """发送 chat-completions 请求，返回 requests.Response
+
+        stream=True 时调用方必须关闭响应（推荐 with 语句），连接才会归还连接池；
+        in_flight 统计到响应关闭时才减少。
+        """
+        with self._stats_lock:
+            self._requests += 1
+            self._in_flight += 1
+        try:
+            response = self.session.post(self.api_url, json=data, timeout=self.timeout, stream=stream)
+        except BaseException as e:
+            with self._stats_lock:
+                self._in_flight -= 1
+                if isinstance(e, requests.exceptions.RequestException):
+                    self._errors += 1
+            raise
+        if stream:
+            self._release_on_close(response)
+        else:
+            self._release()
+        return response
+
+    def _release(self):
+        with self._stats_lock:
+            self._in_flight -= 1
+
+    def _release_on_close(self, response):
+        """流式响应关闭（连接归还连接池）时减少 in_flight，重复关闭只减少一次"""
+        close = response.close
+        released = threading.Event()
+
+        def close_and_release():
+            try:
+                close()
+            finally:
+                if not released.is_set():
+                    released.set()
+                    self._release()
+
+        response.close = close_and_release
+
+    @staticmethod
+    def is_retryable(error):
+        """连接错误、超时以及 429/5xx 响应可以重试，其余错误直接返回"""
+        if isinstance(error, requests.exceptions.HTTPError):
+            response = error.response
+            return response is not None and (response.status_code == 429 or response.status_code >= 500)
+        return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+    def _post_json_once(self, data):
+        response = self.post(data)
+        response.raise_for_status()
+        return response.json()
+
+    def post_json(self, data):
+        """发送非流式请求并返回解析后的 JSON（重试、对冲、熔断）"""
+        return self.resilience.call(lambda: self._post_json_once(data), self.is_retryable)
+
+    def _open_stream_once(self, data):
+        response = self.post(data, stream=True)
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError:
+            response.close()
+            raise
+        return response
+
+    def open_stream(self, data):
+        """发送流式请求，收到响应头后返回 requests.Response
+
+        只在收到响应头之前重试（之后重试会重复推送内容），不对冲；
+        调用方必须关闭响应（推荐 with 语句）。
+        """
+        return self.resilience.call(lambda: self._open_stream_once(data), self.is_retryable, hedge=False)
+
+    def _pool_stats(self):
+        """汇总 urllib3 连接池的连接数与请求数"""
+        pools = []
+        manager = self._adapter.poolmanager
+        try:
+            keys = list(manager.pools.keys())
+        except Exception:
+            return pools
+
+        for key in keys:
+            pool = manager.pools.get(key)
+            if pool is None:
+                continue
+            pools.append({
+                "host": f"{pool.scheme}://{pool.host}:{pool.port}" if pool.port else f"{pool.scheme}://{pool.host}",
+                "connections_opened": pool.num_connections,
+                "requests": pool.num_requests,
+                # 队列中用 None 占位尚未创建的连接，只统计真实的空闲连接
+                "idle_connections": sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool is not None else 0
+            })
+        return pools
+
+    def stats(self):
+        """客户端与连接池统计信息"""
+        with self._stats_lock:
+            requests_total = self._requests
+            errors = self._errors
+            in_flight = self._in_flight
+
+        pools = self._pool_stats()
+        opened = sum(p["connections_opened"] for p in pools)
+        pooled_requests = sum(p["requests"] for p in pools)
+
+        return {
+            "requests": requests_total,
+            "errors": errors,
+            "in_flight": in_flight,
+            "pool_maxsize": self.pool_maxsize,
+            "connect_timeout": self.timeout[0],
+            "read_timeout": self.timeout[1],
+            "connections_opened": opened,
+            # 复用率：未新建连接的请求占比
+            "connection_reuse_ratio": round(1 - opened / pooled_requests, 4) if pooled_requests else 0.0,
+            "pools": pools,
+            "resilience": self.resilience.stats()
+        }
+
+    def close(self):
+        """关闭所有连接"""
+        self.resilience.close()
+        self.session.close()
+
+
+class AsyncSparkClient:
+    """星火大模型异步 HTTP 客户端（单个事件循环内共享）
+
+    等待上游响应时只占用一个协程而不是一个线程。ClientSession 必须在
+    事件循环中创建，因此在第一次请求时惰性初始化。
+    """
+
+    def __init__(self, api_url, api_key, pool_maxsize=256, keepalive_timeout=30.0,
+                 connect_timeout=5.0, read_timeout=30.0, resilience=None):
+        """
+        Args:
+            api_url: chat-completions 接口地址
+            api_key: API 密钥，以 Bearer 方式认证
+            pool_maxsize: 同时打开的最大连接数
+            keepalive_timeout: 空闲连接保持时间（秒）
+            connect_timeout: 建立连接的超时时间（秒）
+            read_timeout: 两次读取之间的最大等待时间（秒）
+            resilience: 容错策略（重试、对冲、熔断），为空时每次调用只尝试一次
+        """
+        if aiohttp is None:
+            raise RuntimeError("异步服务模式需要 aiohttp，请运行: pip install aiohttp")
+
+        self.api_url = api_url
+        self.resilience = resilience or Resilience()
+        self.pool_maxsize = pool_maxsize
+        self.keepalive_timeout = keepalive_timeout
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+        self._session = None
+
+        self._requests = 0
+        self._errors = 0
+        self._in_flight = 0
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_maxsize,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            timeout = aiohttp.ClientTimeout(
+                sock_connect=self.connect_timeout,
+                sock_read=self.read_timeout
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=timeout,
+                headers=self._headers
+            )
+        return self._session
+
+    @staticmethod
+    def is_retryable(error):
+        """连接错误、超时以及 429/5xx 响应可以重试，其余错误直接返回"""
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status == 429 or error.status >= 500
+        return isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+    async def _post_json_once(self, data):
+        self._requests += 1
+        self._in_flight += 1
+        try:
+            async with self._get_session().post(self.api_url, json=data) as response:
+                response.raise_for_status()
+                return await response.json(content_type=None)
+        except Exception:
+            self._errors += 1
+            raise
+        finally:
+            self._in_flight -= 1
+
+    async def post_json(self, data):
+        """发送非流式请求并返回解析后的 JSON（重试、对冲、熔断）"""
+        return await self.resilience.acall(lambda: self._post_json_once(data), self.is_retryable)
+
+    async def _open_stream_once(self, data):
+        self._requests += 1
+        try:
+            response = await self._get_session().post(self.api_url, json=data)
+            try:
+                response.raise_for_status()
+            except aiohttp.ClientResponseError:
+                response.release()
+                raise
+            return response
+        except Exception:
+            self._errors += 1
+            raise
+
+    async def stream_lines(self, data):
+        """发送流式请求，逐行产出解码后的响应文本
+
+        只在收到响应头之前重试，不对冲。
+        """
+        self._in_flight += 1
+        try:
+            response = await self.resilience.acall(lambda: self._open_stream_once(data), self.is_retryable, hedge=False)
+            try:
+                async for raw_line in response.content:
+                    line = raw_line.decode("utf-8").strip()
+                    if line:
+                        yield line
+            except Exception:
+                self._errors += 1
+                raise
+            finally:
+                response.release()
+        finally:
+            self._in_flight -= 1
+
+    def stats(self):
+        """客户端与连接池统计信息"""
+        connector = self._session.connector if self._session is not None and not self._session.closed else None
+        return {
+            "requests": self._requests,
+            "errors": self._errors,
+            "in_flight": self._in_flight,
+            "pool_maxsize": self.pool_maxsize,
+            "connect_timeout": self.connect_timeout,
+            "read_timeout": self.read_timeout,
+            # aiohttp 没有公开的连接统计接口，这里只报告连接器是否已初始化
+            "connector_ready": connector is not None,
+            "resilience": self.resilience.stats()
+        }
+
+    async def close(self):
+        """关闭所有连接"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""测试从 simulation/back 目录导入模块（各模块按文件名平铺导入）"""
+
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def mock_spark():
+    """在后台线程的事件循环中启动 mock_spark_server，返回 start(*命令行参数) -> 基础地址"""
+    from aiohttp import web
+
+    import mock_spark_server
+
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    runners = []
+
+    async def serve(argv):
+        args = mock_spark_server.build_parser().parse_args(argv)
+        runner = web.AppRunner(mock_spark_server.create_app(args))
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", 0).start()
+        runners.append(runner)
+        host, port = runner.addresses[0][:2]
+        return f"http://{host}:{port}"
+
+    def start(*argv):
+        argv = ["--latency", "fixed:0", "--token-interval", "0", *argv]
+        return asyncio.run_coroutine_threadsafe(serve(argv), loop).result(10)
+
+    yield start
+
+    for runner in runners:
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result(10)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(10)
+    loop.close()
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""准入控制：并发上限、拒绝原因、公平调度、超时和取消"""
+
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected, AsyncAdmissionController
+
+
+def test_admits_up_to_concurrency_and_releases():
+    admission = AdmissionController(max_concurrency=2, queue_timeout=0.05)
+    first = admission.acquire("a")
+    second = admission.acquire("b")
+    assert admission.stats()["active"] == 2
+    with pytest.raises(AdmissionRejected) as info:
+        admission.acquire("c")
+    assert info.value.status == 503
+    assert admission.stats()["timed_out"] == 1
+    first.release()
+    second.release()
+    with admission.slot("c"):
+        assert admission.stats()["active"] == 1
+    assert admission.stats()["active"] == 0
+
+
+def test_queue_full_and_session_limit():
+    admission = AsyncAdmissionController(max_concurrency=1, max_queue=2, max_session_queue=1)
+
+    async def main():
+        holder = await admission.acquire("x")
+        waiters = [asyncio.ensure_future(admission.acquire("a"))]
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as limited:
+            await admission.acquire("a")
+        waiters.append(asyncio.ensure_future(admission.acquire("b")))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as full:
+            await admission.acquire("c")
+        holder.release()
+        for waiter in waiters:
+            (await waiter).release()
+        return full.value, limited.value
+
+    full, limited = asyncio.run(main())
+    assert (full.status, limited.status) == (503, 429)
+    assert full.retry_after >= 1
+    assert admission.stats()["rejected"]["queue_full"] == 1
+    assert admission.stats()["rejected"]["session_limit"] == 1
+
+
+def run_in_order(admission, requests):
+    """在唯一名额被占用时按顺序排队，返回实际放行顺序"""
+    order = []
+
+    async def request(name, session_id, weight):
+        async with admission.slot(session_id, weight=weight):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    async def main():
+        holder = await admission.acquire("holder")
+        tasks = []
+        for name, session_id, weight in requests:
+            tasks.append(asyncio.ensure_future(request(name, session_id, weight)))
+            await asyncio.sleep(0)
+        holder.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    return order
+
+
+def test_sessions_are_served_fairly():
+    admission = AsyncAdmissionController(max_concurrency=1, max_session_queue=4)
+    order = run_in_order(admission, [("a1", "a", 1), ("a2", "a", 1), ("a3", "a", 1), ("b1", "b", 1)])
+    # 连续发请求的会话不会让后来的会话排到最后
+    assert order == ["a1", "b1", "a2", "a3"]
+
+
+def test_low_weight_flow_yields_to_interactive_sessions():
+    admission = AsyncAdmissionController(max_concurrency=1, max_session_queue=4)
+    order = run_in_order(admission, [("s1", "summary", 0.25), ("s2", "summary", 0.25),
+                                     ("a1", "a", 1), ("a2", "a", 1), ("a3", "a", 1)])
+    assert order.index("s2") > order.index("a3")
+
+
+def test_cancelled_waiter_leaves_queue():
+    admission = AsyncAdmissionController(max_concurrency=1)
+
+    async def main():
+        holder = await admission.acquire("x")
+        waiter = asyncio.ensure_future(admission.acquire("a"))
+        await asyncio.sleep(0)
+        assert admission.stats()["queued"] == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert admission.stats()["queued"] == 0
+        holder.release()
+        assert admission.stats()["active"] == 0
+
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""异步服务：历史存储的同步调用不在事件循环线程中执行，流式接口的事件顺序"""
+
+import asyncio
+import json
+import threading
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+import async_app
+
+
+@pytest.fixture
+def clear_threads(monkeypatch):
+    """记录 history_store.clear 被调用时所在的线程"""
+    threads = []
+    original = async_app.history_store.clear
+
+    def clear(session_id):
+        threads.append(threading.current_thread())
+        original(session_id)
+
+    monkeypatch.setattr(async_app.history_store, "clear", clear)
+    return threads
+
+
+async def post_clear(session_id, prepare=None):
+    app = async_app.create_app()
+    # 不在测试中关闭全局的上游客户端
+    app.on_cleanup.clear()
+    async with TestClient(TestServer(app)) as client:
+        if prepare is not None:
+            await prepare()
+        response = await client.post("/api/chat/clear", json={"sessionId": session_id})
+        return response.status, await response.json(), threading.current_thread()
+
+
+def test_clearing_an_unloaded_session_runs_off_the_event_loop(clear_threads):
+    status, body, loop_thread = asyncio.run(post_clear("unloaded"))
+    assert status == 200 and body["success"]
+    assert clear_threads and all(thread is not loop_thread for thread in clear_threads)
+
+
+def test_resetting_a_loaded_session_runs_off_the_event_loop(clear_threads):
+    async def load_session():
+        async with async_app.session_registry.asession("loaded"):
+            pass
+
+    status, body, loop_thread = asyncio.run(post_clear("loaded", prepare=load_session))
+    assert status == 200 and body["success"]
+    assert clear_threads and all(thread is not loop_thread for thread in clear_threads)
+    assert "loaded" not in async_app.session_registry._sessions
+
+
+def test_chat_stream_event_sequence(mock_spark, monkeypatch):
+    url = mock_spark("--reply-chars", "12") + "/v1/chat/completions"
+
+    async def scenario():
+        spark = async_app.AsyncSparkClient(url, "test-key")
+        monkeypatch.setattr(async_app.chat_runtime, "client", spark)
+        app = async_app.create_app()
+        app.on_cleanup.clear()
+        try:
+            async with TestClient(TestServer(app)) as client:
+                response = await client.post("/api/chat", json={"message": "请开始", "stream": True},
+                                             headers={"X-Session-Id": "async-sse"})
+                return response.status, response.content_type, await response.text()
+        finally:
+            await spark.close()
+
+    status, content_type, body = asyncio.run(scenario())
+    assert status == 200 and content_type == "text/event-stream"
+    events = [block.split("\n") for block in body.split("\n\n") if block]
+    names = [event[len("event: "):] for event, _ in events]
+    assert names[0] == "session" and names[-1] == "done" and set(names[1:-1]) == {"delta"}
+    done = json.loads(events[-1][1][len("data: "):])
+    assert done["success"] and len(done["response"]) == 12
+    assert async_app.admission.stats()["active"] == 0
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""上下文窗口、token 估算、截断和滚动摘要"""
+
+from admission import AdmissionController
+from chat_service import ChatRuntime, ChatService
+from context_builder import (
+    MESSAGE_OVERHEAD_TOKENS,
+    ContextWindow,
+    RollingSummary,
+    estimate_tokens,
+    extractive_summary,
+    truncate_to_tokens
+)
+
+
+def msg(role, content):
+    return {"role": role, "content": content}
+
+
+def total_tokens(messages):
+    return sum(estimate_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def test_estimate_tokens_counts_cjk_per_character():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("你好") == 2
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("你好abcde") == 4
+
+
+def test_truncate_to_tokens_respects_budget():
+    text = "面试" * 100
+    assert truncate_to_tokens(text, 1000) == text
+    truncated = truncate_to_tokens(text, 10)
+    assert truncated.endswith("…")
+    assert estimate_tokens(truncated) <= 10
+
+
+def test_extractive_summary_stays_within_budget():
+    messages = [msg("user", "项目经验" * 50), msg("assistant", "追问细节" * 50)] * 10
+    summary = extractive_summary("", messages, 50)
+    assert estimate_tokens(summary) <= 50
+
+
+def test_window_keeps_newest_messages_within_budget():
+    history = [msg("user" if i % 2 else "assistant", f"第{i}轮" * 20) for i in range(20)]
+    window = ContextWindow(token_budget=300, summary_tokens=50)
+    messages, window_start = window.build("系统提示", "", history)
+    assert messages[0]["role"] == "system"
+    assert total_tokens(messages) <= 300
+    assert messages[-1]["content"] == history[-1]["content"]
+    assert [m["content"] for m in messages[1:]] == [m["content"] for m in history[window_start:]]
+
+
+def test_window_never_reaches_before_summarized_messages():
+    history = [msg("user", "短") for _ in range(10)]
+    messages, window_start = ContextWindow(token_budget=1000).build(None, "摘要", history, start=6)
+    assert window_start == 6
+    assert len(messages) == 1 + 4
+
+
+def test_oversized_newest_message_is_truncated_to_budget():
+    history = [msg("user", "很长的回答" * 500)]
+    messages, window_start = ContextWindow(token_budget=200).build("系统提示" * 10, "", history)
+    assert window_start == 0
+    assert messages[-1]["content"].endswith("…")
+    assert total_tokens(messages) <= 200
+
+
+def test_pending_fold_threshold():
+    window = ContextWindow(fold_batch=4)
+    assert not window.pending_fold(covered=2, window_start=5)
+    assert window.pending_fold(covered=2, window_start=6)
+
+
+def test_rolling_summary_discards_results_from_before_reset():
+    summary = RollingSummary()
+    generation, start, previous = summary.try_begin()
+    assert (start, previous) == (0, "")
+    assert summary.try_begin() is None
+    summary.reset()
+    assert not summary.apply(generation, "过期的摘要", 4)
+    assert summary.snapshot() == ("", 0)
+
+    generation, _, _ = summary.try_begin()
+    assert summary.apply(generation, "新摘要", 4)
+    assert summary.snapshot() == ("新摘要", 4)
+    assert summary.try_begin() is not None
+
+
+class FakeClient:
+    def __init__(self):
+        self.calls = 0
+
+    def post_json(self, data):
+        self.calls += 1
+        return {"choices": [{"message": {"content": "摘要"}}]}
+
+
+def test_summary_requests_go_through_admission():
+    admission = AdmissionController(max_concurrency=1)
+    client = FakeClient()
+    runtime = ChatRuntime(client=client, store=None, context_window=ContextWindow(summary_tokens=50),
+                          first_question_cache=None, first_question_flight=None,
+                          admission=admission)
+    service = ChatService(runtime)
+    generation, _, previous = service.summary.try_begin()
+    service._run_summary(generation, previous, [msg("user", "回答")], 1)
+
+    assert client.calls == 1
+    assert admission.stats()["admitted"] == 1
+    assert service.summary.snapshot() == ("摘要", 1)
+
+
+def test_summary_falls_back_to_extractive_when_admission_rejects():
+    admission = AdmissionController(max_concurrency=1, max_queue=0)
+    client = FakeClient()
+    runtime = ChatRuntime(client=client, store=None, context_window=ContextWindow(summary_tokens=50),
+                          first_question_cache=None, first_question_flight=None,
+                          admission=admission)
+    service = ChatService(runtime)
+    held = admission.acquire("other")
+    try:
+        generation, _, previous = service.summary.try_begin()
+        service._run_summary(generation, previous, [msg("user", "我做过推荐系统")], 1)
+    finally:
+        held.release()
+
+    assert client.calls == 0
+    text, covered = service.summary.snapshot()
+    assert covered == 1 and "推荐系统" in text
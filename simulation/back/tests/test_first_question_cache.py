@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""第一个问题缓存：缓存键、落盘上限、请求合并和空流处理"""
+
+import os
+import threading
+import time
+
+from chat_service import ChatRuntime, ChatService
+from context_builder import ContextWindow
+from first_question_cache import SingleFlight, TTLCache, first_question_key
+from history_store import MemoryHistoryStore
+
+
+def test_key_ignores_whitespace_and_unrelated_fields():
+    base = {"name": "张三", "technicalSkills": "Python  Flask"}
+    noisy = {"name": " 张三 ", "technicalSkills": "Python Flask", "phone": "123", "major": ""}
+    assert first_question_key(base, "m") == first_question_key(noisy, "m")
+    assert first_question_key(base, "m") != first_question_key(base, "other")
+
+
+def test_expired_entries_miss(tmp_path):
+    cache = TTLCache(ttl_seconds=0.05, persist_dir=str(tmp_path))
+    cache.put("k", "问题")
+    assert cache.get("k") == "问题"
+    time.sleep(0.1)
+    assert cache.get("k") is None
+    assert not os.path.exists(tmp_path / "k.json")
+
+
+def test_disk_tier_is_capped(tmp_path):
+    cache = TTLCache(max_entries=2, persist_dir=str(tmp_path), max_disk_entries=3)
+    for i in range(10):
+        cache.put(f"k{i}", f"问题{i}")
+        # 保证修改时间可区分写入顺序
+        os.utime(tmp_path / f"k{i}.json", (1000 + i, time.time() - 100 + i))
+    files = sorted(name for name in os.listdir(tmp_path) if name.endswith(".json"))
+    assert len(files) <= 4
+    assert "k9.json" in files
+    assert "k0.json" not in files
+    assert cache.stats()["disk_removed"] >= 6
+
+
+def test_sweep_removes_expired_files_on_write(tmp_path):
+    stale = tmp_path / "stale.json"
+    stale.write_text('{"value": "旧问题", "expires_at": 0}', encoding="utf-8")
+    os.utime(stale, (0, 0))
+    leftover = tmp_path / "k.json.1.2.tmp"
+    leftover.write_text("{", encoding="utf-8")
+    os.utime(leftover, (0, 0))
+
+    cache = TTLCache(ttl_seconds=60, persist_dir=str(tmp_path))
+    cache.put("fresh", "新问题")
+    assert sorted(os.listdir(tmp_path)) == ["fresh.json"]
+
+    # 重启后仍然从磁盘命中
+    assert TTLCache(persist_dir=str(tmp_path)).get("fresh") == "新问题"
+
+
+def test_single_flight_shares_one_call():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return "问题"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", fn))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    while flight.stats()["coalesced"] < 3:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == ["问题"] * 4
+    assert len(calls) == 1
+
+
+class EmptyStreamService(ChatService):
+    def _stream_completion(self, data):
+        return iter(())
+
+
+def make_service(cls, flight):
+    runtime = ChatRuntime(client=None, store=MemoryHistoryStore(), context_window=ContextWindow(),
+                          first_question_cache=TTLCache(), first_question_flight=flight)
+    return cls(runtime, session_id="s")
+
+
+def test_empty_stream_is_not_cached():
+    flight = SingleFlight()
+    service = make_service(EmptyStreamService, flight)
+    resume = {"name": "张三", "targetPosition": "后端工程师"}
+
+    kind, result = list(service.stream_first_question(resume))[-1]
+    assert kind == "done"
+    assert result["success"] is False
+    # 回退到默认问题，且空结果既不缓存也不留下进行中的调用
+    assert result["question"]
+    assert service.runtime.first_question_cache.get(first_question_key(resume, "generalv3.5")) is None
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_empty_stream_wakes_waiters_with_error():
+    flight = SingleFlight()
+    resume = {"name": "张三"}
+    key = first_question_key(resume, "generalv3.5")
+    leader = make_service(EmptyStreamService, flight)
+    events = leader.stream_first_question(resume)
+
+    # 先让领头者登记 flight 但暂停在读取上游之前
+    started = threading.Event()
+    original = EmptyStreamService._stream_completion
+
+    waiter = make_service(EmptyStreamService, flight)
+    outcome = []
+
+    def wait():
+        started.wait(5)
+        outcome.extend(waiter.stream_first_question(resume))
+
+    thread = threading.Thread(target=wait)
+    thread.start()
+
+    def paused(self, data):
+        started.set()
+        while flight.stats()["coalesced"] < 1:
+            time.sleep(0.01)
+        return original(self, data)
+
+    leader._stream_completion = paused.__get__(leader)
+    leader_events = list(events)
+    thread.join(5)
+
+    assert leader_events[-1][1]["success"] is False
+    assert outcome[-1][0] == "done"
+    assert outcome[-1][1]["success"] is False
+    assert "空" in outcome[-1][1]["error"]
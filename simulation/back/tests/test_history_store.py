@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""对话历史存储：分页游标、write-behind 读取和 ChatService 的窗口尾部"""
+
+import pytest
+
+from chat_service import ChatRuntime, ChatService
+from context_builder import ContextWindow
+from history_store import MemoryHistoryStore, SQLiteHistoryStore
+
+
+def message(i, role="user"):
+    return {"role": role, "content": f"消息{i}", "timestamp": f"2024-01-01T00:00:{i:02d}"}
+
+
+def walk_pages(store, session_id, limit):
+    """沿 nextCursor 读完全部历史，返回按时间顺序排列的内容"""
+    pages = []
+    cursor = None
+    while True:
+        page, cursor, total = store.page(session_id, limit=limit, before=cursor)
+        pages.insert(0, [m["content"] for m in page])
+        if cursor is None:
+            return [c for p in pages for c in p], total
+
+
+@pytest.fixture
+def sqlite_store(tmp_path):
+    # 批次和提交间隔足够大，测试期间后台线程不会自行提交
+    store = SQLiteHistoryStore(path=str(tmp_path / "history.db"), batch_size=1000, flush_interval=30)
+    yield store
+    store.close()
+
+
+def test_memory_store_pages_with_cursor():
+    store = MemoryHistoryStore()
+    for i in range(7):
+        store.append("s", message(i))
+    contents, total = walk_pages(store, "s", limit=3)
+    assert contents == [f"消息{i}" for i in range(7)]
+    assert total == 7
+
+
+def test_memory_store_evicts_least_recent_session():
+    store = MemoryHistoryStore(max_sessions=2)
+    store.append("a", message(0))
+    store.append("b", message(1))
+    store.append("c", message(2))
+    assert store.load("a") == []
+    assert store.load("c")[0]["content"] == "消息2"
+
+
+def test_sqlite_reads_pending_writes_without_flushing(sqlite_store):
+    sqlite_store.append("s", message(0))
+    sqlite_store.save_resume("s", {"name": "张三"})
+
+    assert [m["content"] for m in sqlite_store.load("s")] == ["消息0"]
+    assert sqlite_store.load_resume("s") == {"name": "张三"}
+    page, cursor, total = sqlite_store.page("s")
+    assert [(m["id"], m["content"]) for m in page] == [(None, "消息0")]
+    assert (cursor, total) == (None, 1)
+    # 读取没有触发提交
+    assert sqlite_store.stats()["written"] == 0
+
+
+def test_sqlite_pending_clear_hides_committed_rows(sqlite_store):
+    sqlite_store.append("s", message(0))
+    sqlite_store.save_resume("s", {"name": "张三"})
+    sqlite_store.flush()
+    sqlite_store.clear("s")
+    sqlite_store.append("s", message(1))
+
+    assert [m["content"] for m in sqlite_store.load("s")] == ["消息1"]
+    assert sqlite_store.load_resume("s") is None
+    assert sqlite_store.page("s")[2] == 1
+
+    sqlite_store.flush()
+    assert [m["content"] for m in sqlite_store.load("s")] == ["消息1"]
+    assert sqlite_store.load_resume("s") is None
+
+
+def test_sqlite_pages_across_committed_and_pending(sqlite_store):
+    for i in range(5):
+        sqlite_store.append("s", message(i))
+    sqlite_store.flush()
+    for i in range(5, 7):
+        sqlite_store.append("s", message(i))
+    sqlite_store.append("other", message(99))
+
+    for limit in (1, 2, 3, 10):
+        contents, total = walk_pages(sqlite_store, "s", limit)
+        assert contents == [f"消息{i}" for i in range(7)], limit
+        assert total == 7
+
+    sqlite_store.flush()
+    page, _, _ = sqlite_store.page("s", limit=2)
+    assert all(m["id"] is not None for m in page)
+
+
+def test_sqlite_page_size_holds_with_many_pending_writes(sqlite_store):
+    for i in range(30):
+        sqlite_store.append("s", message(i))
+
+    page, cursor, total = sqlite_store.page("s", limit=10)
+    assert [m["content"] for m in page] == [f"消息{i}" for i in range(20, 30)]
+    assert all(m["id"] is not None for m in page)
+    assert cursor is not None and total == 30
+
+    contents, total = walk_pages(sqlite_store, "s", limit=10)
+    assert contents == [f"消息{i}" for i in range(30)]
+
+
+def test_sqlite_reads_query_outside_the_pending_lock(sqlite_store):
+    sqlite_store.append("s", message(0))
+    calls = []
+
+    def query(conn, view):
+        calls.append(sqlite_store._pending_lock.locked())
+        if len(calls) == 1:
+            # 查询期间后台线程提交了待写消息：快照已过期，需要重新读取
+            sqlite_store.flush()
+        committed = conn.execute("SELECT COUNT(*) FROM messages WHERE session_id = ?", ("s",)).fetchone()[0]
+        return committed, len(view[1])
+
+    assert sqlite_store._read("s", query) == (1, 0)
+    assert calls == [False, False]
+
+
+class InlineExecutor:
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+class FailingClient:
+    def post_json(self, data):
+        raise RuntimeError("上游不可用")
+
+
+def test_chat_service_keeps_only_the_window_tail():
+    store = MemoryHistoryStore()
+    runtime = ChatRuntime(client=FailingClient(), store=store,
+                          context_window=ContextWindow(token_budget=60, summary_tokens=30, fold_batch=2),
+                          first_question_cache=None, first_question_flight=None,
+                          summary_executor=InlineExecutor())
+    service = ChatService(runtime, session_id="s")
+    for i in range(40):
+        service._prepare_chat(f"第{i}个回答" * 3, "generalv3.5")
+        service._finish_chat(f"第{i}个问题" * 3, {}, "generalv3.5")
+
+    assert len(store.load("s")) == 80
+    assert len(service.conversation_history) < 10
+    assert service.history_offset + len(service.conversation_history) == 80
+    assert service.summary.covered >= service.history_offset
+
+    messages = service._build_chat_messages()
+    assert messages[-1]["content"] == "第39个问题" * 3
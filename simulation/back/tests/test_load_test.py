@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""压测工具：模拟上游的延迟分布与统计，以及 load_test 对同步服务的冒烟压测"""
+
+import asyncio
+import json
+import threading
+import urllib.request
+
+import pytest
+from werkzeug.serving import make_server
+
+import app as sync_app
+import load_test
+from admission import AdmissionController
+from first_question_cache import SingleFlight, TTLCache
+from mock_spark_server import parse_distribution
+from spark_client import SparkClient
+
+
+def test_parse_distribution():
+    assert parse_distribution("fixed:0.5")() == 0.5
+    assert all(0.2 <= parse_distribution("uniform:0.2,1.0")() <= 1.0 for _ in range(100))
+    assert all(parse_distribution("normal:0.1,1")() >= 0 for _ in range(100))
+    assert all(parse_distribution(spec)() > 0 for spec in ("lognormal:0.8,0.5", "exponential:0.8"))
+    with pytest.raises(ValueError):
+        parse_distribution("pareto:1")
+
+
+@pytest.fixture
+def backend(mock_spark, monkeypatch):
+    """同步服务接到模拟上游，在后台线程中监听随机端口"""
+    upstream = mock_spark("--reply-chars", "24", "--seed", "1")
+    spark = SparkClient(upstream + "/v1/chat/completions", "test-key")
+    monkeypatch.setattr(sync_app.chat_runtime, "client", spark)
+    monkeypatch.setattr(sync_app.chat_runtime, "first_question_cache", TTLCache())
+    monkeypatch.setattr(sync_app.chat_runtime, "first_question_flight", SingleFlight())
+    monkeypatch.setattr(sync_app, "spark_client", spark)
+    monkeypatch.setattr(sync_app, "admission", AdmissionController(max_concurrency=4))
+
+    server = make_server("127.0.0.1", 0, sync_app.app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}", upstream
+    server.shutdown()
+    thread.join(10)
+    spark.close()
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_load_test_smoke(backend, stream):
+    base_url, upstream = backend
+    argv = ["--base-url", base_url, "--interviews", "3", "--concurrency", "2", "--turns", "2", "--timeout", "30"]
+    args = load_test.build_parser().parse_args(argv + (["--stream"] if stream else []))
+    report = asyncio.run(load_test.run(args))
+
+    endpoints = report["endpoints"]
+    assert endpoints["/api/interview/start"]["requests"] == 3
+    assert endpoints["/api/chat"]["requests"] == 6
+    assert all(item["failures"] == 0 and item["statuses"] == {"200": item["requests"]} for item in endpoints.values())
+    assert ("first_delta_p50_ms" in endpoints["/api/chat"]) == stream
+    assert report["server"]["admission"]["admitted"] == 9
+    assert report["server"]["upstream"]["requests"] == 9
+    load_test.print_report(report)
+
+    with urllib.request.urlopen(upstream + "/stats") as response:
+        stats = json.load(response)
+    assert stats["requests"] == stats["ok"] == 9
+    assert stats["stream_requests"] == (9 if stream else 0)
+    assert stats["in_flight"] == 0
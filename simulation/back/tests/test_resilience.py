@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""容错策略：重试、对冲、熔断和半开探测"""
+
+import asyncio
+import threading
+
+import pytest
+
+from resilience import CircuitBreaker, CircuitOpenError, HedgePolicy, Resilience, RetryPolicy
+
+
+class Flaky(Exception):
+    pass
+
+
+def retryable(error):
+    return isinstance(error, Flaky)
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.allow()
+        breaker.record_failure()
+    assert breaker.is_open()
+
+
+def test_retry_until_success():
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) < 3:
+            raise Flaky()
+        return "ok"
+
+    resilience = Resilience(retry=RetryPolicy(max_retries=2, base_delay=0, max_delay=0))
+    assert resilience.call(fn, retryable) == "ok"
+    assert resilience.stats()["retries"] == 2
+
+
+def test_non_retryable_error_is_raised_once():
+    calls = []
+
+    def fn():
+        calls.append(1)
+        raise ValueError("bad request")
+
+    resilience = Resilience(retry=RetryPolicy(max_retries=3, base_delay=0), breaker=CircuitBreaker())
+    with pytest.raises(ValueError):
+        resilience.call(fn, retryable)
+    assert len(calls) == 1
+    # 不可重试的错误说明上游可达，不计入熔断
+    assert resilience.breaker.stats()["consecutive_failures"] == 0
+
+
+def test_breaker_opens_and_rejects_until_recovery():
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=60)
+    open_breaker(breaker)
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_half_open_allows_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0)
+    open_breaker(breaker)
+    breaker.allow()
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.allow()
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=0)
+    open_breaker(breaker)
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open()
+    assert breaker.stats()["opened"] == 2
+
+
+def test_cancelled_async_probe_releases_slot():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0)
+    resilience = Resilience(breaker=breaker)
+    open_breaker(breaker)
+
+    async def main():
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.sleep(60)
+
+        probe = asyncio.ensure_future(resilience.acall(hang, retryable, hedge=False))
+        await started.wait()
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        async def ok():
+            return "ok"
+
+        # 被取消的探测不计成败，下一个请求可以重新探测
+        return await resilience.acall(ok, retryable, hedge=False)
+
+    assert asyncio.run(main()) == "ok"
+    assert breaker.state == "closed"
+
+
+def test_interrupted_sync_probe_releases_slot():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0)
+    resilience = Resilience(breaker=breaker)
+    open_breaker(breaker)
+
+    def interrupted():
+        raise KeyboardInterrupt()
+
+    with pytest.raises(KeyboardInterrupt):
+        resilience.call(interrupted, retryable, hedge=False)
+    assert breaker.state == "half_open"
+    assert resilience.call(lambda: "ok", retryable, hedge=False) == "ok"
+
+
+def hedging(max_workers):
+    hedge = HedgePolicy(min_samples=1, min_delay=0.05, max_ratio=1.0)
+    hedge.observe(0.01)
+    return Resilience(hedge=hedge, max_workers=max_workers)
+
+
+def test_slow_primary_is_hedged():
+    resilience = hedging(max_workers=2)
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) == 1:
+            release.wait(5)
+            return "primary"
+        return "hedge"
+
+    try:
+        assert resilience.call(fn, retryable) == "hedge"
+    finally:
+        release.set()
+    stats = resilience.stats()
+    assert (stats["hedges"], stats["hedge_wins"]) == (1, 1)
+    resilience.close()
+
+
+def test_full_hedge_pool_runs_calls_on_the_caller_thread():
+    resilience = hedging(max_workers=1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocked():
+        started.set()
+        release.wait(5)
+        return "slow"
+
+    background = threading.Thread(target=resilience.call, args=(blocked, retryable))
+    background.start()
+    try:
+        assert started.wait(5)
+        # 唯一的线程被占用：新的调用不排队，直接在调用方线程中执行
+        caller = []
+        assert resilience.call(lambda: caller.append(threading.current_thread()) or "fast", retryable) == "fast"
+        assert caller == [threading.current_thread()]
+        assert resilience.stats()["hedge_pool_full"] >= 1
+    finally:
+        release.set()
+        background.join(5)
+    resilience.close()
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""同步与异步服务模式的模块边界"""
+
+import os
+import subprocess
+import sys
+
+BACK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _run(code):
+    return subprocess.run([sys.executable, "-c", code], cwd=BACK_DIR,
+                          capture_output=True, text=True, timeout=60)
+
+
+def test_shared_modules_have_no_runtime_side_effects():
+    result = _run(
+        "import sys, threading, config, chat_service\n"
+        "assert 'app' not in sys.modules and 'flask' not in sys.modules\n"
+        "assert threading.active_count() == 1, threading.enumerate()\n"
+    )
+    assert result.returncode == 0, result.stderr
+
+
+def test_async_mode_does_not_import_sync_app():
+    result = _run(
+        "import sys, async_app\n"
+        "assert 'app' not in sys.modules, 'async_app 导入了 app'\n"
+        "assert 'flask' not in sys.modules\n"
+    )
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""SessionRegistry：创建、LRU 淘汰、TTL 过期和会话锁"""
+
+import threading
+import time
+
+import pytest
+
+from session_store import SessionRegistry, is_valid_session_id
+
+
+class FakeService:
+    def __init__(self, session_id):
+        self.session_id = session_id
+
+
+def test_session_id_validation():
+    assert is_valid_session_id("abc_DEF-123")
+    assert not is_valid_session_id("")
+    assert not is_valid_session_id("a" * 65)
+    assert not is_valid_session_id("../etc")
+
+
+def test_get_creates_once_and_reuses():
+    registry = SessionRegistry(FakeService)
+    first = registry.get("s1")
+    assert registry.get("s1") is first
+    assert registry.get("missing", create=False) is None
+    assert registry.stats()["created"] == 1
+
+
+def test_lru_eviction_skips_busy_sessions():
+    evicted = []
+    registry = SessionRegistry(FakeService, max_sessions=2,
+                               on_evict=lambda session_id, service: evicted.append(session_id))
+    busy = registry.get("busy")
+    registry.get("idle")
+    with busy.lock:
+        registry.get("new")
+    # 最久未访问的 busy 正在处理请求，淘汰下一个空闲会话
+    assert evicted == ["idle"]
+    assert "busy" in registry and "new" in registry
+    assert registry.stats()["evicted"] == 1
+
+
+def test_idle_sessions_expire():
+    registry = SessionRegistry(FakeService, ttl_seconds=0.05)
+    registry.get("old")
+    time.sleep(0.1)
+    registry.get("fresh")
+    assert "old" not in registry
+    assert registry.stats()["expired"] == 1
+
+
+def test_session_missing_without_create_raises():
+    registry = SessionRegistry(FakeService)
+    with pytest.raises(KeyError):
+        with registry.session("nobody", create=False):
+            pass
+
+
+def test_waiter_does_not_reuse_entry_discarded_while_waiting():
+    """等锁期间会话被移除，等待方应拿到新实例而不是已失效的旧实例"""
+    registry = SessionRegistry(FakeService)
+    seen = []
+    entered = threading.Event()
+    release = threading.Event()
+
+    def holder():
+        with registry.session("s") as service:
+            seen.append(service)
+            entered.set()
+            release.wait(5)
+            registry.discard("s")
+
+    def waiter():
+        with registry.session("s") as service:
+            seen.append(service)
+
+    first = threading.Thread(target=holder)
+    first.start()
+    entered.wait(5)
+    second = threading.Thread(target=waiter)
+    second.start()
+    time.sleep(0.05)
+    release.set()
+    first.join(5)
+    second.join(5)
+
+    assert len(seen) == 2
+    assert seen[0] is not seen[1]
+    assert registry.get("s", create=False).service is seen[1]
+
+
+def test_slow_factory_does_not_block_other_sessions():
+    started = threading.Event()
+    release = threading.Event()
+
+    def factory(session_id):
+        if session_id == "slow":
+            started.set()
+            release.wait(5)
+        return FakeService(session_id)
+
+    registry = SessionRegistry(factory)
+    worker = threading.Thread(target=registry.get, args=("slow",))
+    worker.start()
+    assert started.wait(5)
+    # 慢会话还在加载时，其它会话的创建和查找不受影响
+    begin = time.monotonic()
+    registry.get("fast")
+    assert time.monotonic() - begin < 1
+    release.set()
+    worker.join(5)
+    assert "slow" in registry and "fast" in registry
+
+
+def test_concurrent_creation_keeps_a_single_service():
+    barrier = threading.Barrier(4)
+
+    def factory(session_id):
+        barrier.wait(5)
+        return FakeService(session_id)
+
+    registry = SessionRegistry(factory)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("s"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert len({id(service) for service in results}) == 1
+    assert len(registry) == 1
+
+
+def test_aget_runs_factory_off_the_event_loop():
+    import asyncio
+
+    factory_threads = []
+
+    def factory(session_id):
+        factory_threads.append(threading.get_ident())
+        return FakeService(session_id)
+
+    registry = SessionRegistry(factory)
+
+    async def main():
+        service = await registry.aget("s")
+        assert await registry.aget("s") is service
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(main())
+    assert factory_threads and factory_threads[0] != loop_thread
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""上游客户端：连接池统计、流式响应的 in_flight 计数，以及上游 SSE 行的解析"""
+
+import asyncio
+import json
+
+import pytest
+import requests
+
+from chat_service import ChatService
+from spark_client import AsyncSparkClient, SparkClient
+
+parse = ChatService._parse_stream_line
+
+
+def data_line(chunk):
+    return f"data: {json.dumps(chunk, ensure_ascii=False)}"
+
+
+def test_parse_delta_and_usage():
+    chunk = {
+        "code": 0,
+        "choices": [{"delta": {"content": "你好"}}, {"delta": {"content": ""}}, {"delta": None}],
+        "usage": {"total_tokens": 3}
+    }
+    assert parse(data_line(chunk)) == [("delta", "你好"), ("usage", {"total_tokens": 3})]
+
+
+def test_parse_ignores_non_data_lines():
+    assert parse("") == []
+    assert parse(": keep-alive") == []
+    assert parse("event: message") == []
+
+
+def test_parse_done_ends_the_stream():
+    assert parse("data: [DONE]") is None
+    assert parse("  data:[DONE]  ") is None
+
+
+def test_parse_raises_on_business_error():
+    with pytest.raises(RuntimeError, match="模拟错误"):
+        parse(data_line({"code": 10013, "message": "模拟错误"}))
+
+
+def request_body(stream=False):
+    return {"model": "generalv3.5", "messages": [{"role": "user", "content": "你好"}], "stream": stream}
+
+
+@pytest.fixture
+def api_url(mock_spark):
+    return mock_spark("--reply-chars", "12") + "/v1/chat/completions"
+
+
+def test_requests_reuse_pooled_connections(api_url):
+    client = SparkClient(api_url, "test-key")
+    try:
+        for _ in range(5):
+            assert client.post_json(request_body())["choices"][0]["message"]["content"]
+        stats = client.stats()
+    finally:
+        client.close()
+    assert (stats["requests"], stats["errors"], stats["in_flight"]) == (5, 0, 0)
+    assert stats["connections_opened"] == 1
+    assert stats["connection_reuse_ratio"] == 0.8
+    assert stats["pools"][0]["requests"] == 5
+    assert stats["pools"][0]["idle_connections"] == 1
+
+
+def test_stream_stays_in_flight_until_closed(api_url):
+    client = SparkClient(api_url, "test-key")
+    try:
+        with client.open_stream(request_body(stream=True)) as response:
+            assert client.stats()["in_flight"] == 1
+            lines = [line.decode("utf-8") for line in response.iter_lines() if line]
+            assert client.stats()["in_flight"] == 1
+        assert client.stats()["in_flight"] == 0
+        # 重复关闭不会重复减少
+        response.close()
+        assert client.stats()["in_flight"] == 0
+    finally:
+        client.close()
+    assert lines[-1] == "data: [DONE]"
+    deltas = [text for line in lines for kind, text in (parse(line) or []) if kind == "delta"]
+    assert len("".join(deltas)) == 12
+
+
+def test_failed_requests_are_counted(mock_spark):
+    url = mock_spark("--server-error-rate", "1") + "/v1/chat/completions"
+    client = SparkClient(url, "test-key")
+    try:
+        with pytest.raises(requests.exceptions.HTTPError):
+            client.open_stream(request_body(stream=True))
+        stats = client.stats()
+    finally:
+        client.close()
+    # 500 不重试：只发出一次请求，关闭错误响应后不再计入 in_flight
+    assert (stats["requests"], stats["in_flight"]) == (1, 0)
+
+
+def test_async_client_counts_streams_until_consumed(api_url):
+    async def scenario():
+        client = AsyncSparkClient(api_url, "test-key")
+        try:
+            assert (await client.post_json(request_body()))["choices"]
+            in_flight = []
+            lines = []
+            async for line in client.stream_lines(request_body(stream=True)):
+                in_flight.append(client.stats()["in_flight"])
+                lines.append(line)
+            return client.stats(), in_flight, lines
+        finally:
+            await client.close()
+
+    stats, in_flight, lines = asyncio.run(scenario())
+    assert set(in_flight) == {1}
+    assert lines[-1] == "data: [DONE]"
+    assert (stats["requests"], stats["errors"], stats["in_flight"]) == (2, 0, 0)
+    assert stats["connector_ready"]
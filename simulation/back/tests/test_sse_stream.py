@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""同步服务的 SSE 接口：事件格式、session/delta/done/error 事件顺序，以及客户端中途断开时释放准入名额"""
+
+import json
+import uuid
+
+import pytest
+
+import app as sync_app
+from admission import AdmissionController
+from chat_service import ChatService, format_sse
+from first_question_cache import SingleFlight, TTLCache
+from spark_client import SparkClient
+
+RESUME = {"name": "张三", "targetPosition": "后端开发工程师", "education": "本科"}
+
+
+def parse_events(body):
+    """把 SSE 响应体拆成 [(事件类型, 数据)]"""
+    events = []
+    for block in body.split("\n\n"):
+        if not block:
+            continue
+        event, data = block.split("\n")
+        assert event.startswith("event: ") and data.startswith("data: ")
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+def test_format_sse():
+    assert format_sse("delta", {"content": "你好"}) == 'event: delta\ndata: {"content": "你好"}\n\n'
+
+
+@pytest.fixture
+def upstream(mock_spark, monkeypatch):
+    """把同步服务的上游客户端、准入控制和第一个问题缓存换成测试专用的实例"""
+    def start(*argv):
+        client = SparkClient(mock_spark("--reply-chars", "12", *argv) + "/v1/chat/completions", "test-key")
+        monkeypatch.setattr(sync_app.chat_runtime, "client", client)
+        monkeypatch.setattr(sync_app.chat_runtime, "first_question_cache", TTLCache())
+        monkeypatch.setattr(sync_app.chat_runtime, "first_question_flight", SingleFlight())
+        clients.append(client)
+        return client
+
+    clients = []
+    monkeypatch.setattr(sync_app, "admission", AdmissionController(max_concurrency=4))
+    yield start
+    for client in clients:
+        client.close()
+
+
+@pytest.fixture
+def client():
+    return sync_app.app.test_client()
+
+
+def session_id():
+    return f"sse-{uuid.uuid4().hex[:12]}"
+
+
+def post_stream(client, path, body, sid, **kwargs):
+    return client.post(path, json=dict(body, stream=True), headers={"X-Session-Id": sid}, **kwargs)
+
+
+def test_chat_stream_event_sequence(upstream, client):
+    upstream()
+    sid = session_id()
+    response = post_stream(client, "/api/chat", {"message": "请开始"}, sid)
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    assert response.headers["X-Accel-Buffering"] == "no"
+
+    events = parse_events(response.get_data(as_text=True))
+    names = [name for name, _ in events]
+    assert names[0] == "session" and names[-1] == "done"
+    assert set(names[1:-1]) == {"delta"}
+    assert events[0][1] == {"sessionId": sid}
+
+    done = events[-1][1]
+    assert done["success"] and done["sessionId"] == sid
+    assert done["response"] == "".join(payload["content"] for name, payload in events if name == "delta")
+    assert len(done["response"]) == 12
+    assert sync_app.admission.stats()["active"] == 0
+
+
+def test_start_interview_stream_matches_json_payload(upstream, client):
+    upstream()
+    sid = session_id()
+    events = parse_events(post_stream(client, "/api/interview/start", {"resume": RESUME}, sid).get_data(as_text=True))
+    assert [name for name, _ in events][0] == "session"
+    done = events[-1]
+    assert done[0] == "done" and done[1]["success"]
+    assert done[1]["firstQuestion"] == "".join(p["content"] for name, p in events if name == "delta")
+
+    # 第二次命中缓存：完整问题作为一个 delta 推送
+    events = parse_events(post_stream(client, "/api/interview/start", {"resume": RESUME}, sid).get_data(as_text=True))
+    assert [name for name, _ in events] == ["session", "delta", "done"]
+    assert events[2][1]["firstQuestion"] == done[1]["firstQuestion"]
+
+
+def test_upstream_stream_error_ends_with_a_failed_done(upstream, client):
+    upstream("--stream-error-rate", "1")
+    events = parse_events(post_stream(client, "/api/chat", {"message": "请开始"}, session_id()).get_data(as_text=True))
+    name, done = events[-1]
+    assert name == "done"
+    assert not done["success"] and "模拟的流式业务错误" in done["error"]
+    assert sync_app.admission.stats()["active"] == 0
+
+
+def test_unexpected_exception_becomes_an_error_event(upstream, client, monkeypatch):
+    upstream()
+
+    def broken(self, user_message, model="generalv3.5"):
+        raise RuntimeError("服务故障")
+        yield
+
+    monkeypatch.setattr(ChatService, "stream_spark_response", broken)
+    sid = session_id()
+    events = parse_events(post_stream(client, "/api/chat", {"message": "请开始"}, sid).get_data(as_text=True))
+    assert [name for name, _ in events] == ["session", "error"]
+    assert events[1][1] == {"success": False, "error": "服务器内部错误: 服务故障", "sessionId": sid}
+    assert sync_app.admission.stats()["active"] == 0
+
+
+def test_disconnect_mid_stream_releases_admission_and_upstream(upstream, client):
+    spark = upstream("--reply-chars", "400", "--token-interval", "0.01")
+    sid = session_id()
+    response = post_stream(client, "/api/chat", {"message": "请开始"}, sid, buffered=False)
+    chunks = iter(response.response)
+    assert next(chunks).decode("utf-8").startswith("event: session")
+    assert next(chunks).decode("utf-8").startswith("event: delta")
+    assert sync_app.admission.stats()["active"] == 1
+    assert spark.stats()["in_flight"] == 1
+
+    # 客户端断开：WSGI 服务器关闭响应
+    response.close()
+    assert sync_app.admission.stats()["active"] == 0
+    assert spark.stats()["in_flight"] == 0
+
+    # 会话锁已释放，同一会话可以继续对话
+    events = parse_events(post_stream(client, "/api/chat", {"message": "继续"}, sid).get_data(as_text=True))
+    assert events[-1][0] == "done" and events[-1][1]["success"]
+
+
+def test_disconnect_before_the_first_event_releases_admission(upstream, client):
+    upstream()
+    response = post_stream(client, "/api/chat", {"message": "请开始"}, session_id(), buffered=False)
+    assert sync_app.admission.stats()["active"] == 1
+    response.close()
+    assert sync_app.admission.stats()["active"] == 0
@@ -4,7 +4,7 @@
 情绪识别API服务 - 基于DAiSEE模型的视频情绪分析
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, g, request, jsonify
 from flask_cors import CORS
 import torch
 import torch.nn as nn
@@ -14,8 +14,22 @@ import tempfile
 import os
 from datetime import datetime
 import logging
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 import time
+import sys
+
+# 分阶段耗时统计和输入预算与 emotion_api_package 共用同一份实现，直接从该目录导入；
+# 两个服务分开部署时用环境变量 EMOTION_API_PACKAGE_DIR 指定 emotion_api_package 的位置
+SHARED_MODULE_DIR = os.path.abspath(os.environ.get('EMOTION_API_PACKAGE_DIR', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, 'emotion_api_package')))
+if SHARED_MODULE_DIR not in sys.path:
+    # 追加在末尾，本目录下的同名模块（如 start_api）优先
+    sys.path.append(SHARED_MODULE_DIR)
+
+import stage_timing
+from input_budget import InputBudgetError, VideoBudget, check_deadline, probe
+from stage_timing import LatencyHistograms, ProfileCapture, stage
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -67,11 +81,18 @@ class SimpleCNN3D(nn.Module):
         # 映射到0-3范围
         return output * 3.0
 
+# 输入预算：只读取容器头信息即可判断，超出时在解码任何帧之前拒绝（与 emotion_api_package 共用 input_budget.py）
+INPUT_BUDGET = VideoBudget()
+# 表单上传超过上限时 Flask 在读取请求体之前即拒绝（留出表单字段的余量）
+app.config['MAX_CONTENT_LENGTH'] = INPUT_BUDGET.max_bytes + 1024 * 1024
+
 class VideoProcessor:
     """视频处理器"""
-    def __init__(self, sequence_length=16, target_size=(224, 224)):
+    def __init__(self, sequence_length=16, target_size=(224, 224), max_frames=101, budget=None):
         self.sequence_length = sequence_length
         self.target_size = target_size
+        self.max_frames = max_frames  # 只处理视频开头的帧数
+        self.budget = budget or INPUT_BUDGET  # 体积、分辨率、时长和解码耗时上限
         
         # 初始化人脸检测器
         try:
@@ -80,125 +101,120 @@ class VideoProcessor:
             logger.warning("无法加载人脸检测器，将使用全帧处理")
             self.face_cascade = None
     
-    def extract_frames_from_video(self, video_data):
-        """从视频数据中提取帧"""
+    def _open_video(self, temp_video_path):
+        """依次尝试各个后端打开视频并读取第一帧，返回 (cap, 第一帧)，全部失败时返回 (None, None)"""
+        for backend in [cv2.CAP_FFMPEG, cv2.CAP_ANY]:
+            cap = None
+            try:
+                with stage('open'):
+                    cap = cv2.VideoCapture(temp_video_path, backend)
+                    opened = cap.isOpened()
+                if not opened:
+                    logger.warning(f"无法打开视频文件 (backend={backend})")
+                    cap.release()
+                    continue
+                
+                info = probe(cap)
+                logger.info(f"✅ 视频成功打开 (backend={backend})")
+                logger.info(f"   编码: {info['codec']}, 分辨率: {info['width']}x{info['height']}")
+                logger.info(f"   FPS: {info['fps']}, 总帧数: {info['frame_count']}, 时长: {info['duration']}")
+                self.budget.check(info)
+                
+                # 读取第一帧验证，读到的帧直接作为第0帧使用，不再回退重读
+                with stage('decode'):
+                    ret, frame = cap.read()
+                if ret and frame is not None:
+                    return cap, frame
+                logger.warning(f"无法读取帧数据 (backend={backend})")
+                cap.release()
+            except InputBudgetError:
+                cap.release()
+                raise
+            except Exception as be:
+                logger.warning(f"Backend {backend} 失败: {be}")
+                if cap is not None:
+                    cap.release()
+        return None, None
+    
+    def extract_frames_from_video(self, video_data, ext='.mp4'):
+        """从视频数据中提取帧
+        
+        Args:
+            video_data: 视频字节
+            ext: 上传文件的扩展名，用作临时文件后缀
+        
+        Raises:
+            InputBudgetError: 视频体积、分辨率、时长或解码耗时超出预算
+        """
+        temp_video_path = None
+        cap = None
         try:
             logger.info(f"开始处理视频数据，大小: {len(video_data)} bytes")
+            self.budget.check_size(len(video_data))
             
-            # 尝试多种视频格式和读取方法
-            video_extensions = ['.mp4', '.webm', '.avi', '.mkv']
-            temp_video_path = None
-            cap = None
+            # 只写一次临时文件，FFmpeg 按内容识别格式，不依赖扩展名
+            with stage('tempfile'):
+                with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as temp_file:
+                    temp_file.write(video_data)
+                    temp_video_path = temp_file.name
             
-            for ext in video_extensions:
-                try:
-                    # 保存临时视频文件
-                    with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as temp_file:
-                        temp_file.write(video_data)
-                        temp_video_path = temp_file.name
-                    
-                    logger.info(f"尝试使用格式 {ext}, 文件路径: {temp_video_path}")
-                    
-                    # 尝试多种OpenCV读取方式
-                    backends = [cv2.CAP_FFMPEG, cv2.CAP_ANY]
-                    
-                    for backend in backends:
-                        try:
-                            cap = cv2.VideoCapture(temp_video_path, backend)
-                            
-                            # 检查视频是否正常打开
-                            if cap.isOpened():
-                                fps = cap.get(cv2.CAP_PROP_FPS)
-                                frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-                                width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-                                height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-                                
-                                logger.info(f"✅ 视频成功打开 ({ext}, backend={backend})")
-                                logger.info(f"   分辨率: {width}x{height}")
-                                logger.info(f"   FPS: {fps}")
-                                logger.info(f"   总帧数: {frame_count}")
-                                
-                                # 尝试读取第一帧验证
-                                ret, frame = cap.read()
-                                if ret and frame is not None:
-                                    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # 重置到开始
-                                    break
-                                else:
-                                    logger.warning(f"无法读取帧数据 ({ext}, backend={backend})")
-                                    cap.release()
-                                    cap = None
-                            else:
-                                logger.warning(f"无法打开视频文件 ({ext}, backend={backend})")
-                                if cap:
-                                    cap.release()
-                                    cap = None
-                        except Exception as be:
-                            logger.warning(f"Backend {backend} 失败: {be}")
-                            if cap:
-                                cap.release()
-                                cap = None
-                    
-                    if cap and cap.isOpened():
-                        break
-                    else:
-                        # 清理失败的临时文件
-                        if temp_video_path and os.path.exists(temp_video_path):
-                            os.unlink(temp_video_path)
-                        temp_video_path = None
-                        
-                except Exception as e:
-                    logger.warning(f"尝试格式 {ext} 失败: {e}")
-                    if temp_video_path and os.path.exists(temp_video_path):
-                        os.unlink(temp_video_path)
-                    temp_video_path = None
-                    continue
-            
-            if cap is None or not cap.isOpened():
+            cap, first_frame = self._open_video(temp_video_path)
+            if cap is None:
                 # 最后尝试：使用原始数据直接处理
                 logger.warning("常规方法失败，尝试应急处理...")
                 return self._emergency_frame_extraction(video_data)
             
-            # 读取视频帧
-            frames = []
-            frame_count = 0
-            
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
-                frame_count += 1
-                
-                # 人脸检测和裁剪
-                processed_frame = self.process_frame(frame)
-                if processed_frame is not None:
-                    frames.append(processed_frame)
-                
-                # 避免处理过多帧
-                if frame_count > 100:  # 最多处理100帧
-                    break
+            # 采样计划：帧数已知时只对最终会被采样的帧做人脸检测和预处理，其余帧只解码
+            total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            count = min(total, self.max_frames) if total > 0 else self.max_frames
+            if total > 0 and count > self.sequence_length:
+                selected = set(np.linspace(0, count - 1, self.sequence_length, dtype=int).tolist())
+            else:
+                selected = None  # 帧数未知或不足时处理所有读到的帧
             
-            cap.release()
-            if temp_video_path and os.path.exists(temp_video_path):
-                os.unlink(temp_video_path)  # 删除临时文件
+            deadline = self.budget.deadline()
+            frames = []
+            for position in range(count):
+                wanted = selected is None or position in selected
+                if position == 0:
+                    frame = first_frame
+                else:
+                    check_deadline(deadline)
+                    # 不需要的帧只 grab()，不取出图像
+                    with stage('decode'):
+                        if not cap.grab():
+                            break
+                        frame = cap.retrieve()[1] if wanted else None
+                if wanted and frame is not None:
+                    processed_frame = self.process_frame(frame)
+                    if processed_frame is not None:
+                        frames.append(processed_frame)
             
             logger.info(f"成功处理 {len(frames)} 帧")
             
-            return self.sample_frames(frames)
+            with stage('preprocess'):
+                return self.sample_frames(frames)
             
+        except InputBudgetError:
+            raise
         except Exception as e:
             logger.error(f"视频处理失败: {e}")
-            if 'temp_video_path' in locals() and temp_video_path and os.path.exists(temp_video_path):
-                os.unlink(temp_video_path)
             return None
+        finally:
+            if cap is not None:
+                cap.release()
+            if temp_video_path and os.path.exists(temp_video_path):
+                with stage('tempfile'):
+                    os.unlink(temp_video_path)  # 删除临时文件
     
     def process_frame(self, frame):
         """处理单帧图像"""
         try:
             # 人脸检测
             if self.face_cascade is not None:
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                faces = self.face_cascade.detectMultiScale(gray, 1.1, 4)
+                with stage('face_detect'):
+                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                    faces = self.face_cascade.detectMultiScale(gray, 1.1, 4)
                 
                 if len(faces) > 0:
                     # 使用最大的人脸
@@ -214,12 +230,13 @@ class VideoProcessor:
                     
                     frame = frame[y:y+h, x:x+w]
             
-            # 调整大小
-            frame = cv2.resize(frame, self.target_size)
-            
-            # BGR转RGB并归一化
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            frame = frame.astype(np.float32) / 255.0
+            with stage('preprocess'):
+                # 调整大小
+                frame = cv2.resize(frame, self.target_size)
+                
+                # BGR转RGB并归一化
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                frame = frame.astype(np.float32) / 255.0
             
             return frame
             
@@ -314,7 +331,8 @@ def predict_emotions(video_tensor):
                     return None
                 
                 logger.info(f"转换后形状: {video_tensor.shape}")
-                video_tensor = torch.FloatTensor(video_tensor).to(device)
+                with stage('preprocess'):
+                    video_tensor = torch.FloatTensor(video_tensor).to(device)
             
             # 验证输入维度
             expected_shape = (1, 16, 3, 224, 224)  # (batch, time, channels, height, width)
@@ -338,7 +356,8 @@ def predict_emotions(video_tensor):
             
             # 模型预测
             start_time = time.time()
-            predictions = model(video_tensor)
+            with stage('inference'):
+                predictions = model(video_tensor)
             inference_time = time.time() - start_time
             
             # 转换为numpy数组
@@ -369,6 +388,72 @@ def predict_emotions(video_tensor):
 # 初始化视频处理器
 video_processor = VideoProcessor()
 
+# 分阶段耗时统计和按需性能剖析
+latency_histograms = LatencyHistograms()
+profile_capture = ProfileCapture()
+
+# 不计时、不剖析的接口
+UNTIMED_ENDPOINTS = ('health_check', 'get_available_models', 'admin_latency', 'admin_profile')
+
+@app.before_request
+def start_timing():
+    if request.endpoint in UNTIMED_ENDPOINTS:
+        return
+    g.timings, g.timing_token = stage_timing.start_request()
+    g.profile = profile_capture.maybe_profile(request.path)
+    g.profile.__enter__()
+
+@app.after_request
+def report_timing(response):
+    """Server-Timing 响应头、响应中的 timings 字段和滚动直方图"""
+    timings = g.get('timings')
+    if timings is None:
+        return response
+    response.headers['Server-Timing'] = timings.server_timing()
+    # 前端跨域调用，需要此响应头浏览器才会向页面暴露 Server-Timing
+    response.headers['Timing-Allow-Origin'] = '*'
+    latency_histograms.record(timings, request.endpoint or 'unknown')
+    if response.is_json:
+        body = response.get_json(silent=True)
+        if isinstance(body, dict):
+            body['timings'] = timings.to_dict()
+            response.set_data(app.json.dumps(body))
+    return response
+
+@app.teardown_request
+def finish_timing(error=None):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile.__exit__(None, None, None)
+    token = g.pop('timing_token', None)
+    if token is not None:
+        stage_timing.finish_request(token)
+
+def admin_allowed():
+    # 管理接口只接受本机请求
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+@app.route('/api/admin/latency', methods=['GET'])
+def admin_latency():
+    """各接口分阶段延迟的滚动统计"""
+    if not admin_allowed():
+        return jsonify({'success': False, 'error': 'Forbidden', 'response': '仅允许本机访问'}), 403
+    return jsonify({'success': True, 'data': latency_histograms.snapshot()})
+
+@app.route('/api/admin/profile', methods=['GET', 'POST'])
+def admin_profile():
+    """性能剖析：POST {"requests": N, "mode": "cprofile" | "torch"} 剖析接下来的 N 个请求，GET 查看状态"""
+    if not admin_allowed():
+        return jsonify({'success': False, 'error': 'Forbidden', 'response': '仅允许本机访问'}), 403
+    if request.method == 'GET':
+        return jsonify({'success': True, 'data': profile_capture.status()})
+    data = request.get_json(silent=True) or {}
+    try:
+        status = profile_capture.arm(data.get('requests', 1), data.get('mode', 'cprofile'))
+    except (TypeError, ValueError, ImportError) as e:
+        return jsonify({'success': False, 'error': str(e), 'response': '剖析参数错误'}), 400
+    return jsonify({'success': True, 'data': status})
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """健康检查接口"""
@@ -425,11 +510,12 @@ def analyze_emotions():
             }), 400
         
         # 读取视频数据
-        video_data = video_file.read()
+        with stage('upload'):
+            video_data = video_file.read()
         logger.info(f"接收视频文件: {video_file.filename}, 大小: {len(video_data)} bytes")
         
         # 处理视频
-        video_tensor = video_processor.extract_frames_from_video(video_data)
+        video_tensor = video_processor.extract_frames_from_video(video_data, file_ext)
         if video_tensor is None:
             return jsonify({
                 'success': False,
@@ -465,6 +551,19 @@ def analyze_emotions():
         logger.info(f"情绪分析完成: {video_file.filename}, 用时: {total_time*1000:.1f}ms")
         return jsonify(response_data)
         
+    except InputBudgetError as e:
+        logger.warning(f"视频超出处理限制: {e}")
+        return jsonify({
+            'success': False,
+            'error': 'Video exceeds limits',
+            'response': str(e)
+        }), 413
+    except RequestEntityTooLarge:
+        return jsonify({
+            'success': False,
+            'error': 'Video exceeds limits',
+            'response': f'上传文件过大（上限 {INPUT_BUDGET.max_bytes // (1024 * 1024)}MB）'
+        }), 413
     except Exception as e:
         logger.error(f"API错误: {e}")
         return jsonify({
@@ -552,6 +651,8 @@ if __name__ == '__main__':
     print(f"   POST /api/emotions/analyze - 单视频分析")
     print(f"   POST /api/emotions/test    - 测试接口")
     print(f"   GET  /api/models           - 模型列表")
+    print(f"   GET  /api/admin/latency    - 分阶段延迟统计（仅本机）")
+    print(f"   POST /api/admin/profile    - 剖析接下来的N个请求（仅本机）")
     
     print(f"\n🌐 服务地址: http://localhost:5000")
     print(f"📱 设备: {device}")